@@ -0,0 +1,18 @@
+"""
+SQLite backend whose transactions start with BEGIN IMMEDIATE.
+
+A deferred transaction that reads before it writes (booking creation
+locks the listing row first) cannot upgrade to a write lock while
+another connection writes: SQLite fails it at once with "database is
+locked" instead of waiting out the busy timeout. Taking the write lock
+at BEGIN makes concurrent transactions queue on the busy timeout
+instead. Used by the SQLite performance profile
+(``SQLITE_PERFORMANCE_PROFILE``); Django 5.1+ offers the same through
+``OPTIONS['transaction_mode'] = 'IMMEDIATE'``.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -4,7 +4,10 @@ URL configuration for alx_travel_app project.
 from django.contrib import admin
 from django.urls import path, include
 
+from listings.views import metrics_endpoint
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('listings.urls')),
+    path('metrics', metrics_endpoint, name='metrics'),
 ]
@@ -0,0 +1,250 @@
+"""
+Load test: payment verification under WSGI (threads) vs ASGI (coroutines).
+
+A local fake Chapa server answers every verify call after ``--latency``
+seconds. The script seeds a user with pending payments in the configured
+database, starts the app under gunicorn (sync views, one worker with
+``--threads`` threads) and under uvicorn (``ASYNC_PAYMENT_VIEWS=True``, one
+worker), and fires ``--requests`` verify calls with ``--concurrency``
+in flight.
+
+Requires: pip install gunicorn uvicorn
+
+Usage:
+    python benchmarks/asgi_payment_load.py --concurrency 200 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from datetime import date, timedelta  # noqa: E402
+from decimal import Decimal  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from listings.models import Booking, Listing, Payment  # noqa: E402
+
+
+def serve_fake_chapa(latency, port_queue):
+    """Serve Chapa-shaped verify responses (runs in its own process)."""
+    body = json.dumps({
+        'status': 'success',
+        'message': 'Payment details',
+        'data': {'status': 'pending'},
+    }).encode()
+    response = (
+        b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+        b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body
+    )
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in head.split(b'\r\n'):
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':')[1])
+                if length:
+                    await reader.readexactly(length)
+                await asyncio.sleep(latency)
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, '127.0.0.1', 0, backlog=4096)
+        port_queue.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def start_fake_chapa(latency):
+    """Start the fake gateway in a separate process so it has its own GIL."""
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=serve_fake_chapa, args=(latency, port_queue), daemon=True
+    )
+    process.start()
+    return port_queue.get(timeout=10)
+
+
+def seed(count):
+    """Create a benchmark user with ``count`` pending payments."""
+    call_command('migrate', verbosity=0)
+    user, _ = User.objects.get_or_create(username='loadtest')
+    user.set_password('loadtest-pass')
+    user.save()
+    listing, _ = Listing.objects.get_or_create(
+        title='Load test listing',
+        defaults={'description': 'benchmark', 'location': 'Bench', 'price_per_night': Decimal('10.00')},
+    )
+    Payment.objects.filter(transaction_id__startswith='TXN-LOAD-').delete()
+    Booking.objects.filter(user=user).delete()
+    for i in range(count):
+        booking = Booking.objects.create(
+            user=user, listing=listing,
+            check_in_date=date(2030, 1, 1) + timedelta(days=3 * i),
+            check_out_date=date(2030, 1, 2) + timedelta(days=3 * i),
+            number_of_guests=1, total_amount=Decimal('10.00'),
+            user_email='load@example.com', user_phone='+251900000000',
+        )
+        Payment.objects.create(
+            booking=booking, booking_reference=str(booking.booking_reference),
+            transaction_id=f'TXN-LOAD-{i}', amount=Decimal('10.00'),
+            user_email='load@example.com', user_phone='+251900000000',
+        )
+    client = Client()
+    client.login(username='loadtest', password='loadtest-pass')
+    return client.cookies['sessionid'].value
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port, env, threads):
+    if mode == 'wsgi':
+        cmd = [
+            sys.executable, '-m', 'gunicorn', 'alx_travel_app.wsgi:application',
+            '-b', f'127.0.0.1:{port}', '-w', '1', '--threads', str(threads),
+            '--log-level', 'warning',
+        ]
+    else:
+        env = dict(env, ASYNC_PAYMENT_VIEWS='True')
+        cmd = [
+            sys.executable, '-m', 'uvicorn', 'alx_travel_app.asgi:application',
+            '--host', '127.0.0.1', '--port', str(port), '--workers', '1',
+            '--log-level', 'warning',
+        ]
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+CSRF_SECRET = 'loadtest' * 4
+
+
+async def _post(reader, writer, path, body, cookie):
+    writer.write(
+        f'POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+        f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+        f'Cookie: {cookie}\r\nX-CSRFToken: {CSRF_SECRET}\r\n\r\n'.encode() + body
+    )
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_code = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':')[1])
+    await reader.readexactly(length)
+    return status_code
+
+
+async def fire(port, session_id, total, concurrency, payments):
+    """Drive the server over ``concurrency`` keep-alive connections.
+
+    A bare asyncio client keeps load-generator CPU out of the measurement.
+    """
+    cookie = f'sessionid={session_id}; csrftoken={CSRF_SECRET}'
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        connection = None
+        for i in counter:
+            body = json.dumps({'transaction_id': f'TXN-LOAD-{i % payments}'}).encode()
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = await asyncio.open_connection('127.0.0.1', port)
+                status_code = await _post(*connection, '/api/payments/verify/', body, cookie)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                connection = None
+                continue
+            latencies.append(time.perf_counter() - start)
+            # 400 is the expected "payment not successful" answer.
+            if status_code >= 500 or status_code in (401, 403):
+                errors += 1
+        if connection is not None:
+            connection[1].close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return total / wall, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1], errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.2, help='fake Chapa latency (s)')
+    parser.add_argument('--threads', type=int, default=32, help='gunicorn threads (WSGI)')
+    parser.add_argument('--payments', type=int, default=200)
+    parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+    args = parser.parse_args()
+
+    chapa_port = start_fake_chapa(args.latency)
+    session_id = seed(args.payments)
+    env = dict(
+        os.environ,
+        CHAPA_SECRET_KEY='bench',
+        CHAPA_API_URL=f'http://127.0.0.1:{chapa_port}/v1',
+        CELERY_BROKER_URL='memory://',
+        CELERY_RESULT_BACKEND='cache+memory://',
+        DEBUG='False',
+    )
+
+    print(f'{args.requests} verify calls, {args.concurrency} in flight, '
+          f'Chapa latency {args.latency * 1000:.0f} ms')
+    modes = ['wsgi', 'asgi'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        port = free_port()
+        proc = start_server(mode, port, env, args.threads)
+        try:
+            rps, p50, p99, errors = asyncio.run(
+                fire(port, session_id, args.requests, args.concurrency, args.payments)
+            )
+        finally:
+            proc.terminate()
+            proc.wait()
+        workers = f'1 worker x {args.threads} threads' if mode == 'wsgi' else '1 worker, event loop'
+        print(f'{mode:<5} {rps:8.1f} req/s   p50 {p50 * 1000:7.1f} ms   '
+              f'p99 {p99 * 1000:7.1f} ms   errors {errors:<4} ({workers})')
+
+
+if __name__ == '__main__':
+    main()
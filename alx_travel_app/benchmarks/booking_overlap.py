@@ -0,0 +1,135 @@
+"""
+Benchmark: booking creation and overlap checks on the availability calendar.
+
+Seeds ``--bookings`` bookings spread over ``--listings`` listings (with
+their booked nights), then measures:
+
+* the calendar overlap check (``availability.is_available``),
+* the equivalent interval query against ``Booking``,
+* end-to-end ``BookingCreateSerializer`` creates (with row lock), and
+  rejected overlapping creates.
+
+Usage:
+    python benchmarks/booking_overlap.py --listings 1000 --bookings 100000
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from common import report, setup_django, timed
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import transaction  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from listings.availability import is_available, stay_nights  # noqa: E402
+from listings.models import BookedNight, Booking, Listing  # noqa: E402
+from listings.serializers import BookingCreateSerializer  # noqa: E402
+
+START = date(2030, 1, 1)
+STAY = 3
+
+
+def seed(listings, bookings):
+    user = User.objects.create_user('bench')
+    Listing.objects.bulk_create(
+        Listing(title=f'Listing {i}', description='bench', location=f'City {i % 50}',
+                price_per_night=Decimal('100.00'))
+        for i in range(listings)
+    )
+    listing_ids = list(Listing.objects.values_list('id', flat=True))
+    per_listing = bookings // listings
+
+    with transaction.atomic():
+        batch = []
+        for listing_id in listing_ids:
+            for slot in range(per_listing):
+                check_in = START + timedelta(days=slot * (STAY + 1))
+                batch.append(Booking(
+                    user=user, listing_id=listing_id, check_in_date=check_in,
+                    check_out_date=check_in + timedelta(days=STAY), number_of_guests=2,
+                    total_amount=Decimal('300.00'), status='confirmed',
+                    user_email='bench@example.com', user_phone='+251900000000',
+                ))
+            if len(batch) >= 10000:
+                Booking.objects.bulk_create(batch)
+                batch = []
+        Booking.objects.bulk_create(batch)
+
+        nights = []
+        for booking_id, listing_id, check_in, check_out in Booking.objects.values_list(
+            'id', 'listing_id', 'check_in_date', 'check_out_date'
+        ).iterator(chunk_size=10000):
+            nights.extend(
+                BookedNight(listing_id=listing_id, booking_id=booking_id, night=night)
+                for night in stay_nights(check_in, check_out)
+            )
+            if len(nights) >= 30000:
+                BookedNight.objects.bulk_create(nights)
+                nights = []
+        BookedNight.objects.bulk_create(nights)
+
+    return user, listing_ids, per_listing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--listings', type=int, default=1000)
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--samples', type=int, default=2000)
+    args = parser.parse_args()
+
+    user, listing_ids, per_listing = seed(args.listings, args.bookings)
+    print(f'{Booking.objects.count()} bookings, {BookedNight.objects.count()} booked nights, '
+          f'{len(listing_ids)} listings')
+
+    rng = random.Random(42)
+    probes = [
+        (rng.choice(listing_ids), START + timedelta(days=rng.randrange(per_listing * (STAY + 1))))
+        for _ in range(args.samples)
+    ]
+
+    report('calendar overlap check', timed(
+        lambda i: is_available(probes[i][0], probes[i][1], probes[i][1] + timedelta(days=STAY)),
+        args.samples,
+    ))
+    report('Booking interval query', timed(
+        lambda i: Booking.objects.filter(
+            listing_id=probes[i][0],
+            check_in_date__lt=probes[i][1] + timedelta(days=STAY),
+            check_out_date__gt=probes[i][1],
+        ).exclude(status='cancelled').exists(),
+        args.samples,
+    ))
+
+    request = APIRequestFactory().post('/api/bookings/')
+    request.user = user
+    free_start = START + timedelta(days=per_listing * (STAY + 1) + 1)
+
+    def create(i, overlapping=False):
+        check_in = (START if overlapping else free_start + timedelta(days=2 * (i // len(listing_ids))))
+        serializer = BookingCreateSerializer(data={
+            'listing': listing_ids[i % len(listing_ids)],
+            'check_in_date': check_in,
+            'check_out_date': check_in + timedelta(days=1),
+            'number_of_guests': 1,
+            'user_email': 'bench@example.com',
+            'user_phone': '+251900000000',
+        }, context={'request': request})
+        if serializer.is_valid():
+            serializer.save()
+        elif not overlapping:
+            raise RuntimeError(serializer.errors)
+
+    report('create booking (free dates)', timed(create, min(args.samples, 1000)))
+    report('create booking (overlap rejected)', timed(
+        lambda i: create(i, overlapping=True), min(args.samples, 1000)
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: one bulk booking request vs the same bookings POSTed one by one.
+
+Creates ``--bookings`` bookings spread over ``--listings`` listings
+(back-to-back two-night stays) twice on the same scratch database:
+through ``--bookings`` POST /api/bookings/ calls, then as batches of
+``--batch`` items to POST /api/bookings/bulk/ on a fresh date range.
+Reports wall time, bookings/s and SQL statements for each.
+
+Usage:
+    python benchmarks/bulk_bookings.py --bookings 1000 --batch 1000
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from common import setup_django
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from listings.models import BookedNight, Booking, Listing  # noqa: E402
+
+
+def items(listings, count, start):
+    for i in range(count):
+        check_in = start + timedelta(days=2 * (i // len(listings)))
+        yield {
+            'listing': listings[i % len(listings)].id,
+            'check_in_date': str(check_in),
+            'check_out_date': str(check_in + timedelta(days=2)),
+            'number_of_guests': 2,
+            'user_email': 'operator@example.com',
+            'user_phone': '+251900000000',
+        }
+
+
+def run(label, send, count):
+    statements = []
+
+    def count_statements(execute, sql, params, many, context):
+        statements.append(1)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_statements):
+        start = time.perf_counter()
+        created = send()
+        elapsed = time.perf_counter() - start
+    assert created == count, f'{label}: {created}/{count} created'
+    print(f'{label:<28} {elapsed * 1000:9.0f} ms   {count / elapsed:8.0f} bookings/s   '
+          f'{len(statements):6d} SQL statements')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--bookings', type=int, default=1000)
+    parser.add_argument('--listings', type=int, default=100)
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    user = User.objects.create_user(username='operator')
+    listings = Listing.objects.bulk_create(
+        Listing(title=f'Tour {i}', description='bench', location='Bench', price_per_night=Decimal('80.00'))
+        for i in range(args.listings)
+    )
+    client = APIClient(HTTP_HOST='localhost')
+    client.force_authenticate(user=user)
+
+    def single():
+        return sum(
+            client.post('/api/bookings/', item, format='json').status_code == 201
+            for item in items(listings, args.bookings, date(2030, 1, 1))
+        )
+
+    def bulk():
+        batch = list(items(listings, args.bookings, date(2035, 1, 1)))
+        return sum(
+            client.post('/api/bookings/bulk/', {'bookings': batch[i:i + args.batch]},
+                        format='json').data['created']
+            for i in range(0, len(batch), args.batch)
+        )
+
+    print(f'{args.bookings} bookings over {args.listings} listings')
+    run(f'{args.bookings} single POSTs', single, args.bookings)
+    run(f'bulk, batches of {args.batch}', bulk, args.bookings)
+    print(f'bookings: {Booking.objects.count()}, booked nights: {BookedNight.objects.count()}')
+
+
+if __name__ == '__main__':
+    main()
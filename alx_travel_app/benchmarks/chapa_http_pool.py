@@ -0,0 +1,118 @@
+"""
+Microbenchmark: per-call connections vs the pooled Chapa session.
+
+Starts a local HTTP/1.1 stub that mimics the Chapa verify endpoint and
+counts accepted TCP connections, then issues the same number of verify
+calls through ``requests.get`` (a new connection per call, as the service
+used to do) and through ``ChapaPaymentService`` (shared keep-alive pool).
+
+Usage:
+    python benchmarks/chapa_http_pool.py --requests 2000 --threads 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import requests  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from listings.services import ChapaPaymentService, reset_http_session  # noqa: E402
+
+
+BODY = json.dumps({
+    'status': 'success',
+    'message': 'Payment details',
+    'data': {'status': 'success', 'amount': '100.00', 'currency': 'ETB'},
+}).encode()
+
+
+class StubChapaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def get_request(self):
+        conn = super().get_request()
+        self.connections += 1
+        return conn
+
+
+def run(label, call, total, threads, server):
+    server.connections = 0
+    latencies = []
+    lock = threading.Lock()
+
+    def timed(i):
+        start = time.perf_counter()
+        call(f'TXN-BENCH-{i}')
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(timed, range(total)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f'{label:<10} {total / wall:>9.0f} req/s   p50 {p50:6.2f} ms   '
+        f'p99 {p99:6.2f} ms   connections {server.connections}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    server = CountingServer(('127.0.0.1', 0), StubChapaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f'http://127.0.0.1:{server.server_port}/v1'
+    settings.CHAPA_API_URL = api_url
+    reset_http_session()
+
+    def unpooled(tx_ref):
+        requests.get(f'{api_url}/transaction/verify/{tx_ref}', timeout=30).json()
+
+    service = ChapaPaymentService()
+
+    print(f'{args.requests} verify calls, {args.threads} threads, '
+          f'pool maxsize {settings.CHAPA_POOL_MAXSIZE}')
+    run('unpooled', unpooled, args.requests, args.threads, server)
+    run('pooled', service.verify_payment, args.requests, args.threads, server)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
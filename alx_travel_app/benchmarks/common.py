@@ -0,0 +1,65 @@
+"""
+Shared setup for the benchmark scripts.
+
+Benchmarks that need bulk fixtures run against a scratch SQLite database
+(not the project's db.sqlite3) created and migrated on the fly. With
+``DATABASE_URL`` pointing at PostgreSQL they use a throwaway
+``test_<name>`` database instead, dropped on exit.
+"""
+
+import atexit
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(fresh=True, database=None):
+    """Configure Django against a scratch database and migrate it."""
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
+
+    import django
+    from django.conf import settings
+
+    database = database or os.path.join(tempfile.gettempdir(), 'alx_travel_bench.sqlite3')
+    sqlite = settings.DATABASES['default']['ENGINE'] in (
+        'django.db.backends.sqlite3', 'alx_travel_app.sqlite_backend',
+    )
+    if sqlite:
+        if fresh and os.path.exists(database):
+            os.remove(database)
+        settings.DATABASES['default']['NAME'] = database
+
+    django.setup()
+
+    if not sqlite:
+        # Never fill the configured server database with fixtures.
+        from django.db import connection
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        atexit.register(connection.creation.destroy_test_db, old_name, verbosity=0)
+        return
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def timed(func, repeat):
+    """Call ``func`` ``repeat`` times and return per-call latencies in ms."""
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    print(f'{label:<34} mean {statistics.mean(samples):8.3f} ms   '
+          f'p50 {samples[len(samples) // 2]:8.3f} ms   p99 {p99:8.3f} ms')
@@ -0,0 +1,119 @@
+"""
+Benchmark: per-email SMTP connections vs the batched notification outbox.
+
+Starts a local aiosmtpd sink, seeds ``--emails`` completed payments and
+sends one confirmation per payment twice: the way the Celery tasks used
+to (load payment, booking and listing, then ``send_mail`` on a new
+connection per message) and through the outbox
+(``queue_payment_confirmation`` + ``send_pending_notifications``).
+
+Requires: pip install aiosmtpd
+
+Usage:
+    python benchmarks/email_batch.py --emails 10000
+"""
+
+import argparse
+import socket
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from common import setup_django
+
+setup_django()
+
+from aiosmtpd.controller import Controller  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.mail import send_mail  # noqa: E402
+from django.db import transaction  # noqa: E402
+
+from listings.models import Booking, EmailNotification, Listing, Payment  # noqa: E402
+from listings.notifications import (  # noqa: E402
+    build_message, queue_payment_confirmation, send_pending_notifications,
+)
+
+
+class CountingSink:
+    def __init__(self):
+        self.messages = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages += 1
+        return '250 OK'
+
+
+def seed(count):
+    user = User.objects.create_user(username='mailbench')
+    listing = Listing.objects.create(
+        title='Mail bench', description='bench', location='Bench', price_per_night=Decimal('10.00')
+    )
+    with transaction.atomic():
+        bookings = Booking.objects.bulk_create(
+            Booking(user=user, listing=listing,
+                    check_in_date=date(2030, 1, 1) + timedelta(days=2 * i),
+                    check_out_date=date(2030, 1, 2) + timedelta(days=2 * i),
+                    number_of_guests=1, total_amount=Decimal('10.00'), status='confirmed',
+                    user_email=f'guest{i}@example.com', user_phone='+251900000000')
+            for i in range(count)
+        )
+        Payment.objects.bulk_create(
+            Payment(booking=booking, booking_reference=str(booking.booking_reference),
+                    transaction_id=f'TXN-MAIL-{i}', amount=Decimal('10.00'), status='completed',
+                    user_email=booking.user_email, user_phone=booking.user_phone)
+            for i, booking in enumerate(bookings)
+        )
+    return list(Payment.objects.values_list('id', 'booking_id'))
+
+
+def send_unbatched(payment_id, booking_id):
+    """What each send_payment_confirmation_email task used to do."""
+    payment = Payment.objects.get(id=payment_id)
+    Booking.objects.get(id=booking_id)
+    message = build_message(EmailNotification(kind='payment_confirmation', payment=payment))
+    send_mail(message.subject, message.body, message.from_email, message.to, fail_silently=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--emails', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=None)
+    args = parser.parse_args()
+
+    sink = CountingSink()
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    controller = Controller(sink, hostname='127.0.0.1', port=port)
+    controller.start()
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST = '127.0.0.1'
+    settings.EMAIL_PORT = port
+    settings.EMAIL_USE_TLS = False
+
+    rows = seed(args.emails)
+    batch_size = args.batch_size or settings.EMAIL_BATCH_SIZE
+    print(f'{args.emails} confirmation emails to a local aiosmtpd sink, batch size {batch_size}')
+
+    start = time.perf_counter()
+    for payment_id, booking_id in rows:
+        send_unbatched(payment_id, booking_id)
+    unbatched = time.perf_counter() - start
+    print(f'per-email connection   {args.emails / unbatched:8.0f} msg/s   ({unbatched:.1f} s)')
+
+    sink.messages = 0
+    start = time.perf_counter()
+    with transaction.atomic():
+        queue_payment_confirmation(*(payment_id for payment_id, _ in rows))
+    result = send_pending_notifications(batch_size)
+    batched = time.perf_counter() - start
+    assert result['sent'] == sink.messages == args.emails, (result, sink.messages)
+    print(f'batched outbox         {args.emails / batched:8.0f} msg/s   ({batched:.1f} s, '
+          f'{-(-args.emails // batch_size)} connections)')
+
+    controller.stop()
+
+
+if __name__ == '__main__':
+    main()
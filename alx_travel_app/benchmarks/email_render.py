@@ -0,0 +1,107 @@
+"""
+Benchmark: per-email render cost of the notification templates.
+
+Renders ``--renders`` confirmation emails (in-memory objects, no database
+or SMTP) four ways: the old plain-text f-string, Django's
+``render_to_string`` for the text and HTML templates, the precompiled
+templates (``email_templates.render_email``), and complete messages
+serialized to bytes, plain text (old) vs multipart (new).
+
+Usage:
+    python benchmarks/email_render.py --renders 100000
+"""
+
+import argparse
+import time
+from datetime import date
+from decimal import Decimal
+
+from common import setup_django
+
+setup_django(fresh=False)
+
+from django.conf import settings  # noqa: E402
+from django.core.mail import EmailMessage  # noqa: E402
+from django.template.loader import render_to_string  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from listings.email_templates import render_email  # noqa: E402
+from listings.models import Booking, EmailNotification, Listing, Payment  # noqa: E402
+from listings.notifications import build_message, email_context  # noqa: E402
+
+
+def legacy_body(payment, booking):
+    """The f-string body send_payment_confirmation_email used to build."""
+    return f"""
+        Dear Customer,
+
+        Thank you for your payment!
+
+        Your booking has been confirmed. Here are your booking details:
+
+        Booking Reference: {booking.booking_reference}
+        Listing: {booking.listing.title}
+        Check-in Date: {booking.check_in_date}
+        Check-out Date: {booking.check_out_date}
+        Number of Guests: {booking.number_of_guests}
+        Total Amount Paid: ETB {booking.total_amount}
+
+        Payment Details:
+        Payment ID: {payment.payment_id}
+        Transaction ID: {payment.transaction_id}
+        Payment Date: {payment.completed_at}
+
+        We look forward to hosting you!
+
+        Best regards,
+        ALX Travel App Team
+        """
+
+
+def legacy_message(payment, booking):
+    return EmailMessage(
+        subject=f'Payment Confirmation - Booking {booking.booking_reference}',
+        body=legacy_body(payment, booking),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[payment.user_email],
+    )
+
+
+def bench(label, func, renders):
+    start = time.perf_counter()
+    for _ in range(renders):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<34} {elapsed / renders * 1e6:8.1f} us/email   {renders / elapsed:9.0f} emails/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--renders', type=int, default=100000)
+    args = parser.parse_args()
+
+    listing = Listing(title='Bench Villa', description='bench', location='Bench',
+                      price_per_night=Decimal('1000.00'))
+    booking = Booking(listing=listing, check_in_date=date(2031, 1, 1), check_out_date=date(2031, 1, 4),
+                      number_of_guests=2, total_amount=Decimal('3000.00'),
+                      user_email='guest@example.com', user_phone='+251900000000')
+    payment = Payment(booking=booking, transaction_id='TXN-RENDER-1', amount=Decimal('3000.00'),
+                      user_email='guest@example.com', completed_at=timezone.now())
+    notification = EmailNotification(kind='payment_confirmation', payment=payment)
+    context = email_context(notification)
+
+    print(f'{args.renders} confirmation emails')
+    bench('f-string text (old)', lambda: legacy_body(payment, booking), args.renders)
+    bench('render_to_string text + html', lambda: (
+        render_to_string('listings/emails/payment_confirmation.txt', context),
+        render_to_string('listings/emails/payment_confirmation.html', context),
+    ), args.renders)
+    bench('precompiled text + html', lambda: render_email('payment_confirmation', context), args.renders)
+    bench('message bytes, plain text (old)',
+          lambda: legacy_message(payment, booking).message().as_bytes(), args.renders)
+    bench('message bytes, multipart (new)',
+          lambda: build_message(notification).message().as_bytes(), args.renders)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: /api/listings/ list and detail throughput with the cache on vs off.
+
+Seeds ``--rows`` listings into a scratch database, then issues the same
+anonymous list/detail requests with ``LISTING_CACHE_ENABLED`` off and on,
+plus conditional requests that revalidate with ``If-None-Match``.
+
+Usage:
+    python benchmarks/listing_cache.py --rows 10000 --requests 2000
+"""
+
+import argparse
+import time
+from decimal import Decimal
+
+from common import setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from listings.cache import invalidate_listing_cache, stats  # noqa: E402
+from listings.models import Listing  # noqa: E402
+
+
+def seed(rows):
+    Listing.objects.bulk_create(
+        Listing(title=f'Listing {i}', description='bench ' * 20, location='Bench',
+                price_per_night=Decimal('100.00'))
+        for i in range(rows)
+    )
+    invalidate_listing_cache()
+
+
+def throughput(client, urls, total, **headers):
+    start = time.perf_counter()
+    for i in range(total):
+        response = client.get(urls[i % len(urls)], **headers)
+        assert response.status_code in (200, 304), response.status_code
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    seed(args.rows)
+    client = APIClient(HTTP_HOST='localhost')
+    ids = list(Listing.objects.values_list('id', flat=True)[:100])
+    endpoints = {
+        'list': ['/api/listings/'],
+        'detail': [f'/api/listings/{pk}/' for pk in ids],
+    }
+
+    print(f'{args.rows} listings, {args.requests} requests per run, '
+          f'cache backend {settings.CACHES["default"]["BACKEND"].rsplit(".", 1)[-1]}')
+    for name, urls in endpoints.items():
+        settings.LISTING_CACHE_ENABLED = False
+        off = throughput(client, urls, args.requests)
+
+        settings.LISTING_CACHE_ENABLED = True
+        stats.reset()
+        on = throughput(client, urls, args.requests)
+        hit_ratio = stats.snapshot()['hit_ratio']
+
+        etag = client.get(urls[0])['ETag']
+        revalidate = throughput(client, urls[:1], args.requests, HTTP_IF_NONE_MATCH=etag)
+
+        print(f'{name:<7} cache off {off:8.0f} req/s   cache on {on:8.0f} req/s '
+              f'({on / off:4.1f}x, hit ratio {hit_ratio:.2f})   304 {revalidate:8.0f} req/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: full-text ``?q=`` listing search vs an ``icontains`` scan.
+
+Seeds ``--listings`` listings whose titles and descriptions draw words
+from a Zipf-distributed vocabulary, builds the full-text index, then
+times one page of results (COUNT(*) plus the first 20 rows, as
+page-number pagination runs them) for rare, mid-frequency and common
+words and for two-word queries:
+
+* baseline: ``title/location/description__icontains`` for each word;
+* full-text: ``search_listings()``, ranked;
+* GET /api/listings/?q=... end to end, with the listing cache off.
+
+Usage:
+    python benchmarks/listing_fulltext.py --listings 500000
+"""
+
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from common import report, setup_django, timed
+
+setup_django()
+
+from django.db.models import Q  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from listings.fulltext import rebuild_search_index, search_listings  # noqa: E402
+from listings.models import Listing  # noqa: E402
+
+VOCABULARY = 2000
+LOCATIONS = 200
+PAGE = 20
+
+
+def make_words(rng):
+    # Pronounceable made-up words, so no word is a substring of a common one.
+    consonants, vowels = 'bdfgklmnprstvz', 'aeiou'
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add(''.join(rng.choice(consonants) + rng.choice(vowels) for _ in range(rng.randint(3, 4))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def seed(listings, words, rng):
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    for start in range(0, listings, 20000):
+        count = min(listings, start + 20000) - start
+        text = rng.choices(words, weights, k=count * 33)
+        Listing.objects.bulk_create(
+            Listing(title=' '.join(text[i * 33:i * 33 + 3]).title(),
+                    description=' '.join(text[i * 33 + 3:(i + 1) * 33]),
+                    location=f'City {(start + i) % LOCATIONS}', price_per_night=Decimal('100.00'))
+            for i in range(count)
+        )
+
+
+def icontains_page(query):
+    condition = Q()
+    for word in query.split():
+        condition &= Q(title__icontains=word) | Q(location__icontains=word) | Q(description__icontains=word)
+    queryset = Listing.objects.filter(condition).order_by('-created_at', '-id')
+    return queryset.count(), list(queryset[:PAGE])
+
+
+def fulltext_page(query):
+    queryset = search_listings(query)
+    return queryset.count(), list(queryset[:PAGE])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--listings', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    rng = random.Random(18)
+
+    words = make_words(rng)
+    start = time.perf_counter()
+    seed(args.listings, words, rng)
+    print(f'seeded {args.listings} listings in {time.perf_counter() - start:.0f} s')
+    start = time.perf_counter()
+    rebuild_search_index()
+    print(f'built the full-text index in {time.perf_counter() - start:.0f} s')
+
+    client = APIClient(HTTP_HOST='localhost')
+    queries = {
+        'rare word': words[1500],
+        'mid word': words[100],
+        'common word': words[5],
+        'two words': f'{words[20]} {words[100]}',
+    }
+    for label, query in queries.items():
+        print(f'-- {label} {query!r}: {fulltext_page(query)[0]} full-text matches, '
+              f'{icontains_page(query)[0]} icontains matches')
+        for name, page in (('icontains', icontains_page), ('full-text', fulltext_page)):
+            samples = timed(lambda i: page(query), args.repeat)
+            report(name, samples)
+            print(f'{"":<34} {1000 * len(samples) / sum(samples):8.1f} queries/s')
+        with override_settings(LISTING_CACHE_ENABLED=False):
+            report('GET /api/listings/?q=', timed(
+                lambda i: client.get('/api/listings/', {'q': query}), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: nearest-50 listing search on the geohash index.
+
+Seeds ``--listings`` listings over Ethiopia, half spread uniformly and
+half clustered around cities, then times the nearest 50 available
+listings within 5, 10 and 25 km of random listing locations:
+
+* ``geo.nearby_listings`` (geohash cell ranges + exact distance);
+* GET /api/listings/nearby/ end to end;
+* for reference, the same bounding box as a plain latitude/longitude
+  filter, which has no index to use.
+
+Usage:
+    python benchmarks/listing_nearby.py --listings 1000000
+"""
+
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from common import report, setup_django, timed
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from listings import geo  # noqa: E402
+from listings.models import Listing  # noqa: E402
+
+BOUNDS = (3.4, 14.9, 33.0, 48.0)
+CITIES = [(9.03, 38.74), (8.54, 39.27), (7.06, 38.48), (9.59, 41.86), (11.59, 37.39),
+          (13.50, 39.47), (7.67, 36.83), (12.60, 37.47), (6.03, 37.55), (9.31, 42.12)]
+
+
+def random_point(rng):
+    if rng.random() < 0.5:
+        return rng.uniform(*BOUNDS[:2]), rng.uniform(*BOUNDS[2:])
+    lat, lng = rng.choice(CITIES)
+    return rng.gauss(lat, 0.15), rng.gauss(lng, 0.15)
+
+
+def seed(listings, rng):
+    points = []
+    for start in range(0, listings, 20000):
+        batch = [random_point(rng) for _ in range(start, min(listings, start + 20000))]
+        points.extend(batch)
+        # bulk_create skips Listing.save(), so the geohash is set here.
+        Listing.objects.bulk_create(
+            Listing(title=f'Nearby {start + i}', description='bench', location='Bench',
+                    price_per_night=Decimal('100.00'), latitude=lat, longitude=lng,
+                    geohash=geo.encode(lat, lng))
+            for i, (lat, lng) in enumerate(batch)
+        )
+    return points
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--listings', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(20)
+
+    start = time.perf_counter()
+    points = seed(args.listings, rng)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    print(f'seeded {args.listings} listings in {time.perf_counter() - start:.0f} s')
+
+    queryset = Listing.objects.filter(available=True)
+    client = APIClient(HTTP_HOST='localhost')
+    targets = [rng.choice(points) for _ in range(args.repeat)]
+    for radius in (5, 10, 25):
+        found = [len(geo.nearby_listings(queryset, lat, lng, radius, 50)) for lat, lng in targets[:20]]
+        print(f'-- nearest 50 within {radius} km (mean {sum(found) / len(found):.0f} results)')
+        report('geohash cells', timed(
+            lambda i: geo.nearby_listings(queryset, *targets[i], radius, 50), args.repeat))
+        report('GET /api/listings/nearby/', timed(
+            lambda i: client.get('/api/listings/nearby/', {
+                'lat': targets[i][0], 'lng': targets[i][1], 'radius': radius, 'limit': 50,
+            }), args.repeat))
+
+        def unindexed(i):
+            min_lat, max_lat, min_lng, max_lng = geo.bounding_box(*targets[i], radius)
+            list(queryset.filter(latitude__range=(min_lat, max_lat), longitude__range=(min_lng, max_lng))
+                 .values_list('pk', 'latitude', 'longitude'))
+
+        report('lat/lng box, no index', timed(unindexed, 5))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: GET /api/listings/quote/ for search result pages.
+
+Seeds ``--listings`` listings with seasonal, weekend and length-of-stay
+rules, then replays ``--requests`` quote requests of 20 listings each,
+drawn from ``--pages`` distinct (listings, dates) search pages with a
+skewed popularity, as repeated searches are. Runs once with the quote memo
+disabled (every request re-prices, and rate tables are capped to
+``--tables`` so colder listings recompile), once with it enabled, and
+reports latency and the memo hit ratio.
+
+Usage:
+    python benchmarks/listing_quotes.py --listings 10000 --requests 2000
+"""
+
+import argparse
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from common import report, setup_django, timed
+
+setup_django()
+
+from django.test.utils import override_settings  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from listings import pricing, quotes  # noqa: E402
+from listings.models import Listing, RateRule  # noqa: E402
+
+
+def seed(count, rng, today):
+    listings = Listing.objects.bulk_create(
+        Listing(title=f'Quoted {i}', description='bench', location='Bench',
+                price_per_night=Decimal(rng.randrange(4000, 20000)) / 100)
+        for i in range(count)
+    )
+    rules = []
+    for listing in listings:
+        offset = rng.randrange(0, 200)
+        rules.append(RateRule(
+            listing=listing, kind='season', nightly_price=listing.price_per_night * Decimal('1.3'),
+            start_date=today + timedelta(days=offset), end_date=today + timedelta(days=offset + 40),
+        ))
+        rules.append(RateRule(listing=listing, kind='weekend', adjustment_percent=Decimal('15')))
+        rules.append(RateRule(listing=listing, kind='length_of_stay', min_nights=7, adjustment_percent=Decimal('-5')))
+    RateRule.objects.bulk_create(rules)
+    return [listing.pk for listing in listings]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--listings', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--tables', type=int, default=500)
+    args = parser.parse_args()
+    rng = random.Random(23)
+    today = timezone.localdate()
+
+    ids = seed(args.listings, rng, today)
+    pages = []
+    for _ in range(args.pages):
+        check_in = today + timedelta(days=rng.randrange(1, 180))
+        pages.append({
+            'check_in': str(check_in),
+            'check_out': str(check_in + timedelta(days=rng.randint(1, 10))),
+            'listings': ','.join(str(pk) for pk in rng.sample(ids, 20)),
+        })
+    # Popular searches repeat: page i is drawn with weight 1 / (i + 1).
+    replay = rng.choices(pages, weights=[1 / (i + 1) for i in range(len(pages))], k=args.requests)
+
+    client = APIClient(HTTP_HOST='localhost')
+
+    def run(label):
+        pricing.tables.clear()
+        quotes.memo.clear()
+        quotes.stats.reset()
+        report(label, timed(lambda i: client.get('/api/listings/quote/', replay[i]), args.requests))
+        snapshot = quotes.stats.snapshot()
+        print(f'{"":<34} memo hits {snapshot["hits"]}, misses {snapshot["misses"]}, '
+              f'hit ratio {snapshot["hit_ratio"]:.2f}')
+
+    print(f'{args.requests} quote requests of 20 listings over {args.pages} search pages')
+    with override_settings(PRICING_CACHE_SIZE=args.tables):
+        with override_settings(QUOTE_CACHE_SIZE=0):
+            run('memo off')
+        run('memo on')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: /api/listings/search/ on a large availability fixture.
+
+Seeds ``--listings`` listings and ``--bookings`` bookings (with their
+booked nights) into a scratch database, then times the search endpoint
+end to end for random date ranges, with and without a location filter.
+
+Usage:
+    python benchmarks/listing_search.py --listings 50000 --bookings 1000000
+"""
+
+import argparse
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from common import report, setup_django, timed
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from listings.models import BookedNight, Booking, Listing  # noqa: E402
+
+START = date(2030, 1, 1)
+HORIZON = 365
+LOCATIONS = 200
+
+
+def seed(listings, bookings, rng):
+    user = User.objects.create_user('bench')
+    with transaction.atomic():
+        Listing.objects.bulk_create(
+            (
+                Listing(title=f'Listing {i}', description='bench', location=f'City {i % LOCATIONS}',
+                        price_per_night=Decimal('100.00'), max_guests=rng.randint(1, 8))
+                for i in range(listings)
+            ),
+            batch_size=5000,
+        )
+    listing_ids = list(Listing.objects.values_list('id', flat=True))
+
+    # Stays of 1-4 nights packed back to back per listing.
+    per_listing = bookings // len(listing_ids)
+    with transaction.atomic():
+        batch, nights = [], []
+        for listing_id in listing_ids:
+            check_in = START + timedelta(days=rng.randrange(7))
+            for _ in range(per_listing):
+                stay = rng.randint(1, 4)
+                batch.append(Booking(
+                    user=user, listing_id=listing_id, check_in_date=check_in,
+                    check_out_date=check_in + timedelta(days=stay), number_of_guests=1,
+                    total_amount=Decimal('100.00') * stay, status='confirmed',
+                    user_email='bench@example.com', user_phone='+251900000000',
+                ))
+                check_in += timedelta(days=stay + rng.randrange(3))
+            if len(batch) >= 20000:
+                Booking.objects.bulk_create(batch)
+                batch = []
+        Booking.objects.bulk_create(batch)
+
+        for booking_id, listing_id, check_in, check_out in Booking.objects.values_list(
+            'id', 'listing_id', 'check_in_date', 'check_out_date'
+        ).iterator(chunk_size=20000):
+            for offset in range((check_out - check_in).days):
+                nights.append(BookedNight(
+                    listing_id=listing_id, booking_id=booking_id,
+                    night=check_in + timedelta(days=offset),
+                ))
+            if len(nights) >= 50000:
+                BookedNight.objects.bulk_create(nights)
+                nights = []
+        BookedNight.objects.bulk_create(nights)
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--listings', type=int, default=50000)
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--samples', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    seed(args.listings, args.bookings, rng)
+    print(f'{Listing.objects.count()} listings, {Booking.objects.count()} bookings, '
+          f'{BookedNight.objects.count()} booked nights')
+
+    client = APIClient(HTTP_HOST='localhost')
+
+    def params(with_location):
+        check_in = START + timedelta(days=rng.randrange(HORIZON))
+        query = {
+            'check_in': check_in,
+            'check_out': check_in + timedelta(days=rng.randint(1, 7)),
+            'guests': rng.randint(1, 4),
+        }
+        if with_location:
+            query['location'] = f'City {rng.randrange(LOCATIONS)}'
+        return query
+
+    def search(with_location):
+        response = client.get('/api/listings/search/', params(with_location))
+        assert response.status_code == 200, response.content
+
+    report('search (dates + guests)', timed(lambda i: search(False), args.samples))
+    report('search (dates + guests + location)', timed(lambda i: search(True), args.samples))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: page-number vs cursor pagination on /api/listings/ at depth.
+
+Seeds ``--rows`` listings into a scratch database and times the first
+page and a deep page (``--depth`` rows in) under both pagination styles.
+Page-number pagination pays COUNT(*) plus an OFFSET scan; the keyset
+cursor seeks straight to its position on the (created_at, id) index.
+
+Usage:
+    python benchmarks/pagination.py --rows 1000000 --depth 900000
+"""
+
+import argparse
+from decimal import Decimal
+
+from common import report, setup_django, timed
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from rest_framework.pagination import Cursor  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from listings.models import Listing  # noqa: E402
+from listings.pagination import CreatedAtCursorPagination  # noqa: E402
+
+
+def seed(rows):
+    with transaction.atomic():
+        for start in range(0, rows, 50000):
+            Listing.objects.bulk_create(
+                Listing(title=f'Listing {i}', description='bench', location='Bench',
+                        price_per_night=Decimal('100.00'))
+                for i in range(start, min(rows, start + 50000))
+            )
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def deep_cursor(depth):
+    position = (
+        Listing.objects.order_by('-created_at', '-id')
+        .values_list('created_at', flat=True)[depth]
+    )
+    paginator = CreatedAtCursorPagination()
+    paginator.base_url = '/api/listings/'
+    paginator.cursor_query_param = 'cursor'
+    return paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(position)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--depth', type=int, default=900000)
+    parser.add_argument('--samples', type=int, default=50)
+    args = parser.parse_args()
+
+    seed(args.rows)
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    print(f'{Listing.objects.count()} listings, page size {page_size}, deep page at row {args.depth}')
+
+    client = APIClient(HTTP_HOST='localhost')
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+
+    settings.API_PAGINATION['listings'] = 'page'
+    deep_page = args.depth // page_size + 1
+    report('page-number, first page', timed(lambda i: get('/api/listings/'), args.samples))
+    report(f'page-number, page {deep_page}', timed(
+        lambda i: get(f'/api/listings/?page={deep_page}'), args.samples
+    ))
+
+    settings.API_PAGINATION['listings'] = 'cursor'
+    deep_url = deep_cursor(args.depth)
+    report('cursor, first page', timed(lambda i: get('/api/listings/'), args.samples))
+    report(f'cursor, row {args.depth}', timed(lambda i: get(deep_url), args.samples))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Benchmark: Payment row size and list queries with raw gateway JSON inline
+vs in PaymentGatewayEvent.
+
+Seeds ``--payments`` payments into a scratch SQLite database, then adds
+the old ``payment_response``/``verification_response`` JSON columns back
+with raw SQL and fills them with typical Chapa payloads. Row size (from
+``dbstat``) and list-query latency are measured with the columns, then
+again after dropping them and vacuuming. The same payloads stored as
+zlib-compressed ``PaymentGatewayEvent`` bodies are reported for
+comparison.
+
+Usage:
+    python benchmarks/payment_rows.py --payments 1000000
+"""
+
+import argparse
+import json
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from common import report, setup_django, timed
+
+setup_django()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from listings.models import Booking, Listing, Payment, PaymentGatewayEvent  # noqa: E402
+
+INITIATE_RESPONSE = {
+    'success': True,
+    'message': 'Hosted Link',
+    'data': {
+        'checkout_url': 'https://checkout.chapa.co/checkout/payment/V38JyhpTygC9QimkJrdful9oEjih0heIv53eJ1MsJS6xG',
+        'tx_ref': 'TXN-0d1c7a3b9f2e4a6c8b5d',
+    },
+}
+
+VERIFICATION_RESPONSE = {
+    'success': True,
+    'message': 'Payment details',
+    'data': {
+        'first_name': 'Abebe', 'last_name': 'Bikila', 'email': 'abebe@example.com',
+        'phone_number': '+251911223344', 'currency': 'ETB', 'amount': '3000.00', 'charge': '105.00',
+        'mode': 'live', 'method': 'telebirr', 'type': 'API', 'status': 'success',
+        'reference': 'AP6lSf0VyXq9', 'tx_ref': 'TXN-0d1c7a3b9f2e4a6c8b5d',
+        'customization': {
+            'title': 'ALX Travel App Booking Payment',
+            'description': 'Payment for booking 3f1c2b4a-9d8e-4f7a-b6c5-2e1d0c9b8a7f',
+            'logo': None,
+        },
+        'meta': None,
+        'created_at': '2030-01-01T09:15:42.000000Z',
+        'updated_at': '2030-01-01T09:16:03.000000Z',
+    },
+}
+
+
+def seed(payments):
+    user = User.objects.create_user(username='rows')
+    listing = Listing.objects.create(
+        title='Rows', description='bench', location='Bench', price_per_night=Decimal('10.00')
+    )
+    with transaction.atomic():
+        for start in range(0, payments, 20000):
+            bookings = Booking.objects.bulk_create(
+                Booking(user=user, listing=listing,
+                        check_in_date=date(2030, 1, 1) + timedelta(days=i % 3000),
+                        check_out_date=date(2030, 1, 2) + timedelta(days=i % 3000),
+                        number_of_guests=1, total_amount=Decimal('3000.00'), status='confirmed',
+                        user_email='abebe@example.com', user_phone='+251911223344')
+                for i in range(start, min(payments, start + 20000))
+            )
+            Payment.objects.bulk_create(
+                Payment(booking=booking, booking_reference=str(booking.booking_reference),
+                        transaction_id=f'TXN-ROWS-{start + i}', chapa_reference=f'CH-ROWS-{start + i}',
+                        amount=Decimal('3000.00'), status='completed',
+                        payment_url=INITIATE_RESPONSE['data']['checkout_url'],
+                        user_email=booking.user_email, user_phone=booking.user_phone)
+                for i, booking in enumerate(bookings)
+            )
+    return user
+
+
+def execute(*statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def bytes_per_row(payments):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = 'listings_payment'")
+        return cursor.fetchone()[0] / payments
+
+
+def measure(label, client, payments):
+    print(f'-- {label}: {bytes_per_row(payments):.0f} bytes/row in listings_payment')
+    deep = payments // 2
+
+    def full_page(i):
+        # What a full-model read (admin changelist, Payment.objects.all())
+        # fetches: every column of a 100-row page.
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT * FROM listings_payment ORDER BY created_at DESC, id DESC '
+                           'LIMIT 100 OFFSET %s', [(i * 7919) % deep])
+            cursor.fetchall()
+
+    def scan(i):
+        # Unindexed filter: reads every row's pages.
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM listings_payment WHERE user_phone LIKE %s", [f'%{i % 10}'])
+            cursor.fetchone()
+
+    report('full-row page of 100', timed(full_page, 200))
+    report('full table scan', timed(scan, 5))
+    report('GET /api/payments/', timed(lambda i: client.get('/api/payments/'), 100))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--payments', type=int, default=1000000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    user = seed(args.payments)
+    print(f'seeded {args.payments} payments in {time.perf_counter() - start:.0f} s')
+    client = APIClient(HTTP_HOST='localhost')
+    client.force_authenticate(user=user)
+
+    initiate = json.dumps(INITIATE_RESPONSE)
+    verification = json.dumps(VERIFICATION_RESPONSE)
+    execute(
+        'ALTER TABLE listings_payment ADD COLUMN payment_response text NULL',
+        'ALTER TABLE listings_payment ADD COLUMN verification_response text NULL',
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('UPDATE listings_payment SET payment_response = %s, verification_response = %s',
+                       [initiate, verification])
+    execute('VACUUM', 'ANALYZE')
+    measure('inline JSON columns (before)', client, args.payments)
+
+    execute(
+        'ALTER TABLE listings_payment DROP COLUMN payment_response',
+        'ALTER TABLE listings_payment DROP COLUMN verification_response',
+        'VACUUM',
+        'ANALYZE',
+    )
+    measure('narrow row (after)', client, args.payments)
+
+    payment = Payment.objects.first()
+    events = [PaymentGatewayEvent.record(payment, 'initiate', INITIATE_RESPONSE),
+              PaymentGatewayEvent.record(payment, 'verify', VERIFICATION_RESPONSE)]
+    stored = sum(len(event.body) for event in events)
+    print(f'gateway payload per payment: {len(initiate) + len(verification)} bytes inline JSON, '
+          f'{stored} bytes as PaymentGatewayEvent bodies ({", ".join(event.encoding for event in events)})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: pricing stays from compiled rate tables.
+
+Seeds ``--listings`` listings, each with two seasons, a weekend rule and
+two length-of-stay rules, compiles every rate table in one pass, then
+prices ``--quotes`` random stays (1-28 nights in the next year):
+
+* ``RateTable.total_cents`` (prefix-sum difference, the hot path);
+* ``RateTable.total`` (the same, returned as a Decimal);
+* for reference, the rules evaluated night by night in Python, on a
+  ``--quotes // 10`` sample.
+
+Usage:
+    python benchmarks/pricing.py --listings 1000 --quotes 1000000
+"""
+
+import argparse
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from common import setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from listings import pricing  # noqa: E402
+from listings.models import Listing, RateRule  # noqa: E402
+
+
+def seed(count, rng, today):
+    listings = Listing.objects.bulk_create(
+        Listing(title=f'Priced {i}', description='bench', location='Bench',
+                price_per_night=Decimal(rng.randrange(4000, 20000)) / 100)
+        for i in range(count)
+    )
+    rules = []
+    for listing in listings:
+        for offset, length in ((rng.randrange(0, 120), 30), (rng.randrange(180, 300), 45)):
+            rules.append(RateRule(
+                listing=listing, kind='season', nightly_price=listing.price_per_night * Decimal('1.4'),
+                start_date=today + timedelta(days=offset), end_date=today + timedelta(days=offset + length),
+            ))
+        rules.append(RateRule(listing=listing, kind='weekend', adjustment_percent=Decimal('15')))
+        rules.append(RateRule(listing=listing, kind='length_of_stay', min_nights=7, adjustment_percent=Decimal('-5')))
+        rules.append(RateRule(listing=listing, kind='length_of_stay', min_nights=28, adjustment_percent=Decimal('-15')))
+    # bulk_create sends no signals; fresh listings have no cached tables anyway.
+    RateRule.objects.bulk_create(rules)
+    return listings
+
+
+def per_night(listing, rules, check_in, check_out):
+    """Reference pricing: every rule evaluated for every night."""
+    total = 0
+    night = check_in
+    while night < check_out:
+        rate = pricing.cents(listing.price_per_night)
+        for rule in rules:
+            if rule.kind == 'season' and rule.start_date <= night <= rule.end_date:
+                rate = pricing.cents(rule.nightly_price)
+        for rule in rules:
+            if rule.kind == 'weekend' and night.weekday() in pricing.WEEKEND_NIGHTS:
+                rate = pricing.adjust(rate, pricing.basis_points(rule.adjustment_percent))
+        total += rate
+        night += timedelta(days=1)
+    nights = (check_out - check_in).days
+    best = max((rule for rule in rules if rule.kind == 'length_of_stay' and rule.min_nights <= nights),
+               key=lambda rule: rule.min_nights, default=None)
+    if best is not None:
+        total = pricing.adjust(total, pricing.basis_points(best.adjustment_percent))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--listings', type=int, default=1000)
+    parser.add_argument('--quotes', type=int, default=1000000)
+    args = parser.parse_args()
+    rng = random.Random(22)
+    today = timezone.localdate()
+
+    seed(args.listings, rng, today)
+    listings = list(Listing.objects.all())
+
+    start = time.perf_counter()
+    tables = pricing.rate_tables(listings)
+    elapsed = time.perf_counter() - start
+    print(f'compiled {len(tables)} rate tables ({settings.PRICING_TABLE_DAYS} nights) '
+          f'in {elapsed * 1000:.0f} ms')
+
+    stays = []
+    for _ in range(args.quotes):
+        check_in = today + timedelta(days=rng.randrange(0, 365))
+        stays.append((tables[rng.choice(listings).pk], check_in, check_in + timedelta(days=rng.randint(1, 28))))
+
+    def run(label, price, sample):
+        start = time.perf_counter()
+        for stay in sample:
+            price(*stay)
+        elapsed = time.perf_counter() - start
+        print(f'{label:<34} {len(sample):8d} quotes {elapsed * 1000:9.0f} ms   {len(sample) / elapsed:10.0f} quotes/s')
+
+    run('rate table, cents', lambda table, check_in, check_out: table.total_cents(check_in, check_out), stays)
+    run('rate table, Decimal', lambda table, check_in, check_out: table.total(check_in, check_out), stays)
+
+    # The reference prices from the same rules the tables were compiled from.
+    by_pk = {listing.pk: listing for listing in listings}
+    rules_of = {id(table): (by_pk[pk], table.rules) for pk, table in tables.items()}
+    sample = stays[:args.quotes // 10]
+    for table, check_in, check_out in sample[:10000]:
+        assert per_night(*rules_of[id(table)], check_in, check_out) == table.total_cents(check_in, check_out)
+    print(f'checked {min(len(sample), 10000)} quotes against per-night pricing')
+    run('per-night rules (reference)',
+        lambda table, check_in, check_out: per_night(*rules_of[id(table)], check_in, check_out), sample)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: cost of the per-request timing middleware.
+
+Times GET /api/listings/ (listing cache off, 20 listings per page) through
+three clients: with no instrumentation at all (no RequestTimingMiddleware,
+no query recorder on the connection, no serializer hooks), with sampling
+off, and with every request sampled (header and log line, logged to
+nowhere). Rounds are interleaved so drift affects all three alike.
+
+Usage:
+    python benchmarks/request_timing.py --requests 2000
+"""
+
+import argparse
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from decimal import Decimal
+
+from common import report, setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from listings import instrumentation  # noqa: E402
+from listings.models import Listing  # noqa: E402
+
+
+@contextmanager
+def uninstrumented():
+    """Run without the middleware, the query recorder and the serializer hooks."""
+    mixin = instrumentation.SerializerTimingMixin
+    hooks = {name: mixin.__dict__[name] for name in ('to_representation', 'to_internal_value')}
+    connection.execute_wrappers.remove(instrumentation.record_query)
+    for name in hooks:
+        delattr(mixin, name)
+    try:
+        with override_settings(MIDDLEWARE=[
+            name for name in settings.MIDDLEWARE if not name.endswith('RequestTimingMiddleware')
+        ]):
+            yield
+    finally:
+        for name, hook in hooks.items():
+            setattr(mixin, name, hook)
+        instrumentation.install_query_recorder(connection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    Listing.objects.bulk_create(
+        Listing(title=f'Timed {i}', description='bench', location='Bench', price_per_night=Decimal('60.00'))
+        for i in range(200)
+    )
+    logging.getLogger('listings.instrumentation').addHandler(logging.NullHandler())
+    logging.getLogger('listings.instrumentation').propagate = False
+
+    url = '/api/listings/'
+    connection.ensure_connection()
+    clients = {}
+    # Each client's handler loads the middleware in force on its first request.
+    for label, context, rate in (('no instrumentation', uninstrumented, 0),
+                                 ('sampling off', nullcontext, 0),
+                                 ('sampling on', nullcontext, 1)):
+        clients[label] = (APIClient(HTTP_HOST='localhost'), context, rate)
+        with context(), override_settings(REQUEST_TIMING_SAMPLE_RATE=rate):
+            clients[label][0].get(url)
+
+    samples = {label: [] for label in clients}
+    with override_settings(LISTING_CACHE_ENABLED=False):
+        for _ in range(args.requests // 10):
+            for label, (client, context, rate) in clients.items():
+                with context(), override_settings(REQUEST_TIMING_SAMPLE_RATE=rate):
+                    for _ in range(10):
+                        start = time.perf_counter()
+                        client.get(url)
+                        samples[label].append((time.perf_counter() - start) * 1000)
+
+    for label, values in samples.items():
+        report(f'GET /api/listings/, {label}', values)
+
+
+if __name__ == '__main__':
+    main()
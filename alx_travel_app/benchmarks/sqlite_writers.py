@@ -0,0 +1,131 @@
+"""
+Benchmark: concurrent booking + webhook writers on SQLite with the
+performance profile (``SQLITE_PERFORMANCE_PROFILE``) off and on.
+
+Each mode runs in its own process on a fresh scratch database:
+``--threads`` clients POST ``--bookings`` bookings each to
+/api/bookings/ (one listing per client) while as many clients deliver
+success webhooks for ``--bookings`` pending payments each. Reports
+throughput and the requests that failed with "database is locked".
+
+Usage:
+    python benchmarks/sqlite_writers.py --threads 8 --bookings 100
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+os.environ.setdefault('CELERY_BROKER_URL', 'memory://')
+os.environ.setdefault('CELERY_RESULT_BACKEND', 'cache+memory://')
+
+
+def run_workload(args):
+    from common import setup_django
+
+    setup_django()
+    # Locked requests log a traceback each; the summary counts them.
+    logging.disable(logging.CRITICAL)
+
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    from listings.models import Booking, Listing, Payment
+
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        journal = cursor.fetchone()[0]
+    print(f'== SQLITE_PERFORMANCE_PROFILE={settings.SQLITE_PERFORMANCE_PROFILE} (journal_mode={journal})')
+
+    user = User.objects.create_user(username='writers')
+    listings = Listing.objects.bulk_create(
+        Listing(title=f'Writers {i}', description='bench', location='Bench', price_per_night=Decimal('10.00'))
+        for i in range(2 * args.threads)
+    )
+    # Webhook targets: pending payments on listings the booking clients don't use.
+    for i in range(args.threads * args.bookings):
+        booking = Booking.objects.create(
+            user=user, listing=listings[args.threads + i % args.threads],
+            check_in_date=date(2040, 1, 1) + timedelta(days=2 * i),
+            check_out_date=date(2040, 1, 2) + timedelta(days=2 * i),
+            number_of_guests=1, total_amount=Decimal('10.00'),
+            user_email='writers@example.com', user_phone='+251900000000',
+        )
+        Payment.objects.create(
+            booking=booking, booking_reference=str(booking.booking_reference),
+            transaction_id=f'TXN-WRITERS-{i}', amount=Decimal('10.00'),
+            user_email='writers@example.com', user_phone='+251900000000',
+        )
+
+    def book(worker, i, client):
+        return client.post('/api/bookings/', {
+            'listing': listings[worker].id,
+            'check_in_date': date(2030, 1, 1) + timedelta(days=2 * i),
+            'check_out_date': date(2030, 1, 2) + timedelta(days=2 * i),
+            'number_of_guests': 1,
+            'user_email': 'writers@example.com',
+            'user_phone': '+251900000000',
+        }, format='json').status_code == 201
+
+    def deliver(worker, i, client):
+        tx_ref = f'TXN-WRITERS-{worker * args.bookings + i}'
+        return client.post('/api/payments/webhook/', {'tx_ref': tx_ref, 'status': 'success'},
+                           format='json').status_code == 200
+
+    def client_loop(job):
+        request, worker = job
+        client = APIClient(HTTP_HOST='localhost', raise_request_exception=False)
+        client.force_authenticate(user=user)
+        try:
+            # Locked writes come back as 500s.
+            ok = sum(request(worker, i, client) for i in range(args.bookings))
+        finally:
+            connection.close()
+        return request.__name__, ok
+
+    jobs = [(book, w) for w in range(args.threads)] + [(deliver, w) for w in range(args.threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        results = list(executor.map(client_loop, jobs))
+    elapsed = time.perf_counter() - start
+
+    for name in ('book', 'deliver'):
+        ok = sum(r[1] for r in results if r[0] == name)
+        total = args.threads * args.bookings
+        print(f'{name:<8} {ok:5d}/{total} ok   {total - ok:5d} failed')
+    ok = sum(r[1] for r in results)
+    print(f'{ok / elapsed:.0f} successful writes/s over {elapsed:.1f} s')
+    print(f'completed payments: {Payment.objects.filter(status="completed").count()}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--bookings', type=int, default=100)
+    parser.add_argument('--profile', choices=['off', 'on'])
+    args = parser.parse_args()
+
+    if args.profile:
+        os.environ['SQLITE_PERFORMANCE_PROFILE'] = 'True' if args.profile == 'on' else 'False'
+        os.environ['DATABASE_URL'] = ''
+        run_workload(args)
+        return
+
+    for profile in ('off', 'on'):
+        subprocess.run(
+            [sys.executable, __file__, '--profile', profile,
+             '--threads', str(args.threads), '--bookings', str(args.bookings)],
+            check=True,
+        )
+
+
+if __name__ == '__main__':
+    main()
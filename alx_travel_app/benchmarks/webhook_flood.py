@@ -0,0 +1,106 @@
+"""
+Benchmark: webhook flood against inline vs queued (inbox) processing.
+
+Seeds ``--payments`` pending payments and replays a retry storm: every
+payment's success webhook is delivered ``--dupes`` times, shuffled. The
+flood is sent once with ``CHAPA_WEBHOOK_MODE=inline`` and once with
+``queue``; for queue mode the time for ``process_webhook_inbox`` to drain
+the inbox is reported as well. Celery runs on the in-memory broker.
+
+Usage:
+    python benchmarks/webhook_flood.py --payments 2000 --dupes 5
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+os.environ.setdefault('CELERY_BROKER_URL', 'memory://')
+os.environ.setdefault('CELERY_RESULT_BACKEND', 'cache+memory://')
+
+from common import report, setup_django  # noqa: E402
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from listings.models import Booking, Listing, Payment, PaymentGatewayEvent, WebhookEvent  # noqa: E402
+from listings.tasks import process_webhook_inbox  # noqa: E402
+
+
+def seed(payments):
+    user = User.objects.create_user(username='flood')
+    listing = Listing.objects.create(
+        title='Flood', description='bench', location='Bench', price_per_night=Decimal('10.00')
+    )
+    for i in range(payments):
+        booking = Booking.objects.create(
+            user=user, listing=listing,
+            check_in_date=date(2030, 1, 1) + timedelta(days=2 * i),
+            check_out_date=date(2030, 1, 2) + timedelta(days=2 * i),
+            number_of_guests=1, total_amount=Decimal('10.00'),
+            user_email='flood@example.com', user_phone='+251900000000',
+        )
+        Payment.objects.create(
+            booking=booking, booking_reference=str(booking.booking_reference),
+            transaction_id=f'TXN-FLOOD-{i}', amount=Decimal('10.00'),
+            user_email='flood@example.com', user_phone='+251900000000',
+        )
+
+
+def reset():
+    Payment.objects.update(status='pending', completed_at=None)
+    PaymentGatewayEvent.objects.all().delete()
+    Booking.objects.update(status='pending')
+    WebhookEvent.objects.all().delete()
+
+
+def flood(client, events):
+    latencies = []
+    start = time.perf_counter()
+    for event in events:
+        t0 = time.perf_counter()
+        response = client.post('/api/payments/webhook/', event, format='json')
+        latencies.append((time.perf_counter() - t0) * 1000)
+        assert response.status_code == 200, response.status_code
+    return latencies, len(events) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--payments', type=int, default=2000)
+    parser.add_argument('--dupes', type=int, default=5)
+    args = parser.parse_args()
+
+    seed(args.payments)
+    events = [
+        {'tx_ref': f'TXN-FLOOD-{i}', 'status': 'success', 'amount': '10.00'}
+        for i in range(args.payments)
+        for _ in range(args.dupes)
+    ]
+    random.Random(0).shuffle(events)
+    client = APIClient(HTTP_HOST='localhost')
+    print(f'{len(events)} deliveries for {args.payments} payments ({args.dupes}x each)')
+
+    for mode in ('inline', 'queue'):
+        reset()
+        settings.CHAPA_WEBHOOK_MODE = mode
+        latencies, rate = flood(client, events)
+        report(f'{mode} webhook ({rate:.0f} events/s)', latencies)
+
+        if mode == 'queue':
+            result = process_webhook_inbox()
+            print(f'inbox drained: {result["processed"]} events in {result["elapsed_seconds"]} s '
+                  f'({result["events_per_second"]} events/s)')
+
+        completed = Payment.objects.filter(status='completed').count()
+        assert completed == args.payments, completed
+
+
+if __name__ == '__main__':
+    main()
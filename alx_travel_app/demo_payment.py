@@ -10,7 +10,7 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
 django.setup()
 
-from listings.models import Listing, Booking, Payment
+from listings.models import Listing, Booking, Payment, PaymentGatewayEvent
 from listings.services import ChapaPaymentService
 from django.contrib.auth.models import User
 from datetime import date, timedelta
@@ -120,10 +120,10 @@ def demonstrate_payment_initiation(booking):
         payment_method='chapa',
         status='pending',
         payment_url=simulated_response['data']['checkout_url'],
-        payment_response=simulated_response,
         user_email=booking.user_email,
         user_phone=booking.user_phone
     )
+    PaymentGatewayEvent.record(payment, 'initiate', simulated_response)
     
     print(f"\n✓ Payment record created: {payment.payment_id}")
     print(f"  Status: {payment.status}")
@@ -160,9 +160,8 @@ def demonstrate_payment_verification(payment):
     print(f"✓ Amount: ETB {simulated_verification['data']['amount']}")
     
     # Update payment status
+    PaymentGatewayEvent.record(payment, 'verify', simulated_verification)
     payment.mark_as_completed()
-    payment.verification_response = simulated_verification
-    payment.save()
     
     # Update booking status
     booking = payment.booking
@@ -1,5 +1,16 @@
+import json
+
 from django.contrib import admin
-from .models import Listing, Booking, Payment
+from django.utils.html import format_html
+from .fulltext import search_listings
+from .models import EmailNotification, Listing, Booking, Payment, PaymentGatewayEvent, RateRule, WebhookEvent
+
+
+class RateRuleInline(admin.TabularInline):
+    """Seasonal, weekend and length-of-stay rates for the listing."""
+    model = RateRule
+    fields = ['kind', 'start_date', 'end_date', 'nightly_price', 'min_nights', 'adjustment_percent']
+    extra = 0
 
 
 @admin.register(Listing)
@@ -7,6 +18,13 @@ class ListingAdmin(admin.ModelAdmin):
     list_display = ['title', 'location', 'price_per_night', 'available', 'created_at']
     list_filter = ['available', 'created_at']
     search_fields = ['title', 'location', 'description']
+    inlines = [RateRuleInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index instead of an icontains scan per field.
+        if not search_term:
+            return queryset, False
+        return search_listings(search_term, queryset), False
 
 
 @admin.register(Booking)
@@ -14,15 +32,35 @@ class BookingAdmin(admin.ModelAdmin):
     list_display = ['booking_reference', 'user', 'listing', 'check_in_date', 'check_out_date', 'status', 'total_amount']
     list_filter = ['status', 'created_at']
     search_fields = ['booking_reference', 'user__username', 'user_email']
+    list_select_related = ['user', 'listing']
+    raw_id_fields = ['user', 'listing']
     readonly_fields = ['booking_reference', 'created_at', 'updated_at']
 
 
+class PaymentGatewayEventInline(admin.TabularInline):
+    """Raw gateway payloads, loaded only on the payment change page."""
+    model = PaymentGatewayEvent
+    fields = ['kind', 'created_at', 'pretty_payload']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Payload')
+    def pretty_payload(self, obj):
+        return format_html('<pre>{}</pre>', json.dumps(obj.payload, indent=2))
+
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ['payment_id', 'booking_reference', 'transaction_id', 'amount', 'status', 'payment_method', 'created_at']
     list_filter = ['status', 'payment_method', 'created_at']
     search_fields = ['payment_id', 'transaction_id', 'chapa_reference', 'booking_reference', 'user_email']
     readonly_fields = ['payment_id', 'created_at', 'updated_at', 'completed_at']
+    raw_id_fields = ['booking']
+    inlines = [PaymentGatewayEventInline]
     fieldsets = (
         ('Payment Information', {
             'fields': ('payment_id', 'booking', 'booking_reference', 'amount', 'currency', 'payment_method')
@@ -36,11 +74,26 @@ class PaymentAdmin(admin.ModelAdmin):
         ('User Information', {
             'fields': ('user_email', 'user_phone')
         }),
-        ('API Responses', {
-            'fields': ('payment_response', 'verification_response'),
-            'classes': ('collapse',)
-        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at', 'completed_at')
         }),
     )
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['tx_ref', 'status', 'received_at', 'attempts', 'processed_at', 'error_message']
+    list_filter = ['status', 'received_at']
+    search_fields = ['tx_ref']
+    readonly_fields = [
+        'tx_ref', 'status', 'payload', 'received_at', 'attempts', 'next_attempt_at', 'processed_at', 'error_message'
+    ]
+
+
+@admin.register(EmailNotification)
+class EmailNotificationAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'payment', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['kind', 'status']
+    list_select_related = ['payment']
+    raw_id_fields = ['payment']
+    readonly_fields = ['claim_token', 'claimed_at', 'created_at', 'sent_at']
@@ -0,0 +1,235 @@
+"""
+Async versions of the payment endpoints for ASGI deployments.
+
+The Chapa round trip is awaited on the shared httpx pool instead of
+blocking a worker thread; database work is handed to ``sync_to_async`` and
+reuses the same helpers as the synchronous views in ``views.py``.
+
+Enable them on the regular payment URLs with ``ASYNC_PAYMENT_VIEWS=True``.
+"""
+import functools
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework import status
+
+from .models import Booking, Payment
+from .serializers import PaymentInitiateSerializer, PaymentVerifySerializer
+from .services import AsyncChapaPaymentService
+from .views import (
+    already_completed_response, apply_verification_result, build_initiate_request,
+    check_booking_payable, handle_webhook_event, record_initiated_payment,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _post_only(view):
+    # Django 4.2's require_POST/csrf_exempt wrap views in sync functions,
+    # which would hide the coroutine from the ASGI handler.
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _json(payload, http_status=status.HTTP_200_OK):
+    return JsonResponse(payload, status=http_status, encoder=DjangoJSONEncoder)
+
+
+def _request_data(request):
+    """Parse a JSON or form-encoded request body."""
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST.dict()
+
+
+@sync_to_async
+def _get_authenticated_user(request):
+    # request.user is resolved lazily from the session, which hits the DB.
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+def _not_authenticated():
+    return _json(
+        {'detail': 'Authentication credentials were not provided.'},
+        status.HTTP_403_FORBIDDEN
+    )
+
+
+@sync_to_async
+def _validate(serializer):
+    return serializer.is_valid()
+
+
+@sync_to_async
+def _prepare_initiation(booking_id, user, callback_url, return_url):
+    booking = (
+        Booking.objects.select_related('payment')
+        .filter(id=booking_id)
+        .first()
+    )
+    if booking is None:
+        return ({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND), None, None
+
+    precheck = check_booking_payable(booking, user)
+    if precheck is not None:
+        return precheck, None, None
+
+    return None, booking, build_initiate_request(booking, user, callback_url, return_url)
+
+
+@sync_to_async
+def _record_initiated_payment(booking, tx_ref, payment_result):
+    with transaction.atomic():
+        return record_initiated_payment(booking, tx_ref, payment_result)
+
+
+@sync_to_async
+def _load_payment_for_verification(transaction_id, user):
+    payment = (
+        Payment.objects.select_related('booking')
+        .filter(transaction_id=transaction_id)
+        .first()
+    )
+    if payment is None:
+        return ({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND), None
+
+    if payment.booking.user_id != user.id and not user.is_staff:
+        return (
+            {'error': 'You do not have permission to verify this payment.'},
+            status.HTTP_403_FORBIDDEN
+        ), None
+
+    if payment.status == 'completed':
+        return already_completed_response(payment), None
+
+    return None, payment
+
+
+@sync_to_async
+def _apply_verification_result(payment, verification_result):
+    return apply_verification_result(payment, verification_result)
+
+
+@sync_to_async
+def _handle_webhook_event(data):
+    return handle_webhook_event(data)
+
+
+@_post_only
+async def initiate_payment(request):
+    """Async variant of ``views.initiate_payment``."""
+    user = await _get_authenticated_user(request)
+    if user is None:
+        return _not_authenticated()
+
+    data = _request_data(request)
+    if data is None:
+        return _json({'error': 'Invalid JSON body'}, status.HTTP_400_BAD_REQUEST)
+
+    serializer = PaymentInitiateSerializer(data=data)
+    if not await _validate(serializer):
+        return _json({'error': serializer.errors}, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        early_response, booking, initiate_kwargs = await _prepare_initiation(
+            serializer.validated_data['booking_id'],
+            user,
+            callback_url=(
+                serializer.validated_data.get('callback_url')
+                or request.build_absolute_uri('/api/payments/webhook/')
+            ),
+            return_url=serializer.validated_data['return_url']
+        )
+        if early_response is not None:
+            return _json(*early_response)
+
+        chapa_service = AsyncChapaPaymentService()
+        payment_result = await chapa_service.initiate_payment(**initiate_kwargs)
+
+        if not payment_result['success']:
+            logger.error(f"Payment initiation failed: {payment_result.get('error')}")
+            return _json(
+                {'error': f"Payment initiation failed: {payment_result.get('error')}"},
+                status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return _json(*await _record_initiated_payment(
+            booking, initiate_kwargs['tx_ref'], payment_result
+        ))
+
+    except Exception as e:
+        logger.error(f"Error initiating payment: {str(e)}", exc_info=True)
+        return _json(
+            {'error': f'An error occurred: {str(e)}'},
+            status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@_post_only
+async def verify_payment(request):
+    """Async variant of ``views.verify_payment``."""
+    user = await _get_authenticated_user(request)
+    if user is None:
+        return _not_authenticated()
+
+    data = _request_data(request)
+    if data is None:
+        return _json({'error': 'Invalid JSON body'}, status.HTTP_400_BAD_REQUEST)
+
+    serializer = PaymentVerifySerializer(data=data)
+    if not serializer.is_valid():
+        return _json({'error': serializer.errors}, status.HTTP_400_BAD_REQUEST)
+
+    transaction_id = serializer.validated_data['transaction_id']
+
+    try:
+        early_response, payment = await _load_payment_for_verification(transaction_id, user)
+        if early_response is not None:
+            return _json(*early_response)
+
+        chapa_service = AsyncChapaPaymentService()
+        verification_result = await chapa_service.verify_payment(transaction_id)
+
+        return _json(*await _apply_verification_result(payment, verification_result))
+
+    except Exception as e:
+        logger.error(f"Error verifying payment: {str(e)}", exc_info=True)
+        return _json(
+            {'error': f'An error occurred: {str(e)}'},
+            status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@_post_only
+async def chapa_webhook(request):
+    """Async variant of ``views.chapa_webhook``."""
+    try:
+        data = _request_data(request)
+        if data is None:
+            return _json({'error': 'Invalid JSON body'}, status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Received Chapa webhook: {data}")
+
+        return _json(*await _handle_webhook_event(data))
+
+    except Exception as e:
+        logger.error(f"Error processing webhook: {str(e)}", exc_info=True)
+        return _json(
+            {'error': 'Internal server error'},
+            status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+chapa_webhook.csrf_exempt = True
@@ -0,0 +1,127 @@
+"""
+Availability calendar for listings.
+
+Every active booking owns one ``BookedNight`` row per night of its stay.
+The unique (listing, night) index makes an overlap check a handful of
+index probes, and makes the database itself reject a double booking.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, Max, Min, OuterRef
+
+from .models import BookedNight, Booking, Listing
+
+# Booking statuses that hold their nights on the calendar.
+ACTIVE_BOOKING_STATUSES = ('pending', 'confirmed', 'completed')
+
+
+class BookingOverlapError(Exception):
+    """Raised when a booking's nights are already taken."""
+
+
+def stay_nights(check_in, check_out):
+    """Return the nights (dates) covered by a stay, excluding check-out."""
+    return [check_in + timedelta(days=i) for i in range((check_out - check_in).days)]
+
+
+def is_available(listing_id, check_in, check_out, exclude_booking_id=None):
+    """Return True if no night in [check_in, check_out) is booked."""
+    nights = BookedNight.objects.filter(
+        listing_id=listing_id,
+        night__gte=check_in,
+        night__lt=check_out,
+    )
+    if exclude_booking_id is not None:
+        nights = nights.exclude(booking_id=exclude_booking_id)
+    return not nights.exists()
+
+
+def available_listings(check_in, check_out, guests=1, location=None, queryset=None):
+    """
+    Return listings with no booked night in [check_in, check_out).
+
+    A single query: an anti-join (NOT EXISTS) against the calendar, probed
+    through the (listing, night) unique index for each candidate listing.
+    """
+    booked = BookedNight.objects.filter(
+        listing=OuterRef('pk'),
+        night__gte=check_in,
+        night__lt=check_out,
+    )
+    queryset = Listing.objects.all() if queryset is None else queryset
+    queryset = queryset.filter(available=True, max_guests__gte=guests)
+    if location:
+        queryset = queryset.filter(location__iexact=location)
+    return queryset.filter(~Exists(booked))
+
+
+def lock_listing(listing_id):
+    """Take a row lock on the listing for the rest of the transaction."""
+    return Listing.objects.select_for_update().only('id').get(pk=listing_id)
+
+
+def reserve_nights(booking):
+    """
+    Add the booking's nights to the calendar.
+
+    Raises:
+        BookingOverlapError: if any night is already booked.
+    """
+    nights = [
+        BookedNight(listing_id=booking.listing_id, booking_id=booking.pk, night=night)
+        for night in stay_nights(booking.check_in_date, booking.check_out_date)
+    ]
+    try:
+        with transaction.atomic():
+            BookedNight.objects.bulk_create(nights)
+    except IntegrityError:
+        raise BookingOverlapError(
+            f"Listing {booking.listing_id} is already booked between "
+            f"{booking.check_in_date} and {booking.check_out_date}."
+        )
+
+
+def release_nights(booking):
+    """Remove the booking's nights from the calendar."""
+    BookedNight.objects.filter(booking_id=booking.pk).delete()
+
+
+def sync_nights(booking):
+    """Bring the calendar in line with the booking's current status and dates."""
+    if booking.status not in ACTIVE_BOOKING_STATUSES:
+        release_nights(booking)
+        return
+
+    held = BookedNight.objects.filter(booking_id=booking.pk).aggregate(
+        first=Min('night'), last=Max('night'), count=Count('id')
+    )
+    nights = (booking.check_out_date - booking.check_in_date).days
+    if (
+        held['count'] == nights
+        and held['first'] == booking.check_in_date
+        and held['last'] == booking.check_out_date - timedelta(days=1)
+    ):
+        return
+
+    with transaction.atomic():
+        release_nights(booking)
+        reserve_nights(booking)
+
+
+def rebuild_calendar():
+    """
+    Recreate the calendar from existing bookings.
+
+    Returns:
+        List of bookings whose nights overlap an earlier booking.
+    """
+    conflicts = []
+    BookedNight.objects.all().delete()
+    bookings = Booking.objects.filter(status__in=ACTIVE_BOOKING_STATUSES).order_by('created_at', 'id')
+    for booking in bookings.iterator():
+        try:
+            reserve_nights(booking)
+        except BookingOverlapError:
+            conflicts.append(booking)
+    return conflicts
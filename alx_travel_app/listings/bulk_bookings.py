@@ -0,0 +1,97 @@
+"""
+Batch booking creation for tour operators.
+
+A batch costs the same handful of queries however many items it holds:
+one locks and loads its listings, one reads the calendar nights in the
+batch's date span, one reads the rate rules of listings whose rate
+table is not cached. Items are checked against the calendar and against
+each other in memory, priced in the same pass, and the accepted ones are
+inserted with two ``bulk_create`` calls in one transaction. Each item gets
+its own result; a rejected item does not stop the others.
+
+``bulk_create`` bypasses ``Booking.save``, so the nights are reserved
+here rather than when each booking is saved.
+"""
+from django.db import transaction
+
+from .availability import stay_nights
+from .metrics import bookings_created
+from .models import BookedNight, Booking, Listing
+from .pricing import rate_tables
+from .serializers import OVERLAP_ERROR
+
+
+def listing_errors(listing, item):
+    """Return the listing-level errors for one item (same messages as a single booking)."""
+    if listing is None:
+        return {'listing': [f'Invalid pk "{item["listing"]}" - object does not exist.']}
+    if not listing.available:
+        return {'listing': ['This listing is not available for booking.']}
+    if item['number_of_guests'] > listing.max_guests:
+        return {'number_of_guests': [f'This listing accommodates at most {listing.max_guests} guests.']}
+    return None
+
+
+def create_bookings(user, items):
+    """
+    Validate, price and create a batch of bookings for ``user``.
+
+    Args:
+        user: The booking owner.
+        items: Validated ``BookingBulkItemSerializer`` data, in request order.
+
+    Returns:
+        One ``(booking, errors)`` pair per item, in order; exactly one of
+        the two is None.
+    """
+    listing_ids = {item['listing'] for item in items}
+    first_night = min(item['check_in_date'] for item in items)
+    last_night = max(item['check_out_date'] for item in items)
+
+    with transaction.atomic():
+        # One row-lock query for the whole batch (see lock_listing).
+        listings = {
+            listing.pk: listing
+            for listing in Listing.objects.select_for_update().filter(pk__in=listing_ids).only(
+                'id', 'title', 'available', 'max_guests', 'price_per_night', 'rates_version'
+            )
+        }
+        taken = set(BookedNight.objects.filter(
+            listing_id__in=listing_ids, night__gte=first_night, night__lt=last_night,
+        ).values_list('listing_id', 'night'))
+        rates = rate_tables(listings.values())
+
+        results = []
+        accepted = []
+        for item in items:
+            listing = listings.get(item['listing'])
+            errors = listing_errors(listing, item)
+            if errors is None:
+                nights = [(listing.pk, night) for night in stay_nights(item['check_in_date'], item['check_out_date'])]
+                if taken.intersection(nights):
+                    errors = {'check_in_date': [OVERLAP_ERROR]}
+            if errors is not None:
+                results.append((None, errors))
+                continue
+
+            # Later items in the batch see this one's nights as taken.
+            taken.update(nights)
+            booking = Booking(
+                user=user, listing=listing,
+                total_amount=rates[listing.pk].total(item['check_in_date'], item['check_out_date']),
+                check_in_date=item['check_in_date'], check_out_date=item['check_out_date'],
+                number_of_guests=item['number_of_guests'],
+                user_email=item['user_email'], user_phone=item['user_phone'],
+            )
+            accepted.append((booking, nights))
+            results.append((booking, None))
+
+        Booking.objects.bulk_create([booking for booking, _ in accepted])
+        BookedNight.objects.bulk_create(
+            BookedNight(listing_id=listing_id, booking_id=booking.pk, night=night)
+            for booking, nights in accepted
+            for listing_id, night in nights
+        )
+    if accepted:
+        bookings_created.inc(len(accepted), source='bulk')
+    return results
@@ -0,0 +1,128 @@
+"""
+Versioned read-through cache for the public listing endpoints.
+
+Serialized listing pages and detail payloads are stored under keys that
+embed a single listings version number. Any ``Listing`` save or delete
+bumps the version (see ``signals.py``), which orphans every cached entry at
+once; orphans simply expire. The ETag is the version plus a digest of the
+URL, so a client revalidating with ``If-None-Match`` gets a 304 without a
+payload lookup, and only for a URL that returned 200 at this version: a
+deleted listing bumped the version, so its old ETag gets the 404.
+
+The cache has two levels. Payloads stay in each process's memory (the
+``listings`` cache), so a hit never fetches a page over the network. The
+version lives in the ``default`` cache, Redis when ``REDIS_CACHE_URL`` is
+set, so a bump in one worker orphans the entries of every worker.
+
+Bulk writes (``bulk_create``, ``QuerySet.update``) send no signals; call
+``invalidate_listing_cache()`` after them.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'listings:version'
+# Cache aliases (settings.CACHES): shared version, per-process payloads.
+VERSION_CACHE = 'default'
+PAYLOAD_CACHE = 'listings'
+
+
+class CacheStats:
+    """Per-process hit/miss counters for a cache (the listing cache by default)."""
+
+    def __init__(self, outcomes=('hits', 'misses', 'not_modified')):
+        self._lock = threading.Lock()
+        self.outcomes = outcomes
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            for outcome in self.outcomes:
+                setattr(self, outcome, 0)
+
+    def record(self, outcome, count=1):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + count)
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                **{outcome: getattr(self, outcome) for outcome in self.outcomes},
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+stats = CacheStats()
+
+
+def current_version():
+    """Return the listings version, creating it if the cache lost it."""
+    cache = caches[VERSION_CACHE]
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so an evicted version never comes back as a
+        # number that older (stale) entries were stored under.
+        cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate_listing_cache():
+    """Orphan every cached listing page and detail payload."""
+    try:
+        caches[VERSION_CACHE].incr(VERSION_KEY)
+    except ValueError:
+        current_version()
+
+
+def _url_digest(request):
+    location = f'{request.get_host()}{request.get_full_path()}'
+    return hashlib.md5(location.encode(), usedforsecurity=False).hexdigest()
+
+
+def cached_response(request, namespace, render):
+    """
+    Serve ``render()``'s response data from the cache when possible.
+
+    Args:
+        request: The DRF request; its host and full path key the entry.
+        namespace: Distinguishes the endpoints sharing the cache
+            (e.g. ``'list'``, ``'detail'``).
+        render: Callable returning the uncached ``Response``.
+
+    Returns:
+        A 304 if the client's ETag is current, otherwise the cached or
+        freshly rendered response. Only 200 responses are stored.
+    """
+    if not settings.LISTING_CACHE_ENABLED:
+        return render()
+
+    version = current_version()
+    digest = _url_digest(request)
+    etag = f'W/"listings-{version}-{digest}"'
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        stats.record('not_modified')
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    key = f'listings:{version}:{namespace}:{digest}'
+    cache = caches[PAYLOAD_CACHE]
+    data = cache.get(key)
+    if data is not None:
+        stats.record('hits')
+        return Response(data, headers={'ETag': etag, 'X-Cache': 'HIT'})
+
+    stats.record('misses')
+    response = render()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, settings.LISTING_CACHE_TIMEOUT)
+        response['ETag'] = etag
+    response['X-Cache'] = 'MISS'
+    return response
@@ -0,0 +1,70 @@
+"""
+Precompiled notification email templates.
+
+The email templates (``templates/listings/emails/``) only output plain
+variables, so their static parts never change between emails. Each
+template is rendered once per worker through Django's (cached) loader with
+a marker in place of every variable, then split into its static chunks and
+variable slots; rendering an email is just joining the chunks with the
+(escaped, for HTML) values. Template tags, inheritance and blocks are all
+resolved at compile time.
+
+Filters and tags that depend on variable values (``|date``, ``{% if %}``)
+cannot be precompiled; format values in the context instead.
+"""
+import html
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from django.template.loader import get_template
+
+MARKER = '\x1f'
+
+
+class CompiledTemplate:
+    """A template reduced to static chunks and the variable between each."""
+
+    def __init__(self, template_name, fields, autoescape):
+        markers = {field: f'{MARKER}{field}{MARKER}' for field in fields}
+        parts = get_template(template_name).render(markers).split(MARKER)
+
+        self.static = parts[0::2]
+        self.fields = parts[1::2]
+        unknown = set(self.fields) - set(fields)
+        if unknown:
+            raise ImproperlyConfigured(
+                f"{template_name} transforms variables and cannot be precompiled: {sorted(unknown)}"
+            )
+        # Same output as django.utils.html.escape without the lazy/SafeString wrapping.
+        self.escape = (lambda value: html.escape(str(value))) if autoescape else str
+
+    def render(self, context):
+        escape_value = self.escape
+        chunks = [self.static[0]]
+        for field, static in zip(self.fields, self.static[1:]):
+            chunks.append(escape_value(context[field]))
+            chunks.append(static)
+        return ''.join(chunks)
+
+
+@lru_cache(maxsize=None)
+def compiled_template(template_name, fields, autoescape):
+    """Return the ``CompiledTemplate`` for a template and context keys."""
+    return CompiledTemplate(template_name, fields, autoescape)
+
+
+def render_email(name, context):
+    """
+    Render the text and HTML bodies of ``listings/emails/<name>``.
+
+    Args:
+        name: Template base name, e.g. ``'payment_confirmation'``.
+        context: Mapping of template variables to values.
+
+    Returns:
+        ``(text, html)`` tuple.
+    """
+    fields = tuple(sorted(context))
+    text = compiled_template(f'listings/emails/{name}.txt', fields, False).render(context)
+    html_body = compiled_template(f'listings/emails/{name}.html', fields, True).render(context)
+    return text, html_body
@@ -0,0 +1,129 @@
+"""
+Full-text search over listing titles, locations and descriptions.
+
+PostgreSQL keeps a weighted ``tsvector`` in a stored generated column
+(``search_vector``) with a GIN index, so the database itself updates it on
+every write. SQLite keeps an FTS5 table keyed by listing id, updated from
+the ``Listing`` save/delete signals (see ``signals.py``) and joined through
+the unmanaged ``ListingSearchEntry`` model. Migration 0013 creates both;
+the column is not on the ``Listing`` model, so the ORM never reads it.
+
+Matches are ranked with title above location above description
+(``ts_rank`` on PostgreSQL, ``bm25`` on SQLite). Bulk writes
+(``bulk_create``, ``QuerySet.update``) send no signals; on SQLite call
+``rebuild_search_index()`` after them.
+"""
+import re
+
+from django.db import connection, connections, transaction
+from django.db.models import BooleanField, F, FloatField, Func, Lookup, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Listing, ListingSearchEntry
+
+# Indexed fields, in FTS5 column order.
+SEARCH_FIELDS = ('title', 'location', 'description')
+
+FTS_TABLE = 'listings_listing_fts'
+# bm25 column weights, matching the tsvector weights A/B/C (migration 0013).
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+PG_COLUMN = 'search_vector'
+PG_INDEX = 'listing_search_vector_idx'
+PG_CONFIG = 'english'
+
+
+def rebuild_search_index(using='default'):
+    """Re-fill the SQLite FTS table from the listings table (PostgreSQL needs nothing)."""
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    columns = ', '.join(SEARCH_FIELDS)
+    with transaction.atomic(using=using), conn.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, {columns}) '
+            f'SELECT id, {columns} FROM {Listing._meta.db_table}'
+        )
+        # Merge the index b-trees written by the bulk insert.
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+
+class Match(Lookup):
+    """``<FTS5 table> MATCH <query>``, on ``ListingSearchEntry.document``."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+ListingSearchEntry._meta.get_field('document').register_lookup(Match)
+
+
+class BM25(Func):
+    """FTS5 ``bm25()``, negated so that higher is better as with ``ts_rank``."""
+    function = 'bm25'
+    template = '-%(function)s(%(expressions)s)'
+    output_field = FloatField()
+
+
+def index_listing(listing):
+    """Write one listing's current text to the SQLite FTS table."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [listing.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) VALUES (%s, %s, %s, %s)",
+            [listing.pk, *(getattr(listing, field) for field in SEARCH_FIELDS)],
+        )
+
+
+def unindex_listing(listing_id):
+    """Drop a deleted listing from the SQLite FTS table."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [listing_id])
+
+
+def search_terms(query):
+    """Split free text into the words every match must contain."""
+    return re.findall(r'\w+', query)
+
+
+def search_listings(query, queryset=None):
+    """
+    Return listings matching every word of ``query``, best match first.
+
+    The rank is annotated as ``search_rank`` (higher is better).
+    """
+    queryset = Listing.objects.all() if queryset is None else queryset
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    table = Listing._meta.db_table
+    if connection.vendor == 'postgresql':
+        text = ' '.join(terms)
+        tsquery = f"plainto_tsquery('{PG_CONFIG}', %s)"
+        matches = RawSQL(f'{table}.{PG_COLUMN} @@ {tsquery}', [text], output_field=BooleanField())
+        rank = RawSQL(f'ts_rank({table}.{PG_COLUMN}, {tsquery})', [text], output_field=FloatField())
+        return queryset.filter(matches).annotate(search_rank=rank).order_by('-search_rank', '-id')
+
+    if connection.vendor == 'sqlite':
+        # Quoted, so FTS5 operators and punctuation in user input are plain words.
+        match = ' '.join(f'"{term}"' for term in terms)
+        # A join, so FTS5 finds the matches and scores them in one pass
+        # (a correlated subquery would re-run the MATCH for every row).
+        rank = BM25(F('search_entry__document'), *(Value(weight) for weight in FTS_WEIGHTS))
+        return queryset.filter(search_entry__document__match=match).annotate(
+            search_rank=rank
+        ).order_by('-search_rank', '-id')
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(location__icontains=term) | Q(description__icontains=term)
+    return queryset.filter(condition)
@@ -0,0 +1,150 @@
+"""
+Geohash indexing for "listings near a point".
+
+A geohash interleaves longitude and latitude bits into a base-32 string,
+so every prefix names a rectangular cell and all points inside a cell
+share that prefix. ``Listing.geohash`` is a plain indexed column: finding
+the listings in a cell is one B-tree range read (``prefix <= geohash <
+prefix + '~'``) on SQLite and PostgreSQL alike, with no spatial extension.
+
+A radius search covers the circle's bounding box with a handful of cells
+(``covering_cells``), reads the candidates in those cells, and keeps the
+ones whose great-circle distance is within the radius.
+"""
+import heapq
+import math
+
+from django.db.models import Q
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 12
+# Sorts after every geohash character, closing a prefix range.
+PREFIX_END = '~'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Radius of the first circle a nearby search tries.
+MIN_SEARCH_KM = 0.5
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """Return the geohash of a point."""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        target, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (target[0] + target[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            target[0] = middle
+        else:
+            target[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return a cell's (height, width) in degrees at ``precision``."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points, in kilometres."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (min_lat, max_lat, min_lng, max_lng) around a circle."""
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+    # Longitude degrees shrink towards the poles; size for the widest edge.
+    widest = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if widest < 1e-6:
+        return min_lat, max_lat, -180.0, 180.0
+    dlng = min(180.0, radius_km / (KM_PER_DEGREE * widest))
+    return min_lat, max_lat, longitude - dlng, longitude + dlng
+
+
+def covering_cells(latitude, longitude, radius_km, max_cells=16):
+    """
+    Return geohash prefixes whose cells together cover the circle.
+
+    Uses the finest precision at which the bounding box spans at most
+    ``max_cells`` cells, so the candidate reads stay close to the circle.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    for precision in range(PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = range(math.floor((min_lat + 90) / height), math.floor((max_lat + 90) / height) + 1)
+        cols = range(math.floor((min_lng + 180) / width), math.floor((max_lng + 180) / width) + 1)
+        if len(rows) * len(cols) <= max_cells or precision == 1:
+            break
+    columns = {col % round(360 / width) for col in cols}
+    cells = set()
+    for row in rows:
+        for col in columns:
+            center_lat = min(90.0, (row + 0.5) * height - 90)
+            cells.add(encode(center_lat, (col + 0.5) * width - 180, precision))
+    return sorted(cells)
+
+
+def cell_ranges(cells):
+    """Merge cells that are adjacent in geohash order into ``(low, high)`` ranges."""
+    ranges = []
+    for cell in sorted(cells):
+        if ranges:
+            low, last = ranges[-1]
+            if last[:-1] == cell[:-1] and BASE32.index(cell[-1]) == BASE32.index(last[-1]) + 1:
+                ranges[-1] = (low, cell)
+                continue
+        ranges.append((cell, cell))
+    return [(low, last + PREFIX_END) for low, last in ranges]
+
+
+def nearest_within(queryset, latitude, longitude, radius_km, limit):
+    """Return up to ``limit`` ``(distance_km, pk)`` within the radius, nearest first."""
+    cells = Q()
+    for low, high in cell_ranges(covering_cells(latitude, longitude, radius_km)):
+        cells |= Q(geohash__gte=low, geohash__lt=high)
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    candidates = queryset.filter(cells, latitude__range=(min_lat, max_lat))
+    if min_lng >= -180 and max_lng <= 180:
+        # Skipped when the box crosses the antimeridian; distance decides.
+        candidates = candidates.filter(longitude__range=(min_lng, max_lng))
+
+    distances = (
+        (haversine_km(latitude, longitude, lat, lng), pk)
+        for pk, lat, lng in candidates.order_by().values_list('pk', 'latitude', 'longitude').iterator()
+    )
+    return heapq.nsmallest(limit, (item for item in distances if item[0] <= radius_km))
+
+
+def nearby_listings(queryset, latitude, longitude, radius_km, limit):
+    """
+    Return up to ``limit`` ``(listing, distance_km)`` pairs within
+    ``radius_km`` of the point, nearest first.
+
+    The search circle starts small and grows until it holds ``limit``
+    listings (those are then the nearest) or reaches ``radius_km``, so a
+    dense city centre never reads every listing out to the full radius.
+    """
+    search_km = min(radius_km, MIN_SEARCH_KM)
+    while True:
+        nearest = nearest_within(queryset, latitude, longitude, search_km, limit)
+        if len(nearest) >= limit or search_km >= radius_km:
+            break
+        # Grow by what the density seen so far says is needed (found
+        # listings scale with the area), between 2x and 8x.
+        growth = 1.25 * math.sqrt(limit / max(len(nearest), 1))
+        search_km = min(radius_km, search_km * min(8.0, max(2.0, growth)))
+
+    listings = queryset.in_bulk([pk for _, pk in nearest])
+    return [(listings[pk], distance) for distance, pk in nearest if pk in listings]
@@ -0,0 +1,180 @@
+"""
+Per-request timing: SQL queries, database time, external HTTP time and
+serializer time.
+
+``RequestTimingMiddleware`` samples ``REQUEST_TIMING_SAMPLE_RATE`` of the
+requests (0 turns it off). For a sampled request it keeps a
+``RequestTimings`` in a context variable, which the hooks below add to:
+
+* ``record_query``: an execute wrapper installed on every database
+  connection (see ``signals.py``);
+* ``external_call``: wraps the Chapa HTTP calls in ``services.py``;
+* ``SerializerTimingMixin``: on the serializers in ``serializers.py``
+  that render responses (listings, bookings and payments), not on the
+  ones that only validate parameters.
+
+The context variable follows the request into ``sync_to_async`` threads,
+so async views are measured too. On unsampled requests each hook costs one
+context variable lookup. Sampled responses get a ``Server-Timing`` header
+(``REQUEST_TIMING_HEADER``) and every sampled request logs one JSON line to
+the ``listings.instrumentation`` logger.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """What one request spent its time on, in milliseconds."""
+    __slots__ = ('started', 'queries', 'db_ms', 'http_calls', 'http_ms', 'serializer_ms', 'serializing')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.http_calls = 0
+        self.http_ms = 0.0
+        self.serializer_ms = 0.0
+        # Nested serializers run inside their parent's timing.
+        self.serializing = False
+
+    def server_timing(self, total_ms):
+        return ', '.join([
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'http;dur={self.http_ms:.1f};desc="{self.http_calls} calls"',
+            f'serialize;dur={self.serializer_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+    def as_record(self, request, response, total_ms):
+        match = getattr(request, 'resolver_match', None)
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 2),
+            'queries': self.queries,
+            'db_ms': round(self.db_ms, 2),
+            'http_calls': self.http_calls,
+            'http_ms': round(self.http_ms, 2),
+            'serializer_ms': round(self.serializer_ms, 2),
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the sampled request."""
+    timings = current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db_ms += (time.perf_counter() - start) * 1000
+
+
+def install_query_recorder(connection):
+    """Add ``record_query`` to a database connection, once."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def external_call():
+    """Time an outbound HTTP call for the sampled request, if any."""
+    timings = current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.http_calls += 1
+        timings.http_ms += (time.perf_counter() - start) * 1000
+
+
+class SerializerTimingMixin:
+    """Count a serializer's input and output conversion as serializer time."""
+
+    def to_representation(self, instance):
+        timings = current.get()
+        if timings is None or timings.serializing:
+            return super().to_representation(instance)
+        return _timed(timings, super().to_representation, instance)
+
+    def to_internal_value(self, data):
+        timings = current.get()
+        if timings is None or timings.serializing:
+            return super().to_internal_value(data)
+        return _timed(timings, super().to_internal_value, data)
+
+
+def _timed(timings, convert, value):
+    timings.serializing = True
+    start = time.perf_counter()
+    try:
+        return convert(value)
+    finally:
+        timings.serializer_ms += (time.perf_counter() - start) * 1000
+        timings.serializing = False
+
+
+def sampled():
+    rate = settings.REQUEST_TIMING_SAMPLE_RATE
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+class RequestTimingMiddleware:
+    """Record sampled requests' timings; see the module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not sampled():
+            return self.get_response(request)
+        timings = RequestTimings()
+        token = current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        if not sampled():
+            return await self.get_response(request)
+        timings = RequestTimings()
+        token = current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total_ms = (time.perf_counter() - timings.started) * 1000
+        if settings.REQUEST_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing(total_ms)
+        logger.info(json.dumps(timings.as_record(request, response, total_ms)))
+        return response
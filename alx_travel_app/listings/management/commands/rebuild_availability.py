@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from listings.availability import rebuild_calendar
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the listing availability calendar from existing bookings.'
+
+    def handle(self, *args, **options):
+        conflicts = rebuild_calendar()
+        for booking in conflicts:
+            self.stdout.write(self.style.WARNING(
+                f'Overlapping booking {booking.booking_reference} '
+                f'(listing {booking.listing_id}, {booking.check_in_date} - {booking.check_out_date})'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Availability calendar rebuilt ({len(conflicts)} conflicting bookings skipped).'
+        ))
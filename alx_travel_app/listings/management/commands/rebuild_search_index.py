@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from listings.fulltext import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the listing full-text index, e.g. after bulk imports.'
+
+    def handle(self, *args, **options):
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Listing search index rebuilt.'))
@@ -0,0 +1,323 @@
+"""
+Process-safe counters and histograms, served in the Prometheus text
+exposition format at ``/metrics``.
+
+Every process (gunicorn worker, Celery prefork child) counts in memory.
+With ``METRICS_DIR`` set, it also writes its totals to
+``<pid>-<start time>.json`` in that directory: from a background thread
+every ``METRICS_FLUSH_INTERVAL`` seconds when something changed, after each
+Celery task (see ``signals.py``) and at exit. The start time keeps a reused pid from overwriting an
+exited process's file. ``/metrics`` then adds up the live totals of the
+serving process and the files of all the others, after folding the files
+of exited processes into ``exited.json`` so the directory stays small and
+counters never go backwards. A forked child starts from zero, so nothing
+the parent counted is counted twice. Without ``METRICS_DIR``, ``/metrics``
+reports the serving process only.
+
+``METRICS_DIR`` must be local to one host (and one pid namespace): whether
+a process has exited is checked with ``os.kill`` on the pid in its file
+name, which means nothing for a process in another container or on another
+machine. Give every container its own directory.
+
+Only the scraper may read ``/metrics``: see ``scrape_allowed``.
+
+Recording never touches the database.
+"""
+import atexit
+import fcntl
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket bounds, in seconds.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0)
+
+# Summed totals of every exited process, in ``METRICS_DIR``.
+EXITED_FILE = 'exited.json'
+
+
+def _running(filename):
+    """Whether the process that wrote ``filename`` (``<pid>-...``) may still run."""
+    try:
+        os.kill(int(filename.split('-')[0].removesuffix('.json')), 0)
+    except ValueError:
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    """The metrics of this process, and their per-process files."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._flusher = None
+        self.reset()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def reset(self):
+        """Forget this process's values (after a fork, or between tests)."""
+        self._lock = threading.Lock()
+        # Serializes writers, so an older snapshot never replaces a newer one.
+        self._write_lock = threading.Lock()
+        self.values = {}
+        self.dirty = False
+        self.filename = f'{os.getpid()}-{time.time_ns()}.json'
+
+    def update(self, name, labels, change):
+        """Apply ``change`` to one sample's value under the registry lock."""
+        with self._lock:
+            samples = self.values.setdefault(name, {})
+            samples[labels] = change(samples.get(labels))
+            self.dirty = True
+            # A thread does not survive a fork, so each process starts its own.
+            if settings.METRICS_DIR and (self._flusher is None or not self._flusher.is_alive()):
+                self._flusher = threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True)
+                self._flusher.start()
+
+    def flush(self):
+        """Write this process's file if anything changed (no-op without ``METRICS_DIR``)."""
+        if not settings.METRICS_DIR:
+            return
+        with self._write_lock:
+            with self._lock:
+                if not self.dirty:
+                    return
+                values = self._snapshot()
+                self.dirty = False
+            try:
+                os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                self._dump(self.filename, values)
+            except OSError:
+                self.dirty = True
+                raise
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception('Could not write metrics to %s', settings.METRICS_DIR)
+
+    def _snapshot(self):
+        """Copy the values; call with the registry lock held."""
+        # Histogram samples are lists updated in place.
+        return {
+            name: {labels: list(value) if isinstance(value, list) else value for labels, value in samples.items()}
+            for name, samples in self.values.items()
+        }
+
+    def _dump(self, filename, values):
+        path = os.path.join(settings.METRICS_DIR, filename)
+        data = {name: list(samples.items()) for name, samples in values.items()}
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(data, file)
+        os.replace(f'{path}.tmp', path)
+
+    def _load(self, filename, totals):
+        """Merge one process file into ``totals``; unreadable files are skipped."""
+        try:
+            with open(os.path.join(settings.METRICS_DIR, filename)) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+        for name, samples in data.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            merged = totals.setdefault(name, {})
+            for labels, value in samples:
+                labels = tuple(tuple(pair) for pair in labels)
+                merged[labels] = metric.merge(merged.get(labels), value)
+        return True
+
+    @contextmanager
+    def _directory_lock(self, operation):
+        """Hold ``flock(operation)`` on ``METRICS_DIR/.lock`` (released on close)."""
+        with open(os.path.join(settings.METRICS_DIR, '.lock'), 'a') as lock:
+            fcntl.flock(lock, operation)
+            yield
+
+    def _fold_exited(self):
+        """Merge the files of exited processes into ``EXITED_FILE``, then delete them."""
+        # Scrapes in other processes fold and read too; the exclusive lock keeps a
+        # file from being added twice, or counted both on its own and in EXITED_FILE.
+        with self._directory_lock(fcntl.LOCK_EX):
+            exited = [
+                filename for filename in os.listdir(settings.METRICS_DIR)
+                if filename.endswith('.json') and filename not in (EXITED_FILE, self.filename)
+                and not _running(filename)
+            ]
+            if not exited:
+                return
+            totals = {}
+            self._load(EXITED_FILE, totals)
+            folded = [filename for filename in exited if self._load(filename, totals)]
+            self._dump(EXITED_FILE, totals)
+            for filename in folded:
+                os.remove(os.path.join(settings.METRICS_DIR, filename))
+
+    def collect(self):
+        """Return ``{name: {labels: value}}`` summed over every process."""
+        with self._lock:
+            totals = self._snapshot()
+        if not settings.METRICS_DIR or not os.path.isdir(settings.METRICS_DIR):
+            return totals
+
+        self._fold_exited()
+        with self._directory_lock(fcntl.LOCK_SH):
+            for filename in os.listdir(settings.METRICS_DIR):
+                if filename.endswith('.json') and filename != self.filename:
+                    self._load(filename, totals)
+        return totals
+
+    def exposition(self):
+        """Render every metric in the text exposition format (version 0.0.4)."""
+        totals = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for labels, value in sorted(totals.get(name, {}).items()):
+                lines.extend(metric.render(labels, value))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.reset)
+atexit.register(registry.flush)
+
+
+def scrape_allowed(request):
+    """
+    Whether ``request`` may read ``/metrics``: it carries the
+    ``METRICS_TOKEN`` bearer token, or comes from an address in
+    ``METRICS_ALLOWED_IPS``.
+    """
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+            return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(allowed, strict=False) for allowed in settings.METRICS_ALLOWED_IPS)
+
+
+def _labels(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f'Expected labels {labelnames}, got {tuple(labels)}')
+    return tuple((name, str(labels[name])) for name in labelnames)
+
+
+def _format(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        registry.update(self.name, _labels(self.labelnames, labels), lambda value: (value or 0) + amount)
+
+    def merge(self, current, other):
+        return (current or 0) + other
+
+    def render(self, labels, value):
+        return [f'{self.name}{_format(labels)} {_number(value)}']
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, with their sum and count."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        def add(sample):
+            # [count per bucket (last is +Inf, not cumulative)..., sum]
+            sample = sample or [0] * (len(self.buckets) + 1) + [0.0]
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            sample[index] += 1
+            sample[-1] += value
+            return sample
+        registry.update(self.name, _labels(self.labelnames, labels), add)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the ``with`` block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def merge(self, current, other):
+        if current is None:
+            return list(other)
+        return [a + b for a, b in zip(current, other)]
+
+    def render(self, labels, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), value[:-1]):
+            cumulative += count
+            le = bound if bound == '+Inf' else _number(float(bound))
+            lines.append(f'{self.name}_bucket{_format(labels, [("le", le)])} {cumulative}')
+        lines.append(f'{self.name}_sum{_format(labels)} {_number(value[-1])}')
+        lines.append(f'{self.name}_count{_format(labels)} {cumulative}')
+        return lines
+
+
+payments_initiated = Counter(
+    'payments_initiated_total', 'Payments initiated with Chapa.')
+payment_transitions = Counter(
+    'payment_transitions_total', 'Payment status transitions, by the status entered.', ['to_status'])
+bookings_created = Counter(
+    'bookings_created_total', 'Bookings created, by endpoint.', ['source'])
+webhooks_received = Counter(
+    'webhooks_received_total', 'Chapa webhooks received, by response status code.', ['status'])
+chapa_latency = Histogram(
+    'chapa_request_duration_seconds', 'Chapa API request latency.', ['operation'])
+task_duration = Histogram(
+    'celery_task_duration_seconds', 'Celery task run time.', ['task', 'state'], buckets=TASK_BUCKETS)
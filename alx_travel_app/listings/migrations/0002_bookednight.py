@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:33
+
+from datetime import timedelta
+
+from django.db import IntegrityError, migrations, models, transaction
+import django.db.models.deletion
+
+# listings.availability.ACTIVE_BOOKING_STATUSES when this migration was written.
+ACTIVE_BOOKING_STATUSES = ('pending', 'confirmed', 'completed')
+
+
+def fill_calendar(apps, schema_editor):
+    """
+    Reserve the nights of existing active bookings, oldest first.
+
+    A booking overlapping an older one keeps no nights, as with
+    ``rebuild_availability``; that command lists such bookings.
+    """
+    Booking = apps.get_model('listings', 'Booking')
+    BookedNight = apps.get_model('listings', 'BookedNight')
+    bookings = Booking.objects.filter(status__in=ACTIVE_BOOKING_STATUSES).order_by('created_at', 'id')
+    for booking in bookings.iterator():
+        nights = (booking.check_out_date - booking.check_in_date).days
+        try:
+            with transaction.atomic():
+                BookedNight.objects.bulk_create(
+                    BookedNight(listing_id=booking.listing_id, booking_id=booking.pk,
+                                night=booking.check_in_date + timedelta(days=i))
+                    for i in range(nights)
+                )
+        except IntegrityError:
+            pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookedNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+            ],
+            options={
+                'ordering': ['night'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', 'check_in_date', 'check_out_date'], name='listings_bo_listing_218909_idx'),
+        ),
+        migrations.AddField(
+            model_name='bookednight',
+            name='booking',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_nights', to='listings.booking'),
+        ),
+        migrations.AddField(
+            model_name='bookednight',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_nights', to='listings.listing'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookednight',
+            constraint=models.UniqueConstraint(fields=('listing', 'night'), name='unique_listing_night'),
+        ),
+        migrations.RunPython(fill_calendar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:33
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_bookednight'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='max_guests',
+            field=models.PositiveIntegerField(default=2, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['-created_at', '-id'], name='listing_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:33
+
+import json
+import zlib
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# (Payment column, PaymentGatewayEvent kind)
+PAYLOAD_COLUMNS = (('payment_response', 'initiate'), ('verification_response', 'verify'))
+
+
+def encode(payload):
+    """Encode a payload as ``PaymentGatewayEvent.record`` does."""
+    body = json.dumps(payload, separators=(',', ':'), default=str).encode()
+    if settings.PAYMENT_GATEWAY_EVENT_COMPRESS:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            return compressed, 'zlib'
+    return body, 'json'
+
+
+def copy_payloads_to_events(apps, schema_editor):
+    """Store each payment's stored Chapa responses as gateway events."""
+    Payment = apps.get_model('listings', 'Payment')
+    PaymentGatewayEvent = apps.get_model('listings', 'PaymentGatewayEvent')
+    payments = Payment.objects.filter(
+        models.Q(payment_response__isnull=False) | models.Q(verification_response__isnull=False)
+    ).only('id', 'payment_response', 'verification_response').order_by('id')
+    events = []
+    for payment in payments.iterator(chunk_size=1000):
+        for column, kind in PAYLOAD_COLUMNS:
+            payload = getattr(payment, column)
+            if payload is not None:
+                body, encoding = encode(payload)
+                events.append(PaymentGatewayEvent(payment_id=payment.pk, kind=kind, encoding=encoding, body=body))
+        if len(events) >= 1000:
+            PaymentGatewayEvent.objects.bulk_create(events)
+            events = []
+    PaymentGatewayEvent.objects.bulk_create(events)
+
+
+def copy_events_to_payloads(apps, schema_editor):
+    """Put each payment's latest initiation and verification payloads back on the row."""
+    Payment = apps.get_model('listings', 'Payment')
+    PaymentGatewayEvent = apps.get_model('listings', 'PaymentGatewayEvent')
+    for column, kind in PAYLOAD_COLUMNS:
+        # Oldest first, so each payment ends up with its latest payload.
+        for event in PaymentGatewayEvent.objects.filter(kind=kind).order_by('created_at', 'id').iterator():
+            body = bytes(event.body)
+            if event.encoding == 'zlib':
+                body = zlib.decompress(body)
+            Payment.objects.filter(pk=event.payment_id).update(**{column: json.loads(body)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_emailnotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentGatewayEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('initiate', 'Initiation response'), ('verify', 'Verification response'), ('webhook', 'Webhook')], max_length=20)),
+                ('encoding', models.CharField(choices=[('json', 'JSON'), ('zlib', 'zlib-compressed JSON')], default='json', max_length=10)),
+                ('body', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gateway_events', to='listings.payment')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['payment', '-created_at'], name='gateway_event_payment_idx')],
+            },
+        ),
+        migrations.RunPython(copy_payloads_to_events, copy_events_to_payloads),
+        migrations.RemoveField(
+            model_name='payment',
+            name='payment_response',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='verification_response',
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_payment_status_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['available', 'location', 'price_per_night'], name='listing_avail_loc_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['available', 'price_per_night'], name='listing_avail_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['available', '-created_at', '-id'], name='listing_avail_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['price_per_night'], name='listing_price_idx'),
+        ),
+    ]
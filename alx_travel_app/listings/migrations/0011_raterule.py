@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:33
+
+from decimal import Decimal
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import listings.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0010_listing_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='rates_version',
+            field=models.BigIntegerField(default=listings.models.new_rates_version, editable=False),
+        ),
+        migrations.CreateModel(
+            name='RateRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('season', 'Seasonal rate'), ('weekend', 'Weekend adjustment'), ('length_of_stay', 'Length-of-stay adjustment')], max_length=20)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('nightly_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('min_nights', models.PositiveIntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(2)])),
+                ('adjustment_percent', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, validators=[django.core.validators.MinValueValidator(Decimal('-90')), django.core.validators.MaxValueValidator(Decimal('500'))])),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rate_rules', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['listing', 'kind', 'start_date'],
+                'indexes': [models.Index(fields=['listing', 'kind'], name='listings_ra_listing_371d81_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-17 09:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """RunSQL that only runs on the given database vendor."""
+
+    def __init__(self, vendor, *args, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+POSTGRESQL_SEARCH_INDEX = [
+    (
+        # Adding the generated column computes it for every existing row.
+        "ALTER TABLE listings_listing ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', title), 'A') || "
+        "setweight(to_tsvector('english', location), 'B') || "
+        "setweight(to_tsvector('english', description), 'C')) STORED",
+        "ALTER TABLE listings_listing DROP COLUMN search_vector",
+    ),
+    (
+        "CREATE INDEX listing_search_vector_idx ON listings_listing USING gin (search_vector)",
+        "DROP INDEX listing_search_vector_idx",
+    ),
+]
+
+SQLITE_SEARCH_INDEX = [
+    (
+        "CREATE VIRTUAL TABLE listings_listing_fts "
+        "USING fts5(title, location, description, tokenize='porter unicode61')",
+        "DROP TABLE listings_listing_fts",
+    ),
+    (
+        "INSERT INTO listings_listing_fts (rowid, title, location, description) "
+        "SELECT id, title, location, description FROM listings_listing",
+        migrations.RunSQL.noop,
+    ),
+    (
+        "INSERT INTO listings_listing_fts (listings_listing_fts) VALUES ('optimize')",
+        migrations.RunSQL.noop,
+    ),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0012_webhookevent_retries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingSearchEntry',
+            fields=[
+                ('listing', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='listings.listing')),
+                ('document', models.TextField(db_column='listings_listing_fts')),
+            ],
+            options={
+                'db_table': 'listings_listing_fts',
+                'managed': False,
+            },
+        ),
+        *(VendorRunSQL('postgresql', sql, reverse_sql) for sql, reverse_sql in POSTGRESQL_SEARCH_INDEX),
+        *(VendorRunSQL('sqlite', sql, reverse_sql) for sql, reverse_sql in SQLITE_SEARCH_INDEX),
+    ]
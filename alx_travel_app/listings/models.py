@@ -1,8 +1,24 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.core.validators import MinValueValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
+import json
+import logging
+import time
 import uuid
+import zlib
+
+from . import geo, metrics
+
+logger = logging.getLogger(__name__)
+
+
+def new_rates_version():
+    """Return a fresh ``Listing.rates_version``; never reused, even after a rollback."""
+    return time.time_ns() // 1000
 
 
 class Listing(models.Model):
@@ -15,15 +31,139 @@ class Listing(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(Decimal('0.01'))]
     )
+    max_guests = models.PositiveIntegerField(default=2, validators=[MinValueValidator(1)])
     available = models.BooleanField(default=True)
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    # Derived from latitude/longitude on save (see listings/geo.py); empty
+    # when the listing has no coordinates. bulk_create callers set it.
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+    # Changes whenever the listing's rate rules do; part of the key its
+    # compiled rate table is cached under (see listings/pricing.py).
+    rates_version = models.BigIntegerField(default=new_rates_version, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        """Save, keeping the geohash in step with the coordinates."""
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='listing_created_id_idx'),
+            # List filters (listings/filters.py): equality on available and
+            # location, then a price range or price ordering.
+            models.Index(fields=['available', 'location', 'price_per_night'], name='listing_avail_loc_price_idx'),
+            models.Index(fields=['available', 'price_per_night'], name='listing_avail_price_idx'),
+            models.Index(fields=['available', '-created_at', '-id'], name='listing_avail_created_idx'),
+            models.Index(fields=['price_per_night'], name='listing_price_idx'),
+            # Nearby search: prefix ranges over the geohash. The other
+            # columns are what the candidate read needs, so it never
+            # touches the table.
+            models.Index(fields=['geohash', 'latitude', 'longitude', 'available'], name='listing_geohash_idx'),
+        ]
+
+
+class ListingSearchEntry(models.Model):
+    """
+    A listing's row in the SQLite FTS5 search index (see ``fulltext.py``).
+
+    The table is created by migration 0013, not from this model, and is
+    written with raw SQL; the model only lets full-text search join it to
+    ``Listing``. ``document`` is the hidden FTS5 column named after the
+    table, the left-hand side of ``MATCH``. There is no such table on
+    PostgreSQL, which searches a generated column instead.
+    """
+    listing = models.OneToOneField(
+        Listing,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name='search_entry',
+    )
+    document = models.TextField(db_column='listings_listing_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'listings_listing_fts'
+
+
+class RateRule(models.Model):
+    """
+    A pricing rule for a listing, on top of its ``price_per_night``.
+
+    * ``season``: nights from ``start_date`` to ``end_date`` (inclusive)
+      cost ``nightly_price``; where seasons overlap, the later-starting
+      one wins.
+    * ``weekend``: Friday and Saturday nights are adjusted by
+      ``adjustment_percent`` (after any season); the newest rule wins.
+    * ``length_of_stay``: stays of at least ``min_nights`` are adjusted
+      by ``adjustment_percent`` as a whole; the longest matching rule wins.
+    """
+    KIND_CHOICES = [
+        ('season', 'Seasonal rate'),
+        ('weekend', 'Weekend adjustment'),
+        ('length_of_stay', 'Length-of-stay adjustment'),
+    ]
+
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='rate_rules')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    nightly_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal('0.01'))]
+    )
+    min_nights = models.PositiveIntegerField(null=True, blank=True, validators=[MinValueValidator(2)])
+    adjustment_percent = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal('-90')), MaxValueValidator(Decimal('500'))]
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.listing_id} {self.kind}"
+
+    def clean(self):
+        required = {
+            'season': ['start_date', 'end_date', 'nightly_price'],
+            'weekend': ['adjustment_percent'],
+            'length_of_stay': ['min_nights', 'adjustment_percent'],
+        }.get(self.kind, [])
+        missing = {field: 'This field is required for this kind of rule.'
+                   for field in required if getattr(self, field) is None}
+        if missing:
+            raise ValidationError(missing)
+        if self.kind == 'season' and self.end_date < self.start_date:
+            raise ValidationError({'end_date': 'End date must not be before start date.'})
+
+    class Meta:
+        ordering = ['listing', 'kind', 'start_date']
+        indexes = [
+            models.Index(fields=['listing', 'kind']),
+        ]
 
 
 class Booking(models.Model):
@@ -57,15 +197,63 @@ class Booking(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"Booking {self.booking_reference} - {self.user.username}"
+        # user_email is on the row, so listing bookings doesn't load each user.
+        return f"Booking {self.booking_reference} - {self.user_email}"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['listing', 'check_in_date', 'check_out_date']),
+            models.Index(fields=['-created_at', '-id'], name='booking_created_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='booking_user_created_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Save, keeping the availability calendar in step in the same transaction.
+
+        Raises:
+            BookingOverlapError: if an active booking's nights are taken;
+                the booking is then not saved either.
+        """
+        from .availability import ACTIVE_BOOKING_STATUSES, reserve_nights, sync_nights
+
+        creating = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if creating:
+                if self.status in ACTIVE_BOOKING_STATUSES:
+                    reserve_nights(self)
+            elif update_fields is None or {'status', 'check_in_date', 'check_out_date'} & set(update_fields):
+                sync_nights(self)
 
     def calculate_total(self):
-        """Calculate total amount based on listing price and duration."""
-        days = (self.check_out_date - self.check_in_date).days
-        return self.listing.price_per_night * days
+        """Calculate total amount from the listing's rates for the stay."""
+        from .pricing import quote
+        return quote(self.listing, self.check_in_date, self.check_out_date)
+
+
+class BookedNight(models.Model):
+    """
+    A single night a listing is occupied by an active booking.
+
+    The unique (listing, night) constraint is the availability calendar:
+    overlapping bookings are rejected by the index instead of a scan over
+    ``Booking``.
+    """
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='booked_nights')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='booked_nights')
+    night = models.DateField()
+
+    def __str__(self):
+        return f"{self.listing_id} @ {self.night}"
+
+    class Meta:
+        ordering = ['night']
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'night'], name='unique_listing_night'),
+        ]
 
 
 class Payment(models.Model):
@@ -112,8 +300,6 @@ class Payment(models.Model):
         default='pending'
     )
     payment_url = models.URLField(max_length=500, null=True, blank=True)
-    payment_response = models.JSONField(null=True, blank=True)
-    verification_response = models.JSONField(null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
     user_email = models.EmailField()
     user_phone = models.CharField(max_length=20)
@@ -129,19 +315,197 @@ class Payment(models.Model):
         indexes = [
             models.Index(fields=['transaction_id']),
             models.Index(fields=['chapa_reference']),
-            models.Index(fields=['status']),
+            # Pending sweep: status = 'pending' AND created_at < cutoff
+            models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='payment_created_id_idx'),
         ]
 
-    def mark_as_completed(self):
-        """Mark payment as completed and update timestamp."""
-        from django.utils import timezone
-        self.status = 'completed'
-        self.completed_at = timezone.now()
-        self.save()
+    # Statuses each status may be entered from. Completed is final; a failed
+    # payment can be initiated again, and can still complete (e.g. a late
+    # success webhook after a verification call that errored).
+    TRANSITIONS = {
+        'pending': ('failed', 'cancelled'),
+        'completed': ('pending', 'failed'),
+        'failed': ('pending',),
+        'cancelled': ('pending',),
+    }
+
+    def transition(self, to_status, **fields):
+        """
+        Move the payment to ``to_status`` if the stored status allows it.
+
+        The check and the write are a single ``UPDATE ... WHERE status IN
+        (...)``, so of several concurrent callers exactly one wins. Only the
+        status, ``updated_at`` and ``fields`` are written.
 
-    def mark_as_failed(self, error_message=None):
-        """Mark payment as failed with optional error message."""
-        self.status = 'failed'
+        Returns:
+            True if this call made the transition. Otherwise the instance's
+            status fields are refreshed from the database and False is
+            returned.
+        """
+        fields = {'status': to_status, 'updated_at': timezone.now(), **fields}
+        won = Payment.objects.filter(
+            pk=self.pk, status__in=self.TRANSITIONS[to_status]
+        ).update(**fields)
+        if won:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            metrics.payment_transitions.inc(to_status=to_status)
+            if to_status == 'completed':
+                logger.info(f"Payment {self.payment_id} completed for booking {self.booking_reference}")
+        else:
+            self.refresh_from_db(fields=['status', 'completed_at', 'error_message'])
+        return bool(won)
+
+    def mark_as_completed(self, **fields):
+        """Mark payment as completed and update timestamp; see ``transition``."""
+        return self.transition('completed', completed_at=timezone.now(), **fields)
+
+    def mark_as_failed(self, error_message=None, **fields):
+        """Mark payment as failed with optional error message; see ``transition``."""
         if error_message:
-            self.error_message = error_message
-        self.save()
+            fields['error_message'] = error_message
+        return self.transition('failed', **fields)
+
+
+class PaymentGatewayEvent(models.Model):
+    """
+    Append-only log of raw Chapa payloads for a payment.
+
+    Initiation and verification responses and webhook bodies are never
+    shown to users, so they live here instead of on the ``Payment`` row,
+    which every payment list and serializer reads. Payloads are stored as
+    JSON bytes, zlib-compressed when ``PAYMENT_GATEWAY_EVENT_COMPRESS`` is
+    on and that makes them smaller.
+    """
+    KIND_CHOICES = [
+        ('initiate', 'Initiation response'),
+        ('verify', 'Verification response'),
+        ('webhook', 'Webhook'),
+    ]
+
+    ENCODING_CHOICES = [
+        ('json', 'JSON'),
+        ('zlib', 'zlib-compressed JSON'),
+    ]
+
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='gateway_events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    encoding = models.CharField(max_length=10, choices=ENCODING_CHOICES, default='json')
+    body = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for payment {self.payment_id}"
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['payment', '-created_at'], name='gateway_event_payment_idx'),
+        ]
+
+    @classmethod
+    def record(cls, payment, kind, payload):
+        """Store ``payload`` (any JSON-serializable value) for ``payment``."""
+        body = json.dumps(payload, separators=(',', ':'), default=str).encode()
+        encoding = 'json'
+        if settings.PAYMENT_GATEWAY_EVENT_COMPRESS:
+            compressed = zlib.compress(body)
+            if len(compressed) < len(body):
+                body, encoding = compressed, 'zlib'
+        return cls.objects.create(payment=payment, kind=kind, encoding=encoding, body=body)
+
+    @property
+    def payload(self):
+        """The decoded payload."""
+        body = bytes(self.body)
+        if self.encoding == 'zlib':
+            body = zlib.decompress(body)
+        return json.loads(body)
+
+
+class WebhookEvent(models.Model):
+    """
+    Append-only inbox of Chapa webhook deliveries.
+
+    In queue mode (``CHAPA_WEBHOOK_MODE=queue``) the webhook endpoint only
+    stores the raw event here and acknowledges it; the
+    ``process_webhook_inbox`` Celery task applies events in batches.
+    Redeliveries of the same tx_ref/status pair are stored once, so an
+    event that cannot be applied yet (its payment is not found, or the
+    handler fails) is retried from here with backoff, not by Chapa. Events
+    given up on are processed with their ``error_message`` kept.
+    """
+    tx_ref = models.CharField(max_length=255)
+    status = models.CharField(max_length=20)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Webhook {self.tx_ref} - {self.status}"
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['tx_ref', 'status'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            # Only unprocessed rows are indexed, so the consumer's scan stays
+            # small however long the inbox grows.
+            models.Index(
+                fields=['id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='webhook_event_pending_idx',
+            ),
+        ]
+
+
+class EmailNotification(models.Model):
+    """
+    Outbox of payment emails waiting to be sent.
+
+    Rows are written in the same transaction as the payment change that
+    triggers them and sent in batches over one SMTP connection by the
+    ``send_queued_emails`` task (see ``notifications.py``).
+    """
+    KIND_CHOICES = [
+        ('payment_confirmation', 'Payment confirmation'),
+        ('payment_failed', 'Payment failed'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    reason = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.UUIDField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for payment {self.payment_id} - {self.status}"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_due_idx'),
+            models.Index(fields=['claim_token'], name='notification_claim_idx'),
+        ]
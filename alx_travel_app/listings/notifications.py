@@ -0,0 +1,252 @@
+"""
+Batched delivery of payment notification emails.
+
+Notifications are queued as ``EmailNotification`` rows in the same
+transaction as the payment change that triggers them. The first
+notification queued in a window schedules ``tasks.send_queued_emails``
+``EMAIL_BATCH_WAIT_SECONDS`` later; everything queued meanwhile rides
+along, and each batch of up to ``EMAIL_BATCH_SIZE`` messages is sent over
+a single SMTP connection.
+
+Retries stay per message: a message that fails is retried on its own with
+the same backoff the old per-email Celery tasks used, and marked failed
+after ``EMAIL_MAX_RETRIES`` retries.
+"""
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .email_templates import render_email
+from .models import EmailNotification
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SCHEDULED_KEY = 'notifications:flush-scheduled'
+
+# A worker that died mid-batch leaves rows in 'sending'; they are picked
+# up again after this long.
+STALE_CLAIM_AFTER = timedelta(minutes=10)
+
+
+def schedule_flush(countdown=None):
+    """Schedule one ``send_queued_emails`` run per batching window."""
+    from .tasks import send_queued_emails
+
+    countdown = settings.EMAIL_BATCH_WAIT_SECONDS if countdown is None else countdown
+    if cache.add(FLUSH_SCHEDULED_KEY, True, timeout=max(countdown, 1)):
+        transaction.on_commit(lambda: send_queued_emails.apply_async(countdown=countdown))
+
+
+def queue_payment_confirmation(*payment_ids):
+    """Queue confirmation emails for the given payments."""
+    EmailNotification.objects.bulk_create(
+        EmailNotification(kind='payment_confirmation', payment_id=payment_id)
+        for payment_id in payment_ids
+    )
+    schedule_flush()
+
+
+def queue_payment_failed(payment_id, reason):
+    """Queue a payment failure email."""
+    EmailNotification.objects.create(kind='payment_failed', payment_id=payment_id, reason=reason)
+    schedule_flush()
+
+
+def email_context(notification):
+    """Template variables for a notification, formatted as strings."""
+    payment = notification.payment
+    booking = payment.booking
+    context = {
+        'booking_reference': str(booking.booking_reference),
+        'listing_title': booking.listing.title,
+        'total_amount': str(booking.total_amount),
+    }
+
+    if notification.kind == 'payment_confirmation':
+        context['subject'] = f'Payment Confirmation - Booking {booking.booking_reference}'
+        context.update({
+            'check_in_date': str(booking.check_in_date),
+            'check_out_date': str(booking.check_out_date),
+            'number_of_guests': str(booking.number_of_guests),
+            'payment_id': str(payment.payment_id),
+            'transaction_id': str(payment.transaction_id),
+            'payment_date': str(payment.completed_at),
+        })
+    else:
+        context['subject'] = f'Payment Failed - Booking {booking.booking_reference}'
+        context['reason'] = notification.reason
+
+    return context
+
+
+def build_message(notification):
+    """Build the multipart (text + HTML) message for a notification with its payment loaded."""
+    context = email_context(notification)
+    text, html = render_email(notification.kind, context)
+
+    message = EmailMultiAlternatives(
+        subject=context['subject'],
+        body=text,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[notification.payment.user_email],
+    )
+    message.attach_alternative(html, 'text/html')
+    return message
+
+
+def claim_batch(batch_size):
+    """
+    Claim up to ``batch_size`` due notifications for this worker.
+
+    Rows are claimed with a conditional UPDATE and a fresh token, so two
+    workers flushing at once never send the same message.
+    """
+    now = timezone.now()
+    due = (
+        EmailNotification.objects
+        .filter(
+            Q(status='pending', next_attempt_at__lte=now)
+            | Q(status='sending', claimed_at__lt=now - STALE_CLAIM_AFTER)
+        )
+        .order_by('id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    token = uuid.uuid4()
+    claimed = EmailNotification.objects.filter(
+        Q(status='pending') | Q(status='sending', claimed_at__lt=now - STALE_CLAIM_AFTER),
+        id__in=list(due),
+    ).update(status='sending', claim_token=token, claimed_at=now)
+    if not claimed:
+        return []
+    return list(
+        EmailNotification.objects
+        .filter(claim_token=token)
+        .select_related('payment__booking__listing')
+    )
+
+
+def _record_failure(notification, error, now):
+    notification.attempts += 1
+    notification.last_error = str(error)
+    if notification.attempts > settings.EMAIL_MAX_RETRIES:
+        notification.status = 'failed'
+        logger.error(f"Giving up on email {notification.id} after {notification.attempts} attempts: {error}")
+    else:
+        notification.status = 'pending'
+        notification.next_attempt_at = now + timedelta(seconds=60 * (2 ** (notification.attempts - 1)))
+        logger.warning(f"Email {notification.id} failed, will retry: {error}")
+
+
+def _save_failures(notifications):
+    for notification in notifications:
+        notification.claim_token = None
+    EmailNotification.objects.bulk_update(
+        notifications, ['status', 'attempts', 'next_attempt_at', 'last_error', 'claim_token']
+    )
+
+
+def fail_batch(notifications, error):
+    """Record ``error`` against every claimed notification."""
+    now = timezone.now()
+    for notification in notifications:
+        _record_failure(notification, error, now)
+    _save_failures(notifications)
+    failed = sum(1 for notification in notifications if notification.status == 'failed')
+    return 0, len(notifications) - failed, failed
+
+
+def send_batch(notifications, connection):
+    """
+    Send claimed notifications over ``connection``, one message at a time.
+
+    Returns:
+        ``(sent, retried, failed)`` counts.
+    """
+    sent_ids = []
+    failures = []
+    for notification in notifications:
+        try:
+            connection.send_messages([build_message(notification)])
+        except Exception as e:
+            _record_failure(notification, e, timezone.now())
+            failures.append(notification)
+            # The SMTP session may be unusable after an error.
+            connection.close()
+        else:
+            sent_ids.append(notification.id)
+
+    # Sent rows share one plain UPDATE (sent_at is when the batch finished);
+    # only the rare failures need per-row values.
+    if sent_ids:
+        EmailNotification.objects.filter(id__in=sent_ids).update(
+            status='sent', sent_at=timezone.now(), last_error=None, claim_token=None
+        )
+    if failures:
+        _save_failures(failures)
+
+    failed = sum(1 for notification in failures if notification.status == 'failed')
+    return len(sent_ids), len(failures) - failed, failed
+
+
+def send_pending_notifications(batch_size=None):
+    """
+    Send every due notification, ``batch_size`` messages per SMTP connection.
+
+    Returns:
+        Summary dict with sent/retried/failed counts and throughput.
+    """
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    started = time.monotonic()
+    sent = retried = failed = 0
+
+    # Let notifications queued from now on schedule the next run.
+    cache.delete(FLUSH_SCHEDULED_KEY)
+
+    while True:
+        notifications = claim_batch(batch_size)
+        if not notifications:
+            break
+
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            # Nothing can be sent now; every claimed message backs off.
+            logger.error(f"Could not connect to the mail server: {str(e)}")
+            batch_sent, batch_retried, batch_failed = fail_batch(notifications, e)
+        else:
+            try:
+                batch_sent, batch_retried, batch_failed = send_batch(notifications, connection)
+            finally:
+                connection.close()
+
+        sent += batch_sent
+        retried += batch_retried
+        failed += batch_failed
+        logger.info(f"Sent {batch_sent} of {len(notifications)} queued emails")
+
+    next_retry = (
+        EmailNotification.objects.filter(status='pending')
+        .order_by('next_attempt_at')
+        .values_list('next_attempt_at', flat=True)
+        .first()
+    )
+    if next_retry is not None:
+        schedule_flush(countdown=max((next_retry - timezone.now()).total_seconds(), 0))
+
+    elapsed = time.monotonic() - started
+    return {
+        'sent': sent,
+        'retried': retried,
+        'failed': failed,
+        'elapsed_seconds': round(elapsed, 3),
+        'messages_per_second': round(sent / elapsed, 1) if elapsed else None,
+    }
@@ -0,0 +1,75 @@
+from django.conf import settings
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the models' default ``-created_at`` ordering.
+
+    Pages are fetched with ``WHERE created_at < <cursor> ... LIMIT n`` on a
+    (created_at, id) index, so there is no COUNT(*) and deep pages cost
+    the same as the first one.
+    """
+    ordering = ('-created_at', '-id')
+
+
+PAGINATION_STYLES = {
+    'cursor': CreatedAtCursorPagination,
+    'page': PageNumberPagination,
+}
+
+
+class EndpointPagination(BasePagination):
+    """
+    Pagination whose style is chosen per endpoint in ``settings.API_PAGINATION``.
+
+    Subclasses set ``endpoint``; the matching setting is ``'cursor'`` (the
+    default) or ``'page'`` for clients that still need page numbers and a
+    total count.
+    """
+    endpoint = None
+
+    def __init__(self):
+        style = settings.API_PAGINATION.get(self.endpoint, 'cursor')
+        self.delegate = PAGINATION_STYLES[style]()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.delegate.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.delegate.get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return self.delegate.get_schema_operation_parameters(view)
+
+    def get_results(self, data):
+        return self.delegate.get_results(data)
+
+    def to_html(self):
+        return self.delegate.to_html()
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.delegate, 'display_page_controls', False)
+
+
+class ListingPagination(EndpointPagination):
+    endpoint = 'listings'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Full-text results are ordered by rank, which has no keyset to
+        # page on, so ?q= searches always get page numbers.
+        if request.query_params.get('q'):
+            self.delegate = PageNumberPagination()
+        return super().paginate_queryset(queryset, request, view)
+
+
+class BookingPagination(EndpointPagination):
+    endpoint = 'bookings'
+
+
+class PaymentPagination(EndpointPagination):
+    endpoint = 'payments'
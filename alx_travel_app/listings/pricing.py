@@ -0,0 +1,183 @@
+"""
+Nightly pricing from per-listing rate rules.
+
+A listing's ``RateRule`` rows are compiled once into a rate table: the
+price of every night over the next ``PRICING_TABLE_DAYS`` days, in cents,
+stored as running totals. Pricing a stay is then two array reads and a
+subtraction (``prefix[check_out] - prefix[check_in]``) plus a lookup of
+the length-of-stay adjustment, whatever the stay's length.
+
+Tables are cached per process, least recently used first out, under the
+listing's ``(rates_version, price_per_night)``. Saving or deleting a rule
+gives its listing a new ``rates_version`` (see ``signals.py``), so every
+process recompiles on its next quote. Stays outside the table's window are
+priced from the same rules in a one-off table.
+"""
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import accumulate
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Listing, RateRule, new_rates_version
+
+# Nights a weekend rule applies to (date.weekday(): Friday, Saturday).
+WEEKEND_NIGHTS = (4, 5)
+CENT = Decimal('0.01')
+
+
+def cents(amount):
+    """Convert a Decimal amount to integer cents."""
+    return int((amount / CENT).to_integral_value(ROUND_HALF_UP))
+
+
+def basis_points(percent):
+    """Convert a percent adjustment to a multiplier in 1/10000ths (+15 -> 11500)."""
+    return 10000 + int((percent * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def adjust(amount_cents, points):
+    """Apply a basis-point multiplier to cents, rounding half up."""
+    return (amount_cents * points + 5000) // 10000
+
+
+class RateTable:
+    """Compiled rates for one listing: running totals per night from ``start``."""
+    __slots__ = ('key', 'start', 'prefix', 'min_nights', 'stay_points', 'rules', 'price')
+
+    def __init__(self, key, price, rules, start, days):
+        self.key = key
+        self.price = price
+        self.rules = rules
+        self.start = start.toordinal()
+
+        rates = [cents(price)] * days
+        seasons = sorted((rule for rule in rules if rule.kind == 'season'), key=lambda rule: (rule.start_date, rule.pk or 0))
+        for rule in seasons:
+            first = max(0, rule.start_date.toordinal() - self.start)
+            last = min(days, rule.end_date.toordinal() - self.start + 1)
+            if first < last:
+                rates[first:last] = [cents(rule.nightly_price)] * (last - first)
+
+        weekend = max((rule for rule in rules if rule.kind == 'weekend'), key=lambda rule: rule.pk or 0, default=None)
+        if weekend is not None:
+            points = basis_points(weekend.adjustment_percent)
+            for weekday in WEEKEND_NIGHTS:
+                first = (weekday - start.weekday()) % 7
+                rates[first::7] = [adjust(rate, points) for rate in rates[first::7]]
+
+        self.prefix = array('q', accumulate(rates, initial=0))
+        stays = sorted((rule.min_nights, basis_points(rule.adjustment_percent))
+                       for rule in rules if rule.kind == 'length_of_stay')
+        self.min_nights = [nights for nights, _ in stays]
+        self.stay_points = [points for _, points in stays]
+
+    def covers(self, check_in, check_out):
+        return self.start <= check_in.toordinal() and check_out.toordinal() - self.start < len(self.prefix)
+
+    def total_cents(self, check_in, check_out):
+        """Price ``[check_in, check_out)`` in cents; the stay must be covered."""
+        first = check_in.toordinal() - self.start
+        last = check_out.toordinal() - self.start
+        total = self.prefix[last] - self.prefix[first]
+        match = bisect_right(self.min_nights, last - first)
+        if match:
+            total = adjust(total, self.stay_points[match - 1])
+        return total
+
+    def total(self, check_in, check_out):
+        """Price ``[check_in, check_out)`` as a Decimal amount."""
+        if not self.covers(check_in, check_out):
+            nights = (check_out - check_in).days
+            return RateTable(self.key, self.price, self.rules, check_in, nights).total(check_in, check_out)
+        return Decimal(self.total_cents(check_in, check_out)).scaleb(-2)
+
+
+class RateTableCache:
+    """Per-process LRU of compiled rate tables, keyed by listing id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = OrderedDict()
+
+    def get(self, listing_id, key):
+        with self._lock:
+            table = self._tables.get(listing_id)
+            if table is None or table.key != key:
+                return None
+            self._tables.move_to_end(listing_id)
+            return table
+
+    def put(self, listing_id, table):
+        with self._lock:
+            self._tables[listing_id] = table
+            self._tables.move_to_end(listing_id)
+            while len(self._tables) > settings.PRICING_CACHE_SIZE:
+                self._tables.popitem(last=False)
+
+    def forget(self, listing_id):
+        with self._lock:
+            self._tables.pop(listing_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+
+tables = RateTableCache()
+
+
+def table_key(listing):
+    """The cache key for a listing's table: anything a table is compiled from."""
+    return listing.rates_version, listing.price_per_night
+
+
+def rate_tables(listings):
+    """
+    Return ``{listing.pk: RateTable}`` for ``listings``, compiling the
+    missing ones with a single rule query.
+    """
+    result = {}
+    missing = {}
+    for listing in listings:
+        table = tables.get(listing.pk, table_key(listing))
+        if table is None:
+            missing[listing.pk] = listing
+        else:
+            result[listing.pk] = table
+    if missing:
+        rules = {pk: [] for pk in missing}
+        for rule in RateRule.objects.filter(listing_id__in=missing):
+            rules[rule.listing_id].append(rule)
+        start = timezone.localdate()
+        for pk, listing in missing.items():
+            table = RateTable(table_key(listing), listing.price_per_night, tuple(rules[pk]),
+                              start, settings.PRICING_TABLE_DAYS)
+            tables.put(pk, table)
+            result[pk] = table
+    return result
+
+
+def rate_table(listing):
+    """Return the (cached) rate table for one listing."""
+    return rate_tables([listing])[listing.pk]
+
+
+def quote(listing, check_in, check_out):
+    """Return the total price of the nights in ``[check_in, check_out)``."""
+    return rate_table(listing).total(check_in, check_out)
+
+
+def forget_listing(listing_id):
+    """Drop a listing's table from this process's cache."""
+    tables.forget(listing_id)
+
+
+def rules_changed(listing_id):
+    """Give a listing a new rates version, so every process recompiles its table."""
+    Listing.objects.filter(pk=listing_id).update(rates_version=new_rates_version())
+    forget_listing(listing_id)
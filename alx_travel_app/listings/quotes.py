@@ -0,0 +1,95 @@
+"""
+Price quotes for many listings over one date range.
+
+Search result pages ask for the same (listing, dates) totals over and over.
+Each total is memoized per process, least recently used first out, for
+``QUOTE_CACHE_TIMEOUT`` seconds, under the listing's pricing key
+(``rates_version`` and ``price_per_night``, see ``pricing.table_key``).
+A price or rule change therefore never serves a stale total: the old
+entries stop matching and age out. A quote request costs one query for
+the listings, plus one rule query when a rate table has to be compiled.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .cache import CacheStats
+from .models import Listing
+from .pricing import rate_tables, table_key
+
+stats = CacheStats(outcomes=('hits', 'misses', 'expired'))
+
+
+class QuoteMemo:
+    """Per-process LRU of quoted totals with a time-to-live."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = OrderedDict()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._totals.get(key)
+            if entry is None:
+                return None
+            expires, total = entry
+            if expires <= now:
+                del self._totals[key]
+                stats.record('expired')
+                return None
+            self._totals.move_to_end(key)
+            return total
+
+    def put(self, key, total, now):
+        with self._lock:
+            self._totals[key] = (now + settings.QUOTE_CACHE_TIMEOUT, total)
+            self._totals.move_to_end(key)
+            while len(self._totals) > settings.QUOTE_CACHE_SIZE:
+                self._totals.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+
+    def __len__(self):
+        return len(self._totals)
+
+
+memo = QuoteMemo()
+
+
+def quote_listings(listing_ids, check_in, check_out):
+    """
+    Price ``[check_in, check_out)`` at every available listing in ``listing_ids``.
+
+    Returns:
+        ``{listing_id: total}`` for the listings that exist and are
+        available; the others are left out.
+    """
+    # available=True would compile to a bare `WHERE available`, which
+    # SQLite cannot match against an index; IN gives it an equality.
+    listings = Listing.objects.filter(pk__in=listing_ids, available__in=[True]).only(
+        'id', 'price_per_night', 'rates_version'
+    )
+    now = time.monotonic()
+    totals = {}
+    unpriced = []
+    for listing in listings:
+        key = (listing.pk, check_in, check_out, *table_key(listing))
+        total = memo.get(key, now)
+        if total is None:
+            unpriced.append((key, listing))
+        else:
+            totals[listing.pk] = total
+    stats.record('hits', len(totals))
+    stats.record('misses', len(unpriced))
+
+    if unpriced:
+        tables = rate_tables(listing for _, listing in unpriced)
+        for key, listing in unpriced:
+            total = tables[listing.pk].total(check_in, check_out)
+            memo.put(key, total, now)
+            totals[listing.pk] = total
+    return totals
@@ -1,17 +1,35 @@
 from rest_framework import serializers
+from django.conf import settings
+from django.db import transaction
+from .availability import BookingOverlapError, is_available, lock_listing
+from .instrumentation import SerializerTimingMixin
 from .models import Listing, Booking, Payment
+from .pricing import quote
 from django.contrib.auth.models import User
 
+OVERLAP_ERROR = 'This listing is already booked for some of the selected dates.'
 
-class ListingSerializer(serializers.ModelSerializer):
+
+class ListingSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     """Serializer for Listing model."""
     class Meta:
         model = Listing
-        fields = ['id', 'title', 'description', 'location', 'price_per_night', 'available', 'created_at', 'updated_at']
+        fields = [
+            'id', 'title', 'description', 'location', 'price_per_night', 'max_guests',
+            'available', 'latitude', 'longitude', 'created_at', 'updated_at'
+        ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate(self, data):
+        """Coordinates are set (or cleared) as a pair."""
+        latitude = data.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = data.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError('Latitude and longitude must be given together.')
+        return data
 
-class BookingSerializer(serializers.ModelSerializer):
+
+class BookingSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     """Serializer for Booking model."""
     listing_title = serializers.CharField(source='listing.title', read_only=True)
     username = serializers.CharField(source='user.username', read_only=True)
@@ -25,6 +43,20 @@ class BookingSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'booking_reference', 'created_at', 'updated_at']
 
+    # Columns read when rendering a booking; listing/user are joined for
+    # ``listing_title`` and ``username`` instead of being fetched per row.
+    READ_ONLY_COLUMNS = [
+        'id', 'booking_reference', 'user', 'listing', 'check_in_date',
+        'check_out_date', 'number_of_guests', 'total_amount', 'status',
+        'user_email', 'user_phone', 'created_at', 'updated_at',
+        'listing__title', 'user__username',
+    ]
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Join and project everything the serializer reads in one query."""
+        return queryset.select_related('listing', 'user').only(*cls.READ_ONLY_COLUMNS)
+
     def validate(self, data):
         """Validate booking dates."""
         check_in = data.get('check_in_date')
@@ -36,10 +68,26 @@ class BookingSerializer(serializers.ModelSerializer):
                     'check_out_date': 'Check-out date must be after check-in date.'
                 })
 
+        if self.instance is not None and self.instance.status != 'cancelled':
+            listing = data.get('listing', self.instance.listing)
+            check_in = check_in or self.instance.check_in_date
+            check_out = check_out or self.instance.check_out_date
+            if not is_available(listing.pk, check_in, check_out, exclude_booking_id=self.instance.pk):
+                raise serializers.ValidationError({'check_in_date': OVERLAP_ERROR})
+
         return data
 
+    def update(self, instance, validated_data):
+        """Update booking, rejecting date changes that collide with another booking."""
+        try:
+            with transaction.atomic():
+                lock_listing(validated_data.get('listing', instance.listing).pk)
+                return super().update(instance, validated_data)
+        except BookingOverlapError:
+            raise serializers.ValidationError({'check_in_date': OVERLAP_ERROR})
+
 
-class BookingCreateSerializer(serializers.ModelSerializer):
+class BookingCreateSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     """Serializer for creating bookings."""
     class Meta:
         model = Booking
@@ -65,6 +113,15 @@ class BookingCreateSerializer(serializers.ModelSerializer):
                 'listing': 'This listing is not available for booking.'
             })
 
+        if data.get('number_of_guests', 1) > listing.max_guests:
+            raise serializers.ValidationError({
+                'number_of_guests': f'This listing accommodates at most {listing.max_guests} guests.'
+            })
+
+        # Fast path; the calendar's unique index is the final word in create().
+        if not is_available(listing.pk, check_in, check_out):
+            raise serializers.ValidationError({'check_in_date': OVERLAP_ERROR})
+
         return data
 
     def create(self, validated_data):
@@ -73,17 +130,125 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         check_in = validated_data['check_in_date']
         check_out = validated_data['check_out_date']
         
-        # Calculate total amount
-        days = (check_out - check_in).days
-        total_amount = listing.price_per_night * days
-        
-        validated_data['total_amount'] = total_amount
+        validated_data['total_amount'] = quote(listing, check_in, check_out)
         validated_data['user'] = self.context['request'].user
         
-        return super().create(validated_data)
+        # The listing row lock serializes concurrent bookings of one listing;
+        # saving the booking reserves its nights (see Booking.save).
+        try:
+            with transaction.atomic():
+                lock_listing(listing.pk)
+                return super().create(validated_data)
+        except BookingOverlapError:
+            raise serializers.ValidationError({'check_in_date': OVERLAP_ERROR})
+
+
+class BookingBulkItemSerializer(serializers.ModelSerializer):
+    """One item of a bulk booking request; listing checks run per batch."""
+    # A plain id, so validating an item doesn't load its listing.
+    listing = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = Booking
+        fields = [
+            'listing', 'check_in_date', 'check_out_date', 'number_of_guests',
+            'user_email', 'user_phone'
+        ]
+
+    def validate(self, data):
+        """Validate booking dates."""
+        if data['check_out_date'] <= data['check_in_date']:
+            raise serializers.ValidationError({
+                'check_out_date': 'Check-out date must be after check-in date.'
+            })
+        return data
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class BookingBulkCreateSerializer(serializers.Serializer):
+    """Serializer for a bulk booking request; items are validated one by one."""
+    bookings = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_bookings(self, value):
+        if len(value) > settings.BULK_BOOKING_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'At most {settings.BULK_BOOKING_MAX_ITEMS} bookings can be created per request.'
+            )
+        return value
+
+
+class ListingSearchSerializer(serializers.Serializer):
+    """Serializer for listing availability search parameters."""
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    guests = serializers.IntegerField(min_value=1, default=1)
+    location = serializers.CharField(max_length=255, required=False, allow_blank=True)
+
+    def validate(self, data):
+        """Validate search dates."""
+        if data['check_out'] <= data['check_in']:
+            raise serializers.ValidationError({
+                'check_out': 'Check-out date must be after check-in date.'
+            })
+        return data
+
+
+class ListingQuoteSerializer(serializers.Serializer):
+    """Serializer for quote parameters: one date range, comma-separated listing ids."""
+    MAX_LISTINGS = 100
+
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    listings = serializers.CharField()
+
+    def validate_listings(self, value):
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in value.split(',') if pk.strip()))
+        except ValueError:
+            raise serializers.ValidationError('Expected comma-separated listing ids.')
+        if not ids:
+            raise serializers.ValidationError('At least one listing id is required.')
+        if len(ids) > self.MAX_LISTINGS:
+            raise serializers.ValidationError(f'At most {self.MAX_LISTINGS} listings can be quoted per request.')
+        return ids
+
+    def validate(self, data):
+        """Validate quote dates."""
+        if data['check_out'] <= data['check_in']:
+            raise serializers.ValidationError({
+                'check_out': 'Check-out date must be after check-in date.'
+            })
+        return data
+
+
+class ListingNearbySerializer(serializers.Serializer):
+    """Serializer for nearby listing search parameters."""
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=0.01, max_value=500, default=10)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=50)
+
+
+class ListingFilterSerializer(serializers.Serializer):
+    """Serializer for listing list filter and ordering parameters."""
+    ORDERING_CHOICES = ['-created_at', 'created_at', 'price_per_night', '-price_per_night']
+
+    location = serializers.CharField(max_length=255, required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    # None (absent) means both available and unavailable listings.
+    available = serializers.BooleanField(required=False, allow_null=True, default=None)
+    ordering = serializers.ChoiceField(choices=ORDERING_CHOICES, default='-created_at')
+
+    def validate(self, data):
+        """Validate the price range."""
+        if 'min_price' in data and 'max_price' in data and data['min_price'] > data['max_price']:
+            raise serializers.ValidationError({
+                'max_price': 'Maximum price must not be below the minimum price.'
+            })
+        return data
+
+
+class PaymentSerializer(SerializerTimingMixin, serializers.ModelSerializer):
     """Serializer for Payment model."""
     booking_details = BookingSerializer(source='booking', read_only=True)
 
@@ -100,6 +265,19 @@ class PaymentSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'completed_at'
         ]
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """
+        Join the booking (and its listing and user) for ``booking_details``.
+
+        The raw gateway payloads are not rendered, so they are left unloaded.
+        """
+        columns = [field for field in cls.Meta.fields if field != 'booking_details']
+        return queryset.select_related('booking__listing', 'booking__user').only(
+            *columns,
+            *('booking__' + column for column in BookingSerializer.READ_ONLY_COLUMNS)
+        )
+
 
 class PaymentInitiateSerializer(serializers.Serializer):
     """Serializer for initiating payment."""
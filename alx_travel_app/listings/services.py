@@ -1,16 +1,225 @@
 """
 Service layer for integrating with Chapa Payment API.
 """
+import asyncio
+import os
+import threading
+import weakref
+import httpx
 import requests
 import logging
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+from urllib3.util.retry import Retry
 from django.conf import settings
 from typing import Dict, Any, Optional
 
+from .instrumentation import external_call
+from .metrics import chapa_latency
+
 logger = logging.getLogger(__name__)
 
+_session = None
+_session_lock = threading.Lock()
+
+
+class PoolTimeout(requests.exceptions.Timeout):
+    """Every pooled Chapa connection stayed busy for ``CHAPA_POOL_TIMEOUT`` seconds."""
+
+
+class _PoolTimeoutMixin:
+    # requests never passes ``pool_timeout``, so a blocking pool would
+    # otherwise wait for a free connection indefinitely.
+    def urlopen(self, method, url, *args, pool_timeout=None, **kwargs):
+        if pool_timeout is None:
+            pool_timeout = settings.CHAPA_POOL_TIMEOUT
+        return super().urlopen(method, url, *args, pool_timeout=pool_timeout, **kwargs)
+
+
+class _HTTPConnectionPool(_PoolTimeoutMixin, HTTPConnectionPool):
+    pass
+
+
+class _HTTPSConnectionPool(_PoolTimeoutMixin, HTTPSConnectionPool):
+    pass
+
+
+class ChapaHTTPAdapter(HTTPAdapter):
+    """A blocking pool adapter that gives up after ``CHAPA_POOL_TIMEOUT`` seconds."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+    def send(self, request, **kwargs):
+        try:
+            return super().send(request, **kwargs)
+        except EmptyPoolError as e:
+            raise PoolTimeout(
+                f'No free Chapa connection within CHAPA_POOL_TIMEOUT={settings.CHAPA_POOL_TIMEOUT}s '
+                f'(all {self._pool_maxsize} in use)',
+                request=request,
+            ) from e
+
+
+def _build_session() -> requests.Session:
+    """Build a keep-alive session with a bounded pool and transport retries."""
+    retries = Retry(
+        total=settings.CHAPA_MAX_RETRIES,
+        connect=settings.CHAPA_MAX_RETRIES,
+        read=settings.CHAPA_MAX_RETRIES,
+        status=settings.CHAPA_MAX_RETRIES,
+        backoff_factor=settings.CHAPA_RETRY_BACKOFF_FACTOR,
+        status_forcelist=(502, 503, 504),
+        # Only idempotent requests are retried once they reached the server;
+        # connection errors are retried for every method.
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = ChapaHTTPAdapter(
+        pool_connections=settings.CHAPA_POOL_CONNECTIONS,
+        pool_maxsize=settings.CHAPA_POOL_MAXSIZE,
+        max_retries=retries,
+        pool_block=True,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # The session is shared between threads, so keep it free of cookie state.
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get_http_session() -> requests.Session:
+    """Return the process-wide pooled HTTP session used for Chapa calls."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def reset_http_session():
+    """Drop the shared session so the next call builds a fresh pool."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def _reset_session_after_fork():
+    # Sockets must not be shared with the parent (gunicorn/Celery prefork).
+    global _session, _session_lock
+    _session = None
+    _session_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_session_after_fork)
+
+
+# httpx clients are bound to the event loop they were first used on, so
+# the async pool is shared per loop rather than per process.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the pooled httpx client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(
+            max_connections=settings.CHAPA_ASYNC_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.CHAPA_ASYNC_MAX_KEEPALIVE,
+        )
+        client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                limits=limits,
+                retries=settings.CHAPA_MAX_RETRIES,
+            ),
+            timeout=httpx.Timeout(
+                settings.CHAPA_READ_TIMEOUT,
+                connect=settings.CHAPA_CONNECT_TIMEOUT,
+                pool=settings.CHAPA_POOL_TIMEOUT,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def build_initiate_payload(
+    amount, currency, email, first_name, last_name, phone_number,
+    tx_ref, callback_url, return_url, customization=None
+) -> Dict[str, Any]:
+    """Build the JSON body for Chapa's transaction/initialize endpoint."""
+    payload = {
+        'amount': str(amount),
+        'currency': currency,
+        'email': email,
+        'first_name': first_name,
+        'last_name': last_name,
+        'phone_number': phone_number,
+        'tx_ref': tx_ref,
+        'callback_url': callback_url,
+        'return_url': return_url,
+    }
+
+    if customization:
+        payload['customization'] = customization
+
+    return payload
+
+
+def parse_initiate_response(status_code: int, response_data: Dict[str, Any], tx_ref: str) -> Dict[str, Any]:
+    """Normalize a transaction/initialize response into the service result format."""
+    if status_code == 200 and response_data.get('status') == 'success':
+        logger.info(f"Payment initiated successfully for tx_ref: {tx_ref}")
+        return {
+            'success': True,
+            'data': response_data.get('data', {}),
+            'message': response_data.get('message', 'Payment initiated successfully')
+        }
+
+    error_msg = response_data.get('message', 'Unknown error occurred')
+    logger.error(f"Payment initiation failed for tx_ref {tx_ref}: {error_msg}")
+    return {
+        'success': False,
+        'error': error_msg,
+        'data': response_data
+    }
+
+
+def parse_verify_response(status_code: int, response_data: Dict[str, Any], tx_ref: str) -> Dict[str, Any]:
+    """Normalize a transaction/verify response into the service result format."""
+    if status_code == 200 and response_data.get('status') == 'success':
+        logger.info(f"Payment verified successfully for tx_ref: {tx_ref}")
+        return {
+            'success': True,
+            'data': response_data.get('data', {}),
+            'message': response_data.get('message', 'Payment verified successfully')
+        }
+
+    error_msg = response_data.get('message', 'Verification failed')
+    logger.error(f"Payment verification failed for tx_ref {tx_ref}: {error_msg}")
+    return {
+        'success': False,
+        'error': error_msg,
+        'data': response_data
+    }
+
 
 class ChapaPaymentService:
-    """Service class for handling Chapa payment operations."""
+    """
+    Service class for handling Chapa payment operations.
+
+    Instances are cheap: all of them share one pooled keep-alive session
+    (see ``get_http_session``), so TCP/TLS handshakes are amortized across
+    requests and threads.
+    """
     
     def __init__(self):
         self.secret_key = settings.CHAPA_SECRET_KEY
@@ -19,6 +228,8 @@ class ChapaPaymentService:
             'Authorization': f'Bearer {self.secret_key}',
             'Content-Type': 'application/json'
         }
+        self.timeout = (settings.CHAPA_CONNECT_TIMEOUT, settings.CHAPA_READ_TIMEOUT)
+        self.session = get_http_session()
 
     def initiate_payment(
         self,
@@ -52,47 +263,22 @@ class ChapaPaymentService:
             Dictionary containing payment response from Chapa
         """
         try:
-            payload = {
-                'amount': str(amount),
-                'currency': currency,
-                'email': email,
-                'first_name': first_name,
-                'last_name': last_name,
-                'phone_number': phone_number,
-                'tx_ref': tx_ref,
-                'callback_url': callback_url,
-                'return_url': return_url,
-            }
-
-            if customization:
-                payload['customization'] = customization
+            payload = build_initiate_payload(
+                amount, currency, email, first_name, last_name, phone_number,
+                tx_ref, callback_url, return_url, customization
+            )
 
             logger.info(f"Initiating Chapa payment for tx_ref: {tx_ref}")
             
-            response = requests.post(
-                f'{self.api_url}/transaction/initialize',
-                json=payload,
-                headers=self.headers,
-                timeout=30
-            )
+            with external_call(), chapa_latency.time(operation='initiate'):
+                response = self.session.post(
+                    f'{self.api_url}/transaction/initialize',
+                    json=payload,
+                    headers=self.headers,
+                    timeout=self.timeout
+                )
 
-            response_data = response.json()
-            
-            if response.status_code == 200 and response_data.get('status') == 'success':
-                logger.info(f"Payment initiated successfully for tx_ref: {tx_ref}")
-                return {
-                    'success': True,
-                    'data': response_data.get('data', {}),
-                    'message': response_data.get('message', 'Payment initiated successfully')
-                }
-            else:
-                error_msg = response_data.get('message', 'Unknown error occurred')
-                logger.error(f"Payment initiation failed for tx_ref {tx_ref}: {error_msg}")
-                return {
-                    'success': False,
-                    'error': error_msg,
-                    'data': response_data
-                }
+            return parse_initiate_response(response.status_code, response.json(), tx_ref)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Network error during payment initiation: {str(e)}")
@@ -120,29 +306,14 @@ class ChapaPaymentService:
         try:
             logger.info(f"Verifying payment for tx_ref: {tx_ref}")
             
-            response = requests.get(
-                f'{self.api_url}/transaction/verify/{tx_ref}',
-                headers=self.headers,
-                timeout=30
-            )
+            with external_call(), chapa_latency.time(operation='verify'):
+                response = self.session.get(
+                    f'{self.api_url}/transaction/verify/{tx_ref}',
+                    headers=self.headers,
+                    timeout=self.timeout
+                )
 
-            response_data = response.json()
-            
-            if response.status_code == 200 and response_data.get('status') == 'success':
-                logger.info(f"Payment verified successfully for tx_ref: {tx_ref}")
-                return {
-                    'success': True,
-                    'data': response_data.get('data', {}),
-                    'message': response_data.get('message', 'Payment verified successfully')
-                }
-            else:
-                error_msg = response_data.get('message', 'Verification failed')
-                logger.error(f"Payment verification failed for tx_ref {tx_ref}: {error_msg}")
-                return {
-                    'success': False,
-                    'error': error_msg,
-                    'data': response_data
-                }
+            return parse_verify_response(response.status_code, response.json(), tx_ref)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Network error during payment verification: {str(e)}")
@@ -171,3 +342,108 @@ class ChapaPaymentService:
         if result['success']:
             return result['data'].get('status')
         return None
+
+
+class AsyncChapaPaymentService:
+    """
+    Asyncio counterpart of ChapaPaymentService for ASGI views.
+
+    Uses the per-loop pooled httpx client (see ``get_async_http_client``)
+    and returns results in the same format as the synchronous service.
+    """
+
+    RETRY_STATUSES = (502, 503, 504)
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        self.secret_key = settings.CHAPA_SECRET_KEY
+        self.api_url = settings.CHAPA_API_URL
+        self.headers = {
+            'Authorization': f'Bearer {self.secret_key}',
+            'Content-Type': 'application/json'
+        }
+        self.client = client
+
+    async def _get(self, url: str) -> httpx.Response:
+        """GET with status retries; the transport already retries connect errors."""
+        client = self.client or get_async_http_client()
+        retries = settings.CHAPA_MAX_RETRIES
+        for attempt in range(retries + 1):
+            with external_call(), chapa_latency.time(operation='verify'):
+                response = await client.get(url, headers=self.headers)
+            if response.status_code not in self.RETRY_STATUSES or attempt == retries:
+                return response
+            await asyncio.sleep(settings.CHAPA_RETRY_BACKOFF_FACTOR * (2 ** attempt))
+
+    async def initiate_payment(
+        self,
+        amount: float,
+        currency: str,
+        email: str,
+        first_name: str,
+        last_name: str,
+        phone_number: str,
+        tx_ref: str,
+        callback_url: str,
+        return_url: str,
+        customization: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Initiate a payment with Chapa. See ChapaPaymentService.initiate_payment."""
+        try:
+            payload = build_initiate_payload(
+                amount, currency, email, first_name, last_name, phone_number,
+                tx_ref, callback_url, return_url, customization
+            )
+
+            logger.info(f"Initiating Chapa payment for tx_ref: {tx_ref}")
+
+            client = self.client or get_async_http_client()
+            with external_call(), chapa_latency.time(operation='initiate'):
+                response = await client.post(
+                    f'{self.api_url}/transaction/initialize',
+                    json=payload,
+                    headers=self.headers
+                )
+
+            return parse_initiate_response(response.status_code, response.json(), tx_ref)
+
+        except httpx.HTTPError as e:
+            logger.error(f"Network error during payment initiation: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Network error: {str(e)}'
+            }
+        except Exception as e:
+            logger.error(f"Unexpected error during payment initiation: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Unexpected error: {str(e)}'
+            }
+
+    async def verify_payment(self, tx_ref: str) -> Dict[str, Any]:
+        """Verify a payment with Chapa. See ChapaPaymentService.verify_payment."""
+        try:
+            logger.info(f"Verifying payment for tx_ref: {tx_ref}")
+
+            response = await self._get(f'{self.api_url}/transaction/verify/{tx_ref}')
+
+            return parse_verify_response(response.status_code, response.json(), tx_ref)
+
+        except httpx.HTTPError as e:
+            logger.error(f"Network error during payment verification: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Network error: {str(e)}'
+            }
+        except Exception as e:
+            logger.error(f"Unexpected error during payment verification: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Unexpected error: {str(e)}'
+            }
+
+    async def get_payment_status(self, tx_ref: str) -> Optional[str]:
+        """Get the current status of a payment."""
+        result = await self.verify_payment(tx_ref)
+        if result['success']:
+            return result['data'].get('status')
+        return None
@@ -1,15 +1,123 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Payment, Booking
-import logging
+from celery.signals import task_postrun, task_prerun
+from .cache import invalidate_listing_cache
+from .fulltext import SEARCH_FIELDS, index_listing, unindex_listing
+from .instrumentation import install_query_recorder
+from .metrics import bookings_created, registry as metrics_registry, task_duration
+from .models import Listing, Booking, RateRule
+from .pricing import forget_listing, rules_changed
+import time
 
-logger = logging.getLogger(__name__)
+
+@receiver(post_save, sender=Booking)
+def booking_created(sender, instance, created, **kwargs):
+    """
+    Count bookings created one at a time (Booking.save keeps the calendar).
+    """
+    if created:
+        bookings_created.inc(source='single')
+
+
+@receiver([post_save, post_delete], sender=Listing)
+def listing_changed(sender, **kwargs):
+    """
+    Invalidate cached listing pages when a listing is written.
+    """
+    # Bump now so this process stops serving the old data, and again after
+    # commit to drop entries refilled from the pre-commit snapshot meanwhile.
+    invalidate_listing_cache()
+    transaction.on_commit(invalidate_listing_cache)
+
+
+@receiver([post_save, post_delete], sender=RateRule)
+def rate_rule_changed(sender, instance, **kwargs):
+    """
+    Retire a listing's compiled rate table when one of its rules changes.
+    """
+    rules_changed(instance.listing_id)
+    # Again after commit, in case a quote compiled the pre-commit rules meanwhile.
+    transaction.on_commit(lambda: forget_listing(instance.listing_id))
+
+
+@receiver(post_save, sender=Listing)
+def listing_text_changed(sender, instance, update_fields=None, **kwargs):
+    """
+    Reindex a listing's text for full-text search when it is saved.
+    """
+    if update_fields is not None and not set(SEARCH_FIELDS) & set(update_fields):
+        return
+
+    index_listing(instance)
+
+
+@receiver(post_delete, sender=Listing)
+def listing_text_deleted(sender, instance, **kwargs):
+    """
+    Drop a deleted listing from the full-text index.
+    """
+    unindex_listing(instance.pk)
+
+
+@receiver(post_delete, sender=Listing)
+def listing_rates_deleted(sender, instance, **kwargs):
+    """
+    Drop a deleted listing's compiled rate table.
+    """
+    forget_listing(instance.pk)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """
+    Apply the SQLite performance profile to a new connection.
+
+    WAL lets readers run alongside the single writer, and with
+    synchronous=NORMAL a commit no longer waits for an fsync (a commit
+    can be lost on power failure, never corrupted). Writers that find
+    the database locked wait up to SQLITE_BUSY_TIMEOUT_MS; the profile's
+    backend (alx_travel_app.sqlite_backend) takes the write lock at BEGIN
+    so that wait is used instead of failing on a lock upgrade.
+    """
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PERFORMANCE_PROFILE:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}')
+        cursor.execute(f'PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}')
+        cursor.execute(f'PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}')
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """
+    Record the queries of sampled requests (see listings/instrumentation.py).
+    """
+    install_query_recorder(connection)
+
+
+_task_started = {}
+
+
+@task_prerun.connect
+def task_started(task_id, **kwargs):
+    """
+    Note when a Celery task starts, for its duration histogram.
+    """
+    _task_started[task_id] = time.perf_counter()
 
 
-@receiver(post_save, sender=Payment)
-def payment_status_changed(sender, instance, created, **kwargs):
+@task_postrun.connect
+def task_finished(task_id, task, state=None, **kwargs):
     """
-    Signal handler for payment status changes.
+    Record a Celery task's run time and publish this worker's metrics.
     """
-    if not created and instance.status == 'completed':
-        logger.info(f"Payment {instance.payment_id} completed for booking {instance.booking.booking_reference}")
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        task_duration.observe(time.perf_counter() - started, task=task.name, state=state or 'UNKNOWN')
+    # Prefork children can sit idle for long; don't wait for the next update.
+    metrics_registry.flush()
@@ -1,182 +1,253 @@
 from celery import shared_task
-from django.core.mail import send_mail
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task(bind=True, max_retries=3)
-def send_payment_confirmation_email(self, payment_id, booking_id):
+@shared_task
+def send_payment_confirmation_email(payment_id, booking_id=None):
     """
-    Send payment confirmation email to user.
-    
+    Queue a payment confirmation email (see notifications.py).
+
     Args:
         payment_id: ID of the payment
-        booking_id: ID of the booking
+        booking_id: Unused; the booking is read through the payment
     """
-    try:
-        from .models import Payment, Booking
-        
-        payment = Payment.objects.get(id=payment_id)
-        booking = Booking.objects.get(id=booking_id)
-        
-        subject = f'Payment Confirmation - Booking {booking.booking_reference}'
-        
-        # Create email content
-        context = {
-            'booking_reference': booking.booking_reference,
-            'listing_title': booking.listing.title,
-            'check_in_date': booking.check_in_date,
-            'check_out_date': booking.check_out_date,
-            'number_of_guests': booking.number_of_guests,
-            'total_amount': booking.total_amount,
-            'payment_id': payment.payment_id,
-            'transaction_id': payment.transaction_id,
-            'payment_date': payment.completed_at,
-        }
-        
-        # For now, using a simple text email
-        # In production, you would use HTML templates
-        message = f"""
-        Dear Customer,
-
-        Thank you for your payment!
-
-        Your booking has been confirmed. Here are your booking details:
-
-        Booking Reference: {booking.booking_reference}
-        Listing: {booking.listing.title}
-        Check-in Date: {booking.check_in_date}
-        Check-out Date: {booking.check_out_date}
-        Number of Guests: {booking.number_of_guests}
-        Total Amount Paid: ETB {booking.total_amount}
-
-        Payment Details:
-        Payment ID: {payment.payment_id}
-        Transaction ID: {payment.transaction_id}
-        Payment Date: {payment.completed_at}
-
-        We look forward to hosting you!
-
-        Best regards,
-        ALX Travel App Team
-        """
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[payment.user_email],
-            fail_silently=False,
-        )
-        
-        logger.info(f"Payment confirmation email sent to {payment.user_email}")
-        return f"Email sent successfully to {payment.user_email}"
-    
-    except Exception as e:
-        logger.error(f"Error sending payment confirmation email: {str(e)}")
-        # Retry the task
-        raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
+    from .notifications import queue_payment_confirmation
+
+    queue_payment_confirmation(payment_id)
 
 
-@shared_task(bind=True, max_retries=3)
-def send_payment_failed_email(self, payment_id, reason):
+@shared_task
+def send_payment_failed_email(payment_id, reason):
     """
-    Send payment failure notification email to user.
-    
+    Queue a payment failure notification email (see notifications.py).
+
     Args:
         payment_id: ID of the payment
         reason: Reason for payment failure
     """
-    try:
-        from .models import Payment
-        
-        payment = Payment.objects.get(id=payment_id)
-        booking = payment.booking
-        
-        subject = f'Payment Failed - Booking {booking.booking_reference}'
-        
-        message = f"""
-        Dear Customer,
-
-        We're sorry, but your payment for the following booking could not be processed:
-
-        Booking Reference: {booking.booking_reference}
-        Listing: {booking.listing.title}
-        Amount: ETB {booking.total_amount}
-
-        Reason: {reason}
-
-        Please try again or contact our support team if the problem persists.
-
-        Best regards,
-        ALX Travel App Team
-        """
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[payment.user_email],
-            fail_silently=False,
+    from .notifications import queue_payment_failed
+
+    queue_payment_failed(payment_id, reason)
+
+
+@shared_task
+def send_queued_emails(batch_size=None):
+    """
+    Send queued notification emails in batches over one SMTP connection.
+
+    Scheduled by notifications.schedule_flush when emails are queued, and
+    by Celery Beat as a sweeper for anything that missed its run.
+    """
+    from .notifications import send_pending_notifications
+
+    return send_pending_notifications(batch_size)
+
+
+def _chunked(iterable, size):
+    """Yield lists of up to ``size`` items from ``iterable``."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _complete_verified_payments(rows):
+    """
+    Mark verified payments completed and confirm their bookings in bulk.
+
+    Only rows still pending are updated, so payments completed concurrently
+    by a webhook or the verify endpoint are not confirmed (or emailed) twice.
+    The UPDATE also checks ``Payment.TRANSITIONS``, as ``Payment.transition``
+    does, and the completions are counted in ``payment_transitions_total``.
+
+    Returns:
+        List of ``(payment_id, booking_id)`` pairs that were completed.
+    """
+    from .metrics import payment_transitions
+    from .models import Payment, Booking
+    from .notifications import queue_payment_confirmation
+    from django.db import transaction
+    from django.utils import timezone
+
+    ids = [payment_id for payment_id, _, _ in rows]
+    with transaction.atomic():
+        won = list(
+            Payment.objects.select_for_update()
+            .filter(id__in=ids, status='pending')
+            .values_list('id', 'booking_id')
         )
-        
-        logger.info(f"Payment failure email sent to {payment.user_email}")
-        return f"Failure email sent successfully to {payment.user_email}"
-    
-    except Exception as e:
-        logger.error(f"Error sending payment failure email: {str(e)}")
-        # Retry the task
-        raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
+        if not won:
+            return []
+
+        now = timezone.now()
+        updated = Payment.objects.filter(
+            id__in=[payment_id for payment_id, _ in won],
+            status__in=Payment.TRANSITIONS['completed'],
+        ).update(status='completed', completed_at=now, updated_at=now)
+        payment_transitions.inc(updated, to_status='completed')
+        Booking.objects.filter(id__in=[booking_id for _, booking_id in won]).update(
+            status='confirmed', updated_at=now
+        )
+
+        queue_payment_confirmation(*(payment_id for payment_id, _ in won))
+
+    return won
 
 
 @shared_task
-def check_pending_payments():
+def check_pending_payments(chunk_size=None, concurrency=None):
     """
     Periodic task to check status of pending payments.
     This can be scheduled to run periodically using Celery Beat.
+
+    Stale pending payments are streamed in chunks; each chunk is verified
+    with up to ``concurrency`` Chapa calls in flight over the shared HTTP
+    pool, then applied with bulk updates and one batch of queued emails.
     """
     from .models import Payment
     from .services import ChapaPaymentService
     from django.utils import timezone
     from datetime import timedelta
     
+    chunk_size = chunk_size or settings.PAYMENT_RECONCILE_CHUNK_SIZE
+    concurrency = concurrency or settings.PAYMENT_RECONCILE_CONCURRENCY
+    started = time.monotonic()
+
     # Get payments that are pending for more than 10 minutes
     ten_minutes_ago = timezone.now() - timedelta(minutes=10)
     pending_payments = Payment.objects.filter(
         status='pending',
         created_at__lt=ten_minutes_ago
-    )
+    ).values_list('id', 'transaction_id', 'booking_id')
     
     chapa_service = ChapaPaymentService()
-    
-    for payment in pending_payments:
+
+    def is_successful(row):
+        _, transaction_id, _ = row
         try:
-            verification_result = chapa_service.verify_payment(payment.transaction_id)
-            
-            if verification_result['success']:
-                verification_data = verification_result['data']
-                chapa_status = verification_data.get('status', '').lower()
-                
-                if chapa_status == 'success':
-                    payment.mark_as_completed()
-                    
-                    booking = payment.booking
-                    booking.status = 'confirmed'
-                    booking.save()
-                    
-                    send_payment_confirmation_email.delay(
-                        payment_id=payment.id,
-                        booking_id=booking.id
-                    )
-                    
-                    logger.info(f"Auto-verified payment {payment.transaction_id}")
-        
+            verification_result = chapa_service.verify_payment(transaction_id)
         except Exception as e:
-            logger.error(f"Error checking payment {payment.transaction_id}: {str(e)}")
-            continue
-    
-    return f"Checked {pending_payments.count()} pending payments"
+            logger.error(f"Error checking payment {transaction_id}: {str(e)}")
+            return None
+        if not verification_result['success']:
+            return False
+        verification_data = verification_result['data']
+        return verification_data.get('status', '').lower() == 'success'
+
+    checked = completed = errors = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for chunk in _chunked(pending_payments.iterator(chunk_size=chunk_size), chunk_size):
+            outcomes = list(executor.map(is_successful, chunk))
+            checked += len(chunk)
+            errors += outcomes.count(None)
+
+            verified = [row for row, ok in zip(chunk, outcomes) if ok]
+            if not verified:
+                continue
+
+            try:
+                won = _complete_verified_payments(verified)
+            except Exception as e:
+                logger.error(f"Error applying verified payments: {str(e)}")
+                errors += len(verified)
+                continue
+
+            completed += len(won)
+            logger.info(f"Auto-verified {len(won)} pending payments")
+
+    elapsed = time.monotonic() - started
+    return {
+        'checked': checked,
+        'completed': completed,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'payments_per_second': round(checked / elapsed, 1) if elapsed else None,
+    }
+
+
+@shared_task
+def process_webhook_inbox(batch_size=None):
+    """
+    Apply queued Chapa webhook events in batches (see models.WebhookEvent).
+
+    Scheduled with Celery Beat. Each batch is claimed and applied in one
+    transaction; on PostgreSQL, rows locked by a concurrent run are skipped.
+    Every event runs in its own savepoint, so one bad event is recorded
+    on its row instead of rolling back the batch.
+
+    Events whose payment is not found yet, or whose handler raises, are
+    retried after a backoff, up to ``WEBHOOK_INBOX_MAX_RETRIES`` times, as
+    Chapa's own retries would be in inline mode.
+    """
+    from .models import WebhookEvent
+    from .views import apply_webhook_event
+    from datetime import timedelta
+    from django.db import transaction
+    from django.utils import timezone
+
+    batch_size = batch_size or settings.WEBHOOK_INBOX_BATCH_SIZE
+    started = time.monotonic()
+    processed = retried = errors = 0
+    # One pass over the inbox per run: retried events wait for the next run.
+    last_id = 0
+
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            events = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True, next_attempt_at__lte=now, id__gt=last_id)
+                .order_by('id')[:batch_size]
+            )
+            if not events:
+                break
+            last_id = events[-1].id
+
+            for event in events:
+                try:
+                    with transaction.atomic():
+                        payload, http_status = apply_webhook_event(event.payload)
+                    event.error_message = None if http_status < 400 else payload.get('error')
+                    retryable = http_status == 404 or http_status >= 500
+                except Exception as e:
+                    logger.error(f"Error processing webhook event {event.id}: {str(e)}")
+                    event.error_message = str(e)
+                    retryable = True
+
+                event.attempts += 1
+                if retryable and event.attempts <= settings.WEBHOOK_INBOX_MAX_RETRIES:
+                    delay = settings.WEBHOOK_INBOX_RETRY_DELAY_SECONDS * 2 ** (event.attempts - 1)
+                    event.next_attempt_at = now + timedelta(seconds=delay)
+                    retried += 1
+                    continue
+                if retryable:
+                    logger.error(
+                        f"Giving up on webhook event {event.id} after {event.attempts} attempts: "
+                        f"{event.error_message}"
+                    )
+                if event.error_message:
+                    errors += 1
+                event.processed_at = now
+                processed += 1
+
+            WebhookEvent.objects.bulk_update(
+                events, ['attempts', 'next_attempt_at', 'processed_at', 'error_message']
+            )
+
+    elapsed = time.monotonic() - started
+    return {
+        'processed': processed,
+        'retried': retried,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'events_per_second': round((processed + retried) / elapsed, 1) if elapsed else None,
+    }
@@ -1,11 +1,101 @@
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.template import engines
+from django.template.loader import render_to_string
+from django.db import OperationalError, connection, connections
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from decimal import Decimal
 from datetime import date, timedelta
-from .models import Listing, Booking, Payment
+from .models import (
+    Listing, Booking, BookedNight, EmailNotification, Payment, PaymentGatewayEvent, RateRule, WebhookEvent,
+)
+from . import async_views, geo, instrumentation, metrics, pricing, quotes, tasks, views
+from .availability import BookingOverlapError
+from .cache import invalidate_listing_cache, stats as listing_cache_stats
+from .services import AsyncChapaPaymentService
+from .pagination import CreatedAtCursorPagination
+from .serializers import ListingFilterSerializer
+from .email_templates import CompiledTemplate, render_email
+from .notifications import (
+    build_message, email_context, queue_payment_confirmation, queue_payment_failed,
+    send_pending_notifications,
+)
+from .tasks import check_pending_payments, process_webhook_inbox
+from unittest import skipUnless
 from unittest.mock import patch, MagicMock
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+import fcntl
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import threading
+import httpx
+import requests
+from rest_framework.pagination import PageNumberPagination
+
+
+class PaymentFixtureMixin:
+    """Shared setup for booking and payment tests: a guest's bookings, and their payments."""
+
+    GUEST_EMAIL = 'guest@example.com'
+    GUEST_PHONE = '+251911000000'
+
+    def create_booking(self, user=None, price=Decimal('100.00'), nights=1, listing=None, check_in=None, **fields):
+        """
+        Create ``self.booking`` for ``nights`` nights; set ``self.user`` and ``self.listing``.
+
+        The user and the listing (at ``price`` per night) are created unless
+        given, and the stay starts tomorrow unless ``check_in`` is given.
+        ``fields`` override the other booking fields.
+        """
+        self.user = user or User.objects.create_user(username='guest', password='testpass123')
+        self.listing = listing or Listing.objects.create(
+            title='Payment Lodge', description='x', location='Addis Ababa', price_per_night=price
+        )
+        check_in = check_in or date.today() + timedelta(days=1)
+        self.booking = Booking.objects.create(**{
+            'user': self.user, 'listing': self.listing,
+            'check_in_date': check_in, 'check_out_date': check_in + timedelta(days=nights),
+            'number_of_guests': 1, 'total_amount': self.listing.price_per_night * nights,
+            'user_email': self.GUEST_EMAIL, 'user_phone': self.GUEST_PHONE,
+            **fields,
+        })
+        return self.booking
+
+    def create_payment(self, transaction_id='TXN-TEST-1', **fields):
+        """Create a pending ``self.payment`` for ``self.booking``."""
+        self.payment = Payment.objects.create(
+            booking=self.booking, booking_reference=str(self.booking.booking_reference),
+            transaction_id=transaction_id, amount=self.booking.total_amount,
+            user_email=self.booking.user_email, user_phone=self.booking.user_phone, **fields
+        )
+        return self.payment
+
+    def booking_data(self, listing, check_in, nights, **overrides):
+        """The request body for booking ``listing`` for ``nights`` nights from ``check_in``."""
+        return {
+            'listing': listing.id,
+            'check_in_date': str(check_in),
+            'check_out_date': str(check_in + timedelta(days=nights)),
+            'number_of_guests': 2,
+            'user_email': self.GUEST_EMAIL,
+            'user_phone': self.GUEST_PHONE,
+            **overrides,
+        }
 
 
 class PaymentIntegrationTestCase(APITestCase):
@@ -45,7 +135,7 @@ class PaymentIntegrationTestCase(APITestCase):
         
         self.client.force_authenticate(user=self.user)
     
-    @patch('listings.services.requests.post')
+    @patch('listings.services.requests.Session.post')
     def test_initiate_payment_success(self, mock_post):
         """Test successful payment initiation."""
         # Mock Chapa API response
@@ -79,7 +169,7 @@ class PaymentIntegrationTestCase(APITestCase):
         self.assertEqual(payment.status, 'pending')
         self.assertEqual(payment.amount, self.booking.total_amount)
     
-    @patch('listings.services.requests.get')
+    @patch('listings.services.requests.Session.get')
     def test_verify_payment_success(self, mock_get):
         """Test successful payment verification."""
         # Create payment
@@ -160,3 +250,1975 @@ class PaymentIntegrationTestCase(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('already been completed', response.data['error'])
+
+
+class ChapaHTTPSessionTestCase(APITestCase):
+    """Test cases for the pooled Chapa HTTP session."""
+
+    def setUp(self):
+        from .services import reset_http_session
+        reset_http_session()
+        self.addCleanup(reset_http_session)
+
+    def test_session_shared_across_service_instances(self):
+        """All service instances reuse one pooled session."""
+        from .services import ChapaPaymentService, get_http_session
+        first = ChapaPaymentService()
+        second = ChapaPaymentService()
+        self.assertIs(first.session, second.session)
+        self.assertIs(first.session, get_http_session())
+
+    @override_settings(CHAPA_POOL_MAXSIZE=7, CHAPA_MAX_RETRIES=4)
+    def test_adapter_pool_and_retry_configuration(self):
+        """The mounted adapter honours pool size and retry settings."""
+        from .services import get_http_session
+        adapter = get_http_session().get_adapter('https://api.chapa.co/v1')
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.total, 4)
+        self.assertNotIn('POST', adapter.max_retries.allowed_methods)
+
+    @override_settings(CHAPA_POOL_MAXSIZE=1, CHAPA_POOL_TIMEOUT=0.05)
+    def test_busy_pool_fails_after_pool_timeout(self):
+        """With every pooled connection in use, a call fails fast instead of waiting indefinitely."""
+        from .services import ChapaPaymentService
+        service = ChapaPaymentService()
+        request = requests.Request('GET', f'{service.api_url}/transaction/verify/TXN-BUSY').prepare()
+        send_kwargs = service.session.merge_environment_settings(request.url, {}, None, None, None)
+        adapter = service.session.get_adapter(request.url)
+        pool = adapter.get_connection_with_tls_context(
+            request, send_kwargs['verify'], proxies=send_kwargs['proxies'], cert=send_kwargs['cert']
+        )
+        pool.pool.get()  # take the pool's only connection
+
+        start = time.monotonic()
+        result = service.verify_payment('TXN-BUSY')
+
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertFalse(result['success'])
+        self.assertIn('CHAPA_POOL_TIMEOUT', result['error'])
+
+    @override_settings(CHAPA_CONNECT_TIMEOUT=1.5, CHAPA_READ_TIMEOUT=12)
+    @patch('listings.services.requests.Session.get')
+    def test_split_connect_and_read_timeouts(self, mock_get):
+        """Requests are sent with separate connect and read timeouts."""
+        from .services import ChapaPaymentService
+        mock_get.return_value = MagicMock(status_code=200, json=lambda: {'status': 'success', 'data': {}})
+        ChapaPaymentService().verify_payment('TXN-TEST-123')
+        self.assertEqual(mock_get.call_args.kwargs['timeout'], (1.5, 12))
+
+
+class AsyncPaymentViewsTestCase(PaymentFixtureMixin, TestCase):
+    """Test cases for the ASGI payment views and async Chapa client."""
+
+    def setUp(self):
+        self.create_booking(price=Decimal('500.00'), nights=2)
+        self.create_payment('TXN-ASYNC-1')
+        self.factory = AsyncRequestFactory()
+
+    def mock_chapa(self, handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        patcher = patch('listings.services.get_async_http_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_async_verify_payment_success(self):
+        """The async verify view completes the payment and confirms the booking."""
+        self.mock_chapa(lambda request: httpx.Response(200, json={
+            'status': 'success',
+            'data': {'status': 'success', 'amount': '1000.00'}
+        }))
+        request = self.factory.post(
+            '/api/payments/verify/',
+            {'transaction_id': 'TXN-ASYNC-1'},
+            content_type='application/json'
+        )
+        request.user = self.user
+
+        response = await async_views.verify_payment(request)
+
+        self.assertEqual(response.status_code, 200)
+        await self.payment.arefresh_from_db()
+        await self.booking.arefresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.booking.status, 'confirmed')
+
+    async def test_async_verify_requires_authentication(self):
+        """Anonymous requests are rejected before calling Chapa."""
+        request = self.factory.post(
+            '/api/payments/verify/',
+            {'transaction_id': 'TXN-ASYNC-1'},
+            content_type='application/json'
+        )
+        request.user = AnonymousUser()
+
+        response = await async_views.verify_payment(request)
+
+        self.assertEqual(response.status_code, 403)
+
+    async def test_async_webhook_marks_payment_completed(self):
+        """The async webhook applies a success notification."""
+        request = self.factory.post(
+            '/api/payments/webhook/',
+            {'tx_ref': 'TXN-ASYNC-1', 'status': 'success'},
+            content_type='application/json'
+        )
+
+        response = await async_views.chapa_webhook(request)
+
+        self.assertEqual(response.status_code, 200)
+        await self.payment.arefresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+
+    @override_settings(CHAPA_RETRY_BACKOFF_FACTOR=0)
+    async def test_async_client_retries_verify_on_gateway_errors(self):
+        """Transient 503s from Chapa are retried for verification calls."""
+        responses = iter([
+            httpx.Response(503, json={}),
+            httpx.Response(200, json={'status': 'success', 'data': {'status': 'success'}}),
+        ])
+        self.mock_chapa(lambda request: next(responses))
+
+        result = await AsyncChapaPaymentService().verify_payment('TXN-ASYNC-1')
+
+        self.assertTrue(result['success'])
+
+
+class CheckPendingPaymentsTestCase(PaymentFixtureMixin, TestCase):
+    """Test cases for the batched pending-payment reconciler."""
+
+    def setUp(self):
+        user = User.objects.create_user(username='reconcile', password='testpass123')
+        listing = Listing.objects.create(
+            title='Reconcile Inn',
+            description='Listing used by reconciliation tests',
+            location='Hawassa',
+            price_per_night=Decimal('200.00'),
+        )
+        self.payments = []
+        for i in range(5):
+            self.create_booking(user=user, listing=listing, check_in=date.today() + timedelta(days=10 + 3 * i))
+            self.payments.append(self.create_payment(f'TXN-STALE-{i}'))
+        Payment.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+    @patch('listings.services.ChapaPaymentService.verify_payment')
+    def test_reconciles_in_chunks_with_bulk_updates(self, mock_verify):
+        """Successful payments are completed in bulk and their emails queued."""
+        def verify(tx_ref):
+            chapa_status = 'success' if tx_ref in ('TXN-STALE-0', 'TXN-STALE-3') else 'pending'
+            return {'success': True, 'data': {'status': chapa_status}}
+        mock_verify.side_effect = verify
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = check_pending_payments(chunk_size=2, concurrency=4)
+
+        self.assertEqual(result['checked'], 5)
+        self.assertEqual(result['completed'], 2)
+        self.assertEqual(result['errors'], 0)
+        self.assertIn('payments_per_second', result)
+        completed = set(
+            Payment.objects.filter(status='completed').values_list('transaction_id', flat=True)
+        )
+        self.assertEqual(completed, {'TXN-STALE-0', 'TXN-STALE-3'})
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), 2)
+        self.assertEqual(
+            set(EmailNotification.objects.values_list('payment__transaction_id', flat=True)),
+            {'TXN-STALE-0', 'TXN-STALE-3'}
+        )
+        self.assertEqual(metrics.registry.collect()['payment_transitions_total'], {(('to_status', 'completed'),): 2})
+
+    @patch('listings.services.ChapaPaymentService.verify_payment')
+    def test_skips_payments_completed_concurrently(self, mock_verify):
+        """A payment completed elsewhere mid-run is not confirmed again."""
+        mock_verify.return_value = {'success': True, 'data': {'status': 'success'}}
+        chunked = tasks._chunked
+
+        def chunked_then_completed_elsewhere(iterable, size):
+            for chunk in chunked(iterable, size):
+                Payment.objects.update(status='completed')
+                yield chunk
+
+        with patch('listings.tasks._chunked', chunked_then_completed_elsewhere):
+            result = check_pending_payments(chunk_size=10, concurrency=1)
+
+        self.assertEqual(result['checked'], 5)
+        self.assertEqual(result['completed'], 0)
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), 0)
+        self.assertFalse(EmailNotification.objects.exists())
+
+    @skipUnless(connection.vendor == 'sqlite', 'query plan text is SQLite-specific')
+    def test_sweep_uses_status_created_index(self):
+        """The stale-pending filter and its ordering are served by one index, without a sort."""
+        plan = Payment.objects.filter(
+            status='pending', created_at__lt=timezone.now()
+        ).values_list('id', 'transaction_id', 'booking_id').explain()
+
+        self.assertIn('payment_status_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class BookingAvailabilityTestCase(PaymentFixtureMixin, APITestCase):
+    """Test cases for the night-level availability calendar."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='traveller', password='testpass123')
+        self.listing = Listing.objects.create(
+            title='Calendar Cabin',
+            description='Listing used by availability tests',
+            location='Gondar',
+            price_per_night=Decimal('300.00'),
+        )
+        self.client.force_authenticate(user=self.user)
+        self.check_in = date.today() + timedelta(days=20)
+
+    def book(self, offset, nights):
+        return self.client.post(
+            reverse('booking-list'), self.booking_data(self.listing, self.check_in + timedelta(days=offset), nights),
+            format='json'
+        )
+
+    def test_overlapping_booking_rejected(self):
+        """A stay sharing any night with an active booking is rejected."""
+        self.assertEqual(self.book(0, 3).status_code, status.HTTP_201_CREATED)
+
+        response = self.book(2, 2)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('check_in_date', response.data)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_back_to_back_bookings_allowed(self):
+        """Check-out day may be the next guest's check-in day."""
+        self.assertEqual(self.book(0, 3).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.book(3, 2).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(BookedNight.objects.filter(listing=self.listing).count(), 5)
+
+    def test_cancelling_releases_nights(self):
+        """Cancelled bookings free their nights for new bookings."""
+        self.book(0, 3)
+        booking = Booking.objects.get()
+        booking.status = 'cancelled'
+        booking.save()
+
+        self.assertFalse(BookedNight.objects.exists())
+        self.assertEqual(self.book(1, 1).status_code, status.HTTP_201_CREATED)
+
+    def test_database_rejects_overlap_outside_serializer(self):
+        """The calendar's unique index guards direct ORM writes as well, and nothing is saved."""
+        self.book(0, 3)
+        with self.assertRaises(BookingOverlapError):
+            self.create_booking(
+                user=self.user, listing=self.listing, check_in=self.check_in + timedelta(days=1), nights=3
+            )
+
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(BookedNight.objects.count(), 3)
+
+
+class BulkBookingTestCase(PaymentFixtureMixin, APITestCase):
+    """Test cases for batch booking creation."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='operator', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.listings = Listing.objects.bulk_create(
+            Listing(title=f'Tour Lodge {i}', description='x', location='Lalibela',
+                    price_per_night=Decimal('100.00') + i, max_guests=4)
+            for i in range(5)
+        )
+        self.check_in = date.today() + timedelta(days=40)
+
+    def item(self, listing, offset=0, nights=2, **overrides):
+        return self.booking_data(listing, self.check_in + timedelta(days=offset), nights, **overrides)
+
+    def post(self, items):
+        return self.client.post(reverse('booking-bulk'), {'bookings': items}, format='json')
+
+    def test_valid_items_created_and_priced(self):
+        """Each accepted item becomes a booking with its nights reserved."""
+        response = self.post([self.item(self.listings[0], nights=3), self.item(self.listings[1])])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        first = response.data['results'][0]['booking']
+        self.assertEqual(Decimal(first['total_amount']), Decimal('300.00'))
+        self.assertEqual(first['listing_title'], 'Tour Lodge 0')
+        self.assertEqual(BookedNight.objects.count(), 5)
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 2)
+
+    def test_invalid_items_rejected_individually(self):
+        """Calendar, in-batch overlaps and listing checks reject only the offending items."""
+        self.create_booking(user=self.user, listing=self.listings[0], check_in=self.check_in, nights=2)
+        self.listings[2].available = False
+        self.listings[2].save()
+
+        response = self.post([
+            self.item(self.listings[0], offset=1),              # overlaps the existing booking
+            self.item(self.listings[1]),                        # ok
+            self.item(self.listings[1], offset=1),              # overlaps item 1
+            self.item(self.listings[2]),                        # listing unavailable
+            self.item(self.listings[3], number_of_guests=9),    # too many guests
+            self.item(self.listings[3], nights=0),              # check-out not after check-in
+            {**self.item(self.listings[4]), 'listing': 999999},  # no such listing
+            self.item(self.listings[1], offset=2),              # back to back with item 1: ok
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['rejected', 'created', 'rejected', 'rejected',
+                                    'rejected', 'rejected', 'rejected', 'created'])
+        errors = [result.get('errors', {}) for result in response.data['results']]
+        self.assertIn('check_in_date', errors[0])
+        self.assertIn('check_in_date', errors[2])
+        self.assertIn('listing', errors[3])
+        self.assertIn('number_of_guests', errors[4])
+        self.assertIn('check_out_date', errors[5])
+        self.assertIn('listing', errors[6])
+
+    def test_query_count_independent_of_batch_size(self):
+        """A batch costs the same number of queries whatever its size."""
+        def queries_for(items):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(items)
+            self.assertEqual(response.data['rejected'], 0)
+            return len(queries)
+
+        small = queries_for([self.item(listing) for listing in self.listings[:2]])
+        large = queries_for([self.item(listing, offset=10 + 3 * i)
+                             for i in range(6) for listing in self.listings])
+
+        self.assertEqual(small, large)
+
+    @override_settings(BULK_BOOKING_MAX_ITEMS=2)
+    def test_oversized_batch_rejected(self):
+        """Batches above the configured size are refused as a whole."""
+        response = self.post([self.item(listing) for listing in self.listings[:3]])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('bookings', response.data)
+        self.assertFalse(Booking.objects.exists())
+
+
+class PricingTestCase(PaymentFixtureMixin, APITestCase):
+    """Test cases for rate rules and the compiled rate tables."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='guest', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.listing = Listing.objects.create(
+            title='Rift Valley Cabin', description='x', location='Hawassa',
+            price_per_night=Decimal('100.00'), max_guests=4
+        )
+        start = date.today() + timedelta(days=30)
+        self.monday = start + timedelta(days=-start.weekday() % 7)
+
+    def add_rules(self):
+        RateRule.objects.create(
+            listing=self.listing, kind='season', nightly_price=Decimal('150.00'),
+            start_date=self.monday + timedelta(days=2), end_date=self.monday + timedelta(days=3),
+        )
+        RateRule.objects.create(listing=self.listing, kind='weekend', adjustment_percent=Decimal('20'))
+        RateRule.objects.create(
+            listing=self.listing, kind='length_of_stay', min_nights=7, adjustment_percent=Decimal('-10')
+        )
+        self.listing.refresh_from_db()
+
+    def test_no_rules_is_price_times_nights(self):
+        """Without rules a stay costs the nightly price per night."""
+        total = pricing.quote(self.listing, self.monday, self.monday + timedelta(days=3))
+
+        self.assertEqual(total, Decimal('300.00'))
+
+    def test_rules_combine(self):
+        """Seasons set the night's rate, weekends adjust it, long stays adjust the total."""
+        self.add_rules()
+
+        # Mon 100, Tue 100, Wed 150, Thu 150, Fri 120, Sat 120
+        six = pricing.quote(self.listing, self.monday, self.monday + timedelta(days=6))
+        # ... plus Sun 100, then -10% for seven nights
+        seven = pricing.quote(self.listing, self.monday, self.monday + timedelta(days=7))
+
+        self.assertEqual(six, Decimal('740.00'))
+        self.assertEqual(seven, Decimal('756.00'))
+
+    def test_stay_outside_table_priced_from_rules(self):
+        """Stays beyond the compiled window use the same rules."""
+        self.add_rules()
+        pricing.rate_table(self.listing)
+
+        with override_settings(PRICING_TABLE_DAYS=3):
+            pricing.forget_listing(self.listing.pk)
+            total = pricing.quote(self.listing, self.monday, self.monday + timedelta(days=7))
+
+        self.assertEqual(total, Decimal('756.00'))
+
+    def test_table_cached_until_rules_change(self):
+        """Quotes reuse the compiled table; a rule change recompiles it."""
+        pricing.quote(self.listing, self.monday, self.monday + timedelta(days=2))
+        with CaptureQueriesContext(connection) as queries:
+            pricing.quote(self.listing, self.monday, self.monday + timedelta(days=2))
+        self.assertEqual(len(queries), 0)
+
+        rule = RateRule.objects.create(listing=self.listing, kind='weekend', adjustment_percent=Decimal('50'))
+        self.listing.refresh_from_db()
+        weekend = (self.monday + timedelta(days=4), self.monday + timedelta(days=6))
+        self.assertEqual(pricing.quote(self.listing, *weekend), Decimal('300.00'))
+
+        rule.delete()
+        self.listing.refresh_from_db()
+        self.assertEqual(pricing.quote(self.listing, *weekend), Decimal('200.00'))
+
+    def test_bookings_priced_by_rules(self):
+        """Single and bulk bookings, and Booking.calculate_total, use the rate table."""
+        self.add_rules()
+        single = self.client.post(
+            reverse('booking-list'), self.booking_data(self.listing, self.monday, 7), format='json'
+        )
+        bulk = self.client.post(reverse('booking-bulk'), {'bookings': [
+            self.booking_data(self.listing, self.monday + timedelta(days=7), 6),
+        ]}, format='json')
+
+        self.assertEqual(single.status_code, status.HTTP_201_CREATED)
+        booking = Booking.objects.get(check_in_date=self.monday)
+        self.assertEqual(booking.total_amount, Decimal('756.00'))
+        self.assertEqual(booking.calculate_total(), Decimal('756.00'))
+        # The next week, out of season: 4 x 100 + 2 x 120
+        self.assertEqual(Decimal(bulk.data['results'][0]['booking']['total_amount']), Decimal('640.00'))
+
+
+class ListingQuoteTestCase(APITestCase):
+    """Test cases for the memoized quote endpoint."""
+
+    def setUp(self):
+        quotes.memo.clear()
+        quotes.stats.reset()
+        self.listings = [
+            Listing.objects.create(title=f'Quote Lodge {i}', description='x', location='Gondar',
+                                   price_per_night=Decimal('100.00') + 10 * i)
+            for i in range(3)
+        ]
+        self.listings[2].available = False
+        self.listings[2].save()
+        start = date.today() + timedelta(days=30)
+        self.check_in = start + timedelta(days=-start.weekday() % 7)  # a Monday
+        self.params = {
+            'check_in': str(self.check_in),
+            'check_out': str(self.check_in + timedelta(days=3)),
+            'listings': ','.join(str(listing.id) for listing in self.listings) + ',999999',
+        }
+
+    def get(self, **overrides):
+        return self.client.get(reverse('listing-quote'), {**self.params, **overrides})
+
+    def test_quotes_listings_in_request_order(self):
+        """Available listings are priced; missing and unavailable ones are listed apart."""
+        response = self.get()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['nights'], 3)
+        self.assertEqual(response.data['quotes'], [
+            {'listing': self.listings[0].id, 'total_amount': '300.00'},
+            {'listing': self.listings[1].id, 'total_amount': '330.00'},
+        ])
+        self.assertEqual(response.data['unavailable'], [self.listings[2].id, 999999])
+
+    def test_repeat_served_from_memo(self):
+        """An identical quote costs only the listing query and counts as hits."""
+        self.get()
+        with CaptureQueriesContext(connection) as queries:
+            self.get()
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(quotes.stats.snapshot()['hits'], 2)
+        self.assertEqual(quotes.stats.snapshot()['misses'], 2)
+        self.assertEqual(quotes.stats.snapshot()['hit_ratio'], 0.5)
+
+    def test_rule_change_reprices(self):
+        """A new rate rule changes the pricing key, so the memo is bypassed."""
+        self.get()
+        RateRule.objects.create(
+            listing=self.listings[0], kind='season', nightly_price=Decimal('200.00'),
+            start_date=self.check_in, end_date=self.check_in,
+        )
+
+        response = self.get()
+
+        self.assertEqual(response.data['quotes'][0]['total_amount'], '400.00')
+        self.assertEqual(quotes.stats.snapshot()['hits'], 1)
+
+    @override_settings(QUOTE_CACHE_TIMEOUT=0)
+    def test_entries_expire(self):
+        """Entries older than QUOTE_CACHE_TIMEOUT are priced again."""
+        self.get()
+        self.get()
+
+        self.assertEqual(quotes.stats.snapshot()['hits'], 0)
+        self.assertEqual(quotes.stats.snapshot()['expired'], 2)
+
+    def test_invalid_parameters_rejected(self):
+        """Bad dates, malformed ids and oversized requests are 400s."""
+        too_many = ','.join(str(i) for i in range(1, 102))
+
+        for overrides in ({'check_out': self.params['check_in']}, {'listings': '1,x'}, {'listings': too_many}):
+            self.assertEqual(self.get(**overrides).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stats_admin_only(self):
+        """The memo counters are for staff only."""
+        self.get()
+        self.assertEqual(self.client.get(reverse('listing-quote-stats')).status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(reverse('listing-quote-stats'))
+
+        self.assertEqual(response.data['misses'], 2)
+        self.assertEqual(response.data['size'], 2)
+
+
+class ListingSearchTestCase(PaymentFixtureMixin, APITestCase):
+    """Test cases for the bulk availability search endpoint."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='testpass123')
+        self.check_in = date.today() + timedelta(days=30)
+        self.booked = Listing.objects.create(
+            title='Booked Bungalow', description='Taken', location='Adama',
+            price_per_night=Decimal('150.00'), max_guests=4,
+        )
+        self.free = Listing.objects.create(
+            title='Free Flat', description='Open', location='Adama',
+            price_per_night=Decimal('120.00'), max_guests=2,
+        )
+        Listing.objects.create(
+            title='Hidden House', description='Unlisted', location='Adama',
+            price_per_night=Decimal('90.00'), max_guests=6, available=False,
+        )
+        self.create_booking(
+            user=self.user, listing=self.booked, check_in=self.check_in + timedelta(days=1), nights=2,
+            number_of_guests=2
+        )
+
+    def search(self, **params):
+        params.setdefault('check_in', self.check_in)
+        params.setdefault('check_out', self.check_in + timedelta(days=2))
+        return self.client.get(reverse('listing-search'), params)
+
+    def test_excludes_listings_booked_in_range(self):
+        """Only available listings without booked nights are returned."""
+        response = self.search()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.free.id])
+
+    def test_range_outside_bookings_returns_booked_listing(self):
+        """A booking only blocks the nights it covers."""
+        response = self.search(
+            check_in=self.check_in + timedelta(days=3),
+            check_out=self.check_in + timedelta(days=5),
+        )
+
+        ids = {item['id'] for item in response.data['results']}
+        self.assertEqual(ids, {self.free.id, self.booked.id})
+
+    def test_guests_and_location_filters(self):
+        """Capacity and location narrow the results."""
+        far = self.check_in + timedelta(days=10)
+        response = self.search(check_in=far, check_out=far + timedelta(days=1), guests=3)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.booked.id])
+
+        response = self.search(check_in=far, check_out=far + timedelta(days=1), location='Jimma')
+        self.assertEqual(response.data['results'], [])
+
+    def test_invalid_range_rejected(self):
+        """Check-out must be after check-in."""
+        response = self.search(check_out=self.check_in)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count_independent_of_listing_count(self):
+        """Search is a single set-based query, paginated without COUNT(*)."""
+        Listing.objects.bulk_create(
+            Listing(title=f'Extra {i}', description='x', location='Adama', price_per_night=Decimal('50.00'))
+            for i in range(25)
+        )
+        with self.assertNumQueries(1):
+            response = self.search()
+        self.assertIsNotNone(response.data['next'])
+
+
+class ListingFullTextSearchTestCase(APITestCase):
+    """Test cases for ranked full-text search on the listing list."""
+
+    def setUp(self):
+        self.lakeside = Listing.objects.create(
+            title='Lakeside Lodge', description='Quiet rooms near the water', location='Bishoftu',
+            price_per_night=Decimal('80.00'),
+        )
+        self.cabin = Listing.objects.create(
+            title='Forest Cabin', description='A short walk to the lake shore', location='Wondo Genet',
+            price_per_night=Decimal('60.00'),
+        )
+        Listing.objects.create(
+            title='City Loft', description='Central and busy', location='Addis Ababa',
+            price_per_night=Decimal('70.00'),
+        )
+
+    def search(self, query):
+        return self.client.get(reverse('listing-list'), {'q': query})
+
+    def test_every_word_must_match(self):
+        """Results contain all query words, matched on their stems."""
+        response = self.search('lakes')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.cabin.id])
+
+        response = self.search('water lodge')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.lakeside.id])
+        self.assertEqual(self.search('water cabin').data['count'], 0)
+
+    def test_title_weighted_above_description(self):
+        """The listing naming the term in its title comes first."""
+        self.cabin.title = 'Forest Cabin by the Lodge'
+        self.cabin.save()
+        self.lakeside.description = 'Lodge rooms near the water'
+        self.lakeside.save()
+
+        response = self.search('lodge')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.lakeside.id, self.cabin.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        """Edits are searchable immediately and deleted listings drop out."""
+        self.cabin.description = 'Mountain views'
+        self.cabin.save()
+        self.assertEqual(self.search('shore').data['count'], 0)
+        self.assertEqual([item['id'] for item in self.search('mountain').data['results']], [self.cabin.id])
+
+        self.cabin.delete()
+        self.assertEqual(self.search('mountain').data['count'], 0)
+
+    def test_operators_in_query_are_plain_words(self):
+        """Quotes and search operators in the query never reach the index as syntax."""
+        response = self.search('"lodge" OR -(')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 0)
+
+        response = self.search('"lodge" -(')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.lakeside.id])
+
+        response = self.search('!!!')
+        self.assertEqual(response.data['count'], 0)
+
+    def test_admin_search_uses_index(self):
+        """The listing admin's search box matches on stems too."""
+        self.client.force_login(User.objects.create_superuser(username='curator', password='testpass123'))
+
+        response = self.client.get(reverse('admin:listings_listing_changelist'), {'q': 'lakes'})
+        self.assertContains(response, 'Forest Cabin')
+        self.assertNotContains(response, 'Lakeside Lodge')
+
+
+class ListingFilterTestCase(APITestCase):
+    """Test cases for filtering and ordering the listing list."""
+
+    FILTERS = {
+        'location': 'Hawassa',
+        'min_price': '40.00',
+        'max_price': '120.00',
+        'available': 'true',
+    }
+
+    def setUp(self):
+        Listing.objects.bulk_create(
+            Listing(title=f'Lake House {i}', description='x', location='Hawassa' if i % 2 else 'Arba Minch',
+                    price_per_night=Decimal(20 + 10 * i), available=i % 5 != 0)
+            for i in range(24)
+        )
+        # bulk_create sends no signals
+        invalidate_listing_cache()
+
+    def collect(self, params):
+        url, ids = reverse('listing-list') + '?' + '&'.join(f'{k}={v}' for k, v in params.items()), []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_filters_narrow_results(self):
+        """Location, price range and availability combine."""
+        ids = self.collect(self.FILTERS)
+
+        expected = Listing.objects.filter(
+            location='Hawassa', price_per_night__gte=40, price_per_night__lte=120, available=True
+        ).order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+        self.assertTrue(ids)
+
+        ids = self.collect({'available': 'false'})
+        self.assertEqual(set(ids), set(Listing.objects.filter(available=False).values_list('id', flat=True)))
+
+    def test_price_ordering_pages_with_cursors(self):
+        """Sorting by price works across cursor pages, in both directions."""
+        by_price = list(Listing.objects.order_by('price_per_night', 'id').values_list('id', flat=True))
+
+        self.assertEqual(self.collect({'ordering': 'price_per_night'}), by_price)
+        self.assertEqual(self.collect({'ordering': '-price_per_night'}), by_price[::-1])
+
+    def test_search_keeps_its_own_ordering(self):
+        """?ordering= sorts the list only; availability search still pages newest first."""
+        url = reverse('listing-search') + '?check_in=2031-01-01&check_out=2031-01-03&ordering=price_per_night'
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+
+        expected = Listing.objects.filter(available=True).order_by('-created_at', '-id')
+        self.assertEqual(ids, list(expected.values_list('id', flat=True)))
+
+    def test_invalid_params_rejected(self):
+        """An inverted price range or an unknown ordering is a 400."""
+        response = self.client.get(reverse('listing-list'), {'min_price': '90', 'max_price': '10'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('listing-list'), {'ordering': 'title'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def query_plan(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('listing-list'), params)
+        sql = [query['sql'] for query in queries if 'FROM "listings_listing"' in query['sql']][-1]
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plans')
+    def test_every_filter_combination_is_index_served(self):
+        """No filter/ordering combination reads the table without an index."""
+        for size in range(len(self.FILTERS) + 1):
+            for names in itertools.combinations(self.FILTERS, size):
+                for ordering in ListingFilterSerializer.ORDERING_CHOICES:
+                    params = {name: self.FILTERS[name] for name in names}
+                    params['ordering'] = ordering
+                    with self.subTest(**params):
+                        # A sort of the matched rows (TEMP B-TREE) is fine.
+                        reads = [step for step in self.query_plan(params) if 'listings_listing' in step]
+                        self.assertTrue(reads)
+                        for step in reads:
+                            self.assertIn('USING INDEX', step)
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plans')
+    def test_full_filter_sorted_by_price_needs_no_sort(self):
+        """All filters with price ordering is one range read of the composite index."""
+        plan = self.query_plan({**self.FILTERS, 'ordering': 'price_per_night'})
+
+        self.assertEqual(len(plan), 1)
+        self.assertIn('listing_avail_loc_price_idx', plan[0])
+
+
+class NearbyListingsTestCase(APITestCase):
+    """Test cases for the geohash-indexed nearby search."""
+
+    def setUp(self):
+        def create(title, latitude, longitude, **kwargs):
+            return Listing.objects.create(
+                title=title, description='x', location='Addis Ababa', price_per_night=Decimal('60.00'),
+                latitude=latitude, longitude=longitude, **kwargs
+            )
+
+        # Meskel Square, Addis Ababa, as the search point.
+        self.point = {'lat': 9.0105, 'lng': 38.7613}
+        self.near = create('Bole Flat', 8.9950, 38.7900)          # ~3.6 km
+        self.nearest = create('Piazza Room', 9.0300, 38.7520)     # ~2.4 km
+        self.far = create('Adama Villa', 8.5400, 39.2700)         # ~77 km
+        create('Closed Suite', 9.0110, 38.7615, available=False)
+        create('Unmapped Loft', None, None)
+
+    def nearby(self, **params):
+        return self.client.get(reverse('listing-nearby'), {**self.point, **params})
+
+    def test_geohash_encoding(self):
+        """Geohashes match the reference encoding and follow coordinate edits."""
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+        self.near.latitude, self.near.longitude = 57.64911, 10.40744
+        self.near.save(update_fields=['latitude', 'longitude'])
+        self.near.refresh_from_db()
+        self.assertTrue(self.near.geohash.startswith('u4pruydqqvj'))
+        self.assertEqual(Listing.objects.get(title='Unmapped Loft').geohash, '')
+
+    def test_results_within_radius_nearest_first(self):
+        """Only available listings inside the radius come back, sorted by distance."""
+        response = self.nearby(radius=10)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([item['id'] for item in results], [self.nearest.id, self.near.id])
+        self.assertAlmostEqual(results[0]['distance_km'], 2.4, delta=0.2)
+
+        self.assertEqual(len(self.nearby(radius=100).data['results']), 3)
+        self.assertEqual([item['id'] for item in self.nearby(radius=100, limit=1).data['results']],
+                         [self.nearest.id])
+
+    def test_search_across_antimeridian(self):
+        """Cells on both sides of longitude 180 are searched."""
+        east = Listing.objects.create(title='Taveuni East', description='x', location='Fiji',
+                                      price_per_night=Decimal('90.00'), latitude=-16.8, longitude=179.99)
+        west = Listing.objects.create(title='Taveuni West', description='x', location='Fiji',
+                                      price_per_night=Decimal('90.00'), latitude=-16.8, longitude=-179.99)
+
+        response = self.client.get(reverse('listing-nearby'), {'lat': -16.8, 'lng': 179.999, 'radius': 5})
+        self.assertEqual({item['id'] for item in response.data['results']}, {east.id, west.id})
+
+    def test_candidates_read_from_geohash_index_only(self):
+        """Each growing circle is one index-only read; the rows are fetched once at the end."""
+        with CaptureQueriesContext(connection) as queries:
+            self.nearby(radius=10)
+
+        candidate_reads, fetch = queries[:-1], queries[-1]
+        self.assertLessEqual(len(candidate_reads), 4)
+        self.assertIn('"listings_listing"."id" IN', fetch['sql'])
+        if connection.vendor == 'sqlite':
+            for query in candidate_reads:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                    plan = ' '.join(row[-1] for row in cursor.fetchall())
+                self.assertIn('COVERING INDEX listing_geohash_idx', plan)
+
+    def test_coordinates_validated(self):
+        """Out-of-range points and half-set coordinates are rejected."""
+        self.assertEqual(self.nearby(lat=91).status_code, status.HTTP_400_BAD_REQUEST)
+
+        admin = User.objects.create_superuser(username='mapper', password='testpass123')
+        self.client.force_authenticate(user=admin)
+        response = self.client.patch(reverse('listing-detail', args=[self.far.pk]), {'latitude': None}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CursorPaginationTestCase(PaymentFixtureMixin, APITestCase):
+    """Test cases for per-endpoint cursor pagination."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', password='testpass123')
+        Listing.objects.bulk_create(
+            Listing(title=f'Listing {i}', description='x', location='Dire Dawa', price_per_night=Decimal('75.00'))
+            for i in range(25)
+        )
+        # bulk_create sends no signals
+        invalidate_listing_cache()
+        self.client.force_authenticate(user=self.user)
+
+    def collect(self, url, key='id'):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item[key] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_listings_use_cursor_pagination_by_default(self):
+        """Listing pages carry cursors and no total count."""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('listing-list'))
+
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_following_cursors_visits_every_row_once(self):
+        """Walking the next links returns all listings newest first."""
+        ids = self.collect(reverse('listing-list'))
+
+        expected = list(Listing.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    @override_settings(API_PAGINATION={'listings': 'page', 'bookings': 'cursor', 'payments': 'cursor'})
+    def test_page_number_style_selectable_per_endpoint(self):
+        """An endpoint can be switched back to page numbers."""
+        response = self.client.get(reverse('listing-list'))
+
+        self.assertEqual(response.data['count'], 25)
+
+    def test_user_payments_paginated(self):
+        """The user's payments are returned one page at a time."""
+        listing = Listing.objects.first()
+        for i in range(12):
+            self.create_booking(user=self.user, listing=listing, check_in=date.today() + timedelta(days=2 * i + 1))
+            self.create_payment(f'TXN-PAGE-{i}')
+
+        response = self.client.get(reverse('user-payments'))
+
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(len(set(self.collect(reverse('user-payments'), key='payment_id'))), 12)
+
+
+@override_settings(LISTING_CACHE_ENABLED=False)
+class RequestTimingTestCase(PaymentFixtureMixin, APITestCase):
+    """Test cases for the per-request timing middleware and hooks."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='timed', password='testpass123')
+        for i in range(20):
+            Listing.objects.create(
+                title=f'Timed {i}', description='x', location='Bahir Dar', price_per_night=Decimal('60.00')
+            )
+
+    def timed_get(self, url, **kwargs):
+        with self.assertLogs('listings.instrumentation', 'INFO') as logs:
+            response = self.client.get(url, **kwargs)
+        self.assertEqual(len(logs.records), 1)
+        return response, json.loads(logs.records[0].getMessage())
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_sampled_request_recorded(self):
+        """A sampled request gets a Server-Timing header and one JSON log line."""
+        with CaptureQueriesContext(connection) as queries:
+            response, record = self.timed_get(reverse('listing-list'))
+
+        self.assertEqual(record['view'], 'listing-list')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], len(queries))
+        self.assertGreater(record['serializer_ms'], 0)
+        self.assertLessEqual(record['db_ms'] + record['serializer_ms'], record['duration_ms'])
+        self.assertEqual(record['http_calls'], 0)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", http;dur=')
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    @patch('listings.services.requests.Session.get')
+    def test_chapa_calls_recorded(self, mock_get):
+        """Time spent in the Chapa service counts as external HTTP time."""
+        def slow_get(*args, **kwargs):
+            time.sleep(0.01)
+            return MagicMock(status_code=200, json=lambda: {'status': 'success', 'data': {'status': 'pending'}})
+        mock_get.side_effect = slow_get
+        self.create_booking(user=self.user, listing=Listing.objects.first())
+        self.create_payment('TXN-TIMED-1')
+        self.client.force_authenticate(user=self.user)
+
+        with self.assertLogs('listings.instrumentation', 'INFO') as logs:
+            self.client.post(reverse('verify-payment'), {'transaction_id': 'TXN-TIMED-1'}, format='json')
+        record = json.loads(logs.records[0].getMessage())
+
+        self.assertEqual(record['http_calls'], 1)
+        self.assertGreaterEqual(record['http_ms'], 10)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1, REQUEST_TIMING_HEADER=False)
+    def test_header_can_be_disabled(self):
+        """REQUEST_TIMING_HEADER=False keeps the timings in the logs only."""
+        response, record = self.timed_get(reverse('listing-list'))
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertGreater(record['queries'], 0)
+
+    def test_unsampled_request_untouched(self):
+        """With sampling off nothing is recorded, logged or added to the response."""
+        with self.assertNoLogs('listings.instrumentation', 'INFO'):
+            response = self.client.get(reverse('listing-list'))
+
+        self.assertNotIn('Server-Timing', response)
+
+    @contextmanager
+    def uninstrumented(self):
+        """Run without the middleware, the query recorder and the serializer hooks."""
+        mixin = instrumentation.SerializerTimingMixin
+        hooks = {name: mixin.__dict__[name] for name in ('to_representation', 'to_internal_value')}
+        connection.execute_wrappers.remove(instrumentation.record_query)
+        for name in hooks:
+            delattr(mixin, name)
+        try:
+            with override_settings(MIDDLEWARE=[
+                name for name in settings.MIDDLEWARE if not name.endswith('RequestTimingMiddleware')
+            ]):
+                yield
+        finally:
+            for name, hook in hooks.items():
+                setattr(mixin, name, hook)
+            instrumentation.install_query_recorder(connection)
+
+    def test_overhead_with_sampling_off(self):
+        """With sampling off, the hooks add under 5% to a listing list request."""
+        self.assertIn(instrumentation.record_query, connection.execute_wrappers)
+        url = reverse('listing-list')
+        # Each client's handler keeps the middleware in force on its first request.
+        instrumented, plain = APIClient(), APIClient()
+        instrumented.get(url)
+        with self.uninstrumented():
+            plain.get(url)
+
+        samples = {instrumented: [], plain: []}
+        # Interleaved rounds, so drift affects both alike.
+        for _ in range(40):
+            for client in samples:
+                with self.uninstrumented() if client is plain else nullcontext():
+                    for _ in range(5):
+                        start = time.perf_counter()
+                        client.get(url)
+                        samples[client].append(time.perf_counter() - start)
+
+        median = {client: sorted(times)[len(times) // 2] for client, times in samples.items()}
+        self.assertLess(median[instrumented], 1.05 * median[plain])
+
+
+@override_settings(LISTING_CACHE_ENABLED=False)
+class ListQueryCountTestCase(PaymentFixtureMixin, APITestCase):
+    """
+    Query-count regression harness for list endpoints.
+
+    Every list endpoint has a fixed query budget that must hold no matter
+    how many rows a page renders, so a serializer field that lazily loads a
+    relation fails here instead of in production. The listing cache is off
+    so the database path is what gets measured.
+    """
+
+    # url name -> (query params, queries allowed per page)
+    LIST_QUERY_BUDGETS = {
+        'listing-list': ({}, 1),
+        'listing-search': ({'check_in': '2031-01-01', 'check_out': '2031-01-03'}, 1),
+        'booking-list': ({}, 1),
+        'user-payments': ({}, 1),
+    }
+    PAGE_SIZES = [1, 10, 50]
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='counter', password='testpass123')
+        self.staff = User.objects.create_user(username='counter-staff', password='testpass123', is_staff=True)
+        listings = [
+            Listing.objects.create(
+                title=f'Counted {i}', description='x', location='Gondar', price_per_night=Decimal('40.00')
+            )
+            for i in range(3)
+        ]
+        for i in range(60):
+            self.create_booking(
+                user=self.user, listing=listings[i % 3], check_in=date(2030, 1, 1) + timedelta(days=2 * i)
+            )
+            self.create_payment(f'TXN-COUNT-{i}')
+
+    def assert_within_budget(self, user, page_size, budgets=None, extra_queries=0):
+        self.client.force_authenticate(user=user)
+        for name, (params, budget) in (budgets or self.LIST_QUERY_BUDGETS).items():
+            with self.subTest(endpoint=name, page_size=page_size):
+                with self.assertNumQueries(budget + extra_queries):
+                    response = self.client.get(reverse(name), params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response.data['results'])
+
+    def test_cursor_pages_stay_within_budget(self):
+        """Cursor-paginated lists cost the same for 1 row or 50."""
+        for page_size in self.PAGE_SIZES:
+            with patch.object(CreatedAtCursorPagination, 'page_size', page_size):
+                self.assert_within_budget(self.user, page_size)
+
+    def test_staff_booking_list_within_budget(self):
+        """Staff see every booking without extra per-row queries."""
+        budgets = {'booking-list': self.LIST_QUERY_BUDGETS['booking-list']}
+        for page_size in self.PAGE_SIZES:
+            with patch.object(CreatedAtCursorPagination, 'page_size', page_size):
+                self.assert_within_budget(self.staff, page_size, budgets)
+
+    @override_settings(API_PAGINATION={'listings': 'page', 'bookings': 'page', 'payments': 'page'})
+    def test_page_number_pages_add_only_the_count(self):
+        """Page-number pagination adds one COUNT query and nothing per row."""
+        # search is always cursor-paginated
+        budgets = {name: budget for name, budget in self.LIST_QUERY_BUDGETS.items() if name != 'listing-search'}
+        for page_size in self.PAGE_SIZES:
+            with patch.object(PageNumberPagination, 'page_size', page_size):
+                self.assert_within_budget(self.user, page_size, budgets, extra_queries=1)
+
+    def test_booking_detail_and_payment_detail_single_query(self):
+        """Detail views render nested relations from one joined query."""
+        self.client.force_authenticate(user=self.user)
+        booking = Booking.objects.first()
+        payment = Payment.objects.first()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('booking-detail', args=[booking.pk]))
+        self.assertEqual(response.data['username'], 'counter')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('payment-detail', args=[payment.payment_id]))
+        self.assertEqual(response.data['booking_details']['listing_title'], payment.booking.listing.title)
+
+
+@override_settings(LISTING_CACHE_ENABLED=True)
+class ListingCacheTestCase(APITestCase):
+    """Test cases for the listing list/detail read-through cache."""
+
+    def setUp(self):
+        self.listing = Listing.objects.create(
+            title='Cached Villa', description='x', location='Bahir Dar', price_per_night=Decimal('90.00')
+        )
+        listing_cache_stats.reset()
+
+    def test_second_request_served_from_cache(self):
+        """A repeated list request runs no queries and reports a hit."""
+        first = self.client.get(reverse('listing-list'))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('listing-list'))
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(listing_cache_stats.snapshot()['hits'], 1)
+        self.assertEqual(listing_cache_stats.snapshot()['misses'], 1)
+
+    def test_save_invalidates_list_and_detail(self):
+        """Updating a listing is visible on the next list and detail request."""
+        detail_url = reverse('listing-detail', args=[self.listing.pk])
+        self.client.get(reverse('listing-list'))
+        self.client.get(detail_url)
+
+        self.listing.title = 'Renamed Villa'
+        self.listing.save()
+
+        self.assertEqual(self.client.get(reverse('listing-list')).data['results'][0]['title'], 'Renamed Villa')
+        self.assertEqual(self.client.get(detail_url).data['title'], 'Renamed Villa')
+
+    def test_delete_invalidates(self):
+        """A deleted listing disappears from the cached list."""
+        self.client.get(reverse('listing-list'))
+        self.listing.delete()
+
+        self.assertEqual(self.client.get(reverse('listing-list')).data['results'], [])
+
+    def test_if_none_match_returns_304(self):
+        """A client holding the current ETag gets 304 until listings change."""
+        etag = self.client.get(reverse('listing-list'))['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('listing-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.listing.save()
+        response = self.client.get(reverse('listing-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_none_match_does_not_hide_missing_listing(self):
+        """A current ETag sent for a missing or deleted listing still gets the 404."""
+        url = reverse('listing-detail', args=[self.listing.pk])
+        etag = self.client.get(url)['ETag']
+        list_etag = self.client.get(reverse('listing-list'))['ETag']
+
+        missing = self.client.get(reverse('listing-detail', args=[self.listing.pk + 1000]),
+                                  HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.listing.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalidation_reaches_other_processes(self):
+        """A save in one process orphans the pages another process holds in memory."""
+        # Another worker: its own payload cache, the same version cache.
+        other_worker = override_settings(CACHES={
+            **settings.CACHES,
+            'listings': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-worker'},
+        })
+        with other_worker:
+            self.assertEqual(self.client.get(reverse('listing-list'))['X-Cache'], 'MISS')
+            self.assertEqual(self.client.get(reverse('listing-list'))['X-Cache'], 'HIT')
+
+        self.listing.title = 'Renamed Villa'
+        self.listing.save()
+
+        with other_worker:
+            response = self.client.get(reverse('listing-list'))
+            caches['listings'].clear()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed Villa')
+
+    def test_missing_listing_not_cached(self):
+        """404s are rendered every time rather than stored."""
+        response = self.client.get(reverse('listing-detail', args=[self.listing.pk + 1]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response)
+
+    def test_cache_stats_admin_only(self):
+        """Hit/miss counters are exposed to staff."""
+        user = User.objects.create_user(username='guest', password='testpass123')
+        staff = User.objects.create_user(username='ops', password='testpass123', is_staff=True)
+        self.client.get(reverse('listing-list'))
+
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get(reverse('listing-cache-stats')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=staff)
+        response = self.client.get(reverse('listing-cache-stats'))
+        self.assertEqual(response.data['misses'], 1)
+
+
+@override_settings(CHAPA_WEBHOOK_MODE='queue')
+class WebhookInboxTestCase(PaymentFixtureMixin, APITestCase):
+    """Test cases for queued webhook ingestion."""
+
+    def setUp(self):
+        self.create_booking()
+        self.create_payment('TXN-INBOX-1')
+
+    def post(self, data):
+        return self.client.post(reverse('chapa-webhook'), data, format='json')
+
+    @patch('listings.views.queue_payment_confirmation')
+    def test_webhook_only_stores_event(self, mock_email):
+        """Queue mode acknowledges with one insert and leaves the payment alone."""
+        with self.assertNumQueries(1):
+            response = self.post({'tx_ref': 'TXN-INBOX-1', 'status': 'success'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+        self.assertEqual(WebhookEvent.objects.get().payload['tx_ref'], 'TXN-INBOX-1')
+        mock_email.assert_not_called()
+
+    def test_redelivery_stored_once(self):
+        """The same tx_ref/status pair is kept once; a new status is a new event."""
+        for _ in range(3):
+            self.assertEqual(self.post({'tx_ref': 'TXN-INBOX-1', 'status': 'Failed'}).status_code, 200)
+        self.post({'tx_ref': 'TXN-INBOX-1', 'status': 'success'})
+
+        self.assertEqual(
+            list(WebhookEvent.objects.values_list('status', flat=True)), ['failed', 'success']
+        )
+
+    def test_invalid_payload_rejected(self):
+        """Events without a reference or status are not queued."""
+        self.assertEqual(self.post({'status': 'success'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post({'tx_ref': 'TXN-INBOX-1'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    @patch('listings.views.queue_payment_confirmation')
+    def test_consumer_applies_events(self, mock_email):
+        """The inbox task completes the payment and marks events processed."""
+        self.post({'tx_ref': 'TXN-INBOX-1', 'status': 'success'})
+        self.post({'tx_ref': 'TXN-INBOX-1', 'status': 'pending'})
+
+        result = process_webhook_inbox(batch_size=1)
+
+        self.assertEqual(result['processed'], 2)
+        self.assertEqual(result['retried'], 0)
+        self.payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.booking.status, 'confirmed')
+        mock_email.assert_called_once()
+        self.assertFalse(WebhookEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(process_webhook_inbox()['processed'], 0)
+
+    @patch('listings.views.queue_payment_confirmation')
+    def test_event_for_unknown_payment_retried_with_backoff(self, mock_email):
+        """An event that arrives before its payment is applied on a later run."""
+        self.payment.transaction_id = 'TXN-INBOX-LATER'
+        self.payment.save()
+        self.post({'tx_ref': 'TXN-INBOX-1', 'status': 'success'})
+
+        result = process_webhook_inbox()
+
+        self.assertEqual((result['processed'], result['retried']), (0, 1))
+        event = WebhookEvent.objects.get()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual((event.attempts, event.error_message), (1, 'Payment not found'))
+        self.assertEqual(process_webhook_inbox()['retried'], 0, 'retried before its backoff')
+
+        self.payment.transaction_id = 'TXN-INBOX-1'
+        self.payment.save()
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+
+        self.assertEqual(process_webhook_inbox()['processed'], 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+        self.assertIsNone(event.error_message)
+
+    @override_settings(WEBHOOK_INBOX_MAX_RETRIES=2, WEBHOOK_INBOX_RETRY_DELAY_SECONDS=0)
+    def test_failing_event_given_up_after_max_retries(self):
+        """Retries stop after WEBHOOK_INBOX_MAX_RETRIES; the error stays on the row."""
+        self.post({'tx_ref': 'TXN-UNKNOWN', 'status': 'success'})
+
+        results = [process_webhook_inbox() for _ in range(3)]
+
+        self.assertEqual([result['retried'] for result in results], [1, 1, 0])
+        self.assertEqual(results[-1]['processed'], 1)
+        self.assertEqual(results[-1]['errors'], 1)
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.attempts, 3)
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(event.error_message, 'Payment not found')
+
+
+class WebhookLedgerTestCase(PaymentFixtureMixin, APITestCase):
+    """Test cases for deduplicated inline webhook processing."""
+
+    def setUp(self):
+        self.create_booking()
+        self.create_payment('TXN-LEDGER-1')
+        self.event = {'tx_ref': 'TXN-LEDGER-1', 'status': 'failed'}
+
+    @patch('listings.views.queue_payment_failed')
+    def test_redelivery_costs_one_query(self, mock_email):
+        """A duplicate delivery is a single lookup with no writes or emails."""
+        self.client.post(reverse('chapa-webhook'), self.event, format='json')
+        mock_email.reset_mock()
+
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('chapa-webhook'), self.event, format='json')
+
+        self.assertTrue(response.data['duplicate'])
+        mock_email.assert_not_called()
+
+    @patch('listings.views.queue_payment_failed')
+    def test_replaying_10k_duplicates_writes_nothing(self, mock_email):
+        """10k redeliveries run 10k reads and zero writes after the first."""
+        views.handle_webhook_event(dict(self.event))
+        self.payment.refresh_from_db()
+        updated_at = self.payment.updated_at
+
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        # The debug query log is capped at 9000 entries, so count directly.
+        with connection.execute_wrapper(record):
+            for _ in range(10000):
+                views.handle_webhook_event(dict(self.event))
+
+        writes = [sql for sql in statements if not sql.lstrip().upper().startswith('SELECT')]
+        self.assertEqual(len(statements), 10000)
+        self.assertEqual(writes, [])
+        self.assertEqual(mock_email.call_count, 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.updated_at, updated_at)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+    def test_new_status_is_applied(self):
+        """A different status for the same payment is a new event."""
+        views.handle_webhook_event({'tx_ref': 'TXN-LEDGER-1', 'status': 'failed'})
+        payload, _ = views.handle_webhook_event({'tx_ref': 'TXN-LEDGER-1', 'status': 'success'})
+
+        self.assertNotIn('duplicate', payload)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+
+    def test_unknown_payment_not_recorded(self):
+        """Events that could not be applied stay retryable."""
+        payload, http_status = views.handle_webhook_event({'tx_ref': 'TXN-LATER', 'status': 'success'})
+
+        self.assertEqual(http_status, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+
+class EmailOutboxTestCase(PaymentFixtureMixin, TestCase):
+    """Test cases for batched notification emails."""
+
+    def setUp(self):
+        user = User.objects.create_user(username='mailer', password='testpass123')
+        listing = Listing.objects.create(
+            title='Outbox Retreat', description='x', location='Arba Minch', price_per_night=Decimal('80.00')
+        )
+        self.payments = []
+        for i in range(5):
+            self.create_booking(
+                user=user, listing=listing, check_in=date.today() + timedelta(days=2 * i + 1),
+                user_email=f'guest{i}@example.com'
+            )
+            self.payments.append(self.create_payment(f'TXN-MAIL-{i}'))
+
+    def test_batch_sent_over_one_connection(self):
+        """Queued emails share one SMTP connection per batch and one query to load."""
+        queue_payment_confirmation(*(payment.id for payment in self.payments[:4]))
+        queue_payment_failed(self.payments[4].id, 'Payment failed')
+
+        with patch('listings.notifications.get_connection', wraps=mail.get_connection) as get_connection:
+            result = send_pending_notifications(batch_size=10)
+
+        self.assertEqual(result['sent'], 5)
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[4].subject.split(' - ')[0], 'Payment Failed')
+        self.assertIn('Payment failed', mail.outbox[4].body)
+        self.assertFalse(EmailNotification.objects.exclude(status='sent').exists())
+
+    def test_batch_size_limits_messages_per_connection(self):
+        """Each batch opens its own connection."""
+        queue_payment_confirmation(*(payment.id for payment in self.payments))
+
+        with patch('listings.notifications.get_connection', wraps=mail.get_connection) as get_connection:
+            send_pending_notifications(batch_size=2)
+
+        self.assertEqual(get_connection.call_count, 3)
+        self.assertEqual(len(mail.outbox), 5)
+
+    @override_settings(EMAIL_MAX_RETRIES=1)
+    def test_failures_retried_per_message(self):
+        """One bad message backs off on its own; the rest of the batch is sent."""
+        queue_payment_confirmation(*(payment.id for payment in self.payments[:3]))
+        backend = mail.get_connection()
+        send_messages = backend.send_messages
+
+        def flaky(messages):
+            if messages[0].to == ['guest1@example.com']:
+                raise OSError('mailbox unavailable')
+            return send_messages(messages)
+
+        with patch.object(backend, 'send_messages', side_effect=flaky), \
+                patch('listings.notifications.get_connection', return_value=backend):
+            first = send_pending_notifications()
+            EmailNotification.objects.filter(status='pending').update(next_attempt_at=timezone.now())
+            second = send_pending_notifications()
+
+        self.assertEqual((first['sent'], first['retried'], first['failed']), (2, 1, 0))
+        self.assertEqual((second['sent'], second['retried'], second['failed']), (0, 0, 1))
+        failed = EmailNotification.objects.get(status='failed')
+        self.assertEqual(failed.payment, self.payments[1])
+        self.assertEqual(failed.attempts, 2)
+        self.assertEqual(failed.last_error, 'mailbox unavailable')
+
+    def test_retry_waits_for_backoff(self):
+        """A message that failed is not claimed again before its next attempt."""
+        queue_payment_confirmation(self.payments[0].id)
+        EmailNotification.objects.update(next_attempt_at=timezone.now() + timedelta(minutes=1))
+
+        self.assertEqual(send_pending_notifications()['sent'], 0)
+        self.assertEqual(mail.outbox, [])
+
+
+class EmailTemplateTestCase(PaymentFixtureMixin, TestCase):
+    """Test cases for the precompiled notification email templates."""
+
+    def setUp(self):
+        listing = Listing.objects.create(
+            title='Tom & Jerry\'s <Cabin>', description='x', location='Adama', price_per_night=Decimal('45.00')
+        )
+        self.create_booking(listing=listing, check_in=date(2031, 2, 1), nights=2, number_of_guests=2)
+        payment = self.create_payment('TXN-TEMPLATE-1')
+        self.notification = EmailNotification(kind='payment_confirmation', payment=payment)
+
+    def test_multipart_message(self):
+        """Notifications carry a plain-text body and an HTML alternative."""
+        message = build_message(self.notification)
+
+        self.assertIn('Check-in Date: 2031-02-01', message.body)
+        self.assertIn("Listing: Tom & Jerry's <Cabin>", message.body)
+        html, mimetype = message.alternatives[0]
+        self.assertEqual(mimetype, 'text/html')
+        self.assertIn('Tom &amp; Jerry&#x27;s &lt;Cabin&gt;', html)
+        self.assertIn('<title>Payment Confirmation - Booking', html)
+
+    def test_precompiled_matches_django_render(self):
+        """Joining the precompiled chunks gives exactly Django's own output."""
+        for kind in ('payment_confirmation', 'payment_failed'):
+            self.notification.kind = kind
+            self.notification.reason = 'Card <declined>'
+            context = email_context(self.notification)
+
+            text, html = render_email(kind, context)
+
+            self.assertEqual(text, render_to_string(f'listings/emails/{kind}.txt', context))
+            self.assertEqual(html, render_to_string(f'listings/emails/{kind}.html', context))
+
+    def test_templates_that_transform_variables_rejected(self):
+        """A filter applied to a variable cannot be precompiled."""
+        template = engines['django'].from_string('Hello {{ name|upper }}')
+
+        with patch('listings.email_templates.get_template', return_value=template):
+            with self.assertRaises(ImproperlyConfigured):
+                CompiledTemplate('greeting.txt', ('name',), autoescape=False)
+
+
+class PaymentStateMachineTestCase(PaymentFixtureMixin, TransactionTestCase):
+    """Test cases for conditional payment status transitions."""
+
+    THREADS = 50
+
+    def setUp(self):
+        self.create_booking(nights=2)
+        self.create_payment('TXN-RACE')
+
+    def hammer(self, work):
+        """Run ``work(i)`` on ``THREADS`` threads released together; return the results."""
+        barrier = threading.Barrier(self.THREADS)
+        retry_lock = threading.Lock()
+
+        def attempt(i):
+            try:
+                return True, work(i)
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                return False, None
+
+        def run(i):
+            try:
+                barrier.wait()
+                done, result = attempt(i)
+                # The shared in-memory test database fails concurrent writers
+                # at once instead of waiting like a file database or
+                # PostgreSQL; threads that lost retry one at a time.
+                with retry_lock:
+                    while not done:
+                        done, result = attempt(i)
+                return result
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            return list(executor.map(run, range(self.THREADS)))
+
+    def test_concurrent_verifiers_have_one_winner(self):
+        """50 verifiers of one transaction complete it once and queue one email."""
+        result = {'success': True, 'data': {'status': 'success'}}
+
+        def verify(i):
+            payment = Payment.objects.select_related('booking').get(transaction_id='TXN-RACE')
+            return views.apply_verification_result(payment, result)
+
+        with patch('listings.notifications.schedule_flush'):
+            responses = self.hammer(verify)
+
+        self.assertTrue(all(http_status == 200 for _, http_status in responses))
+        winners = [payload for payload, _ in responses if payload.get('success')]
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(EmailNotification.objects.filter(kind='payment_confirmation').count(), 1)
+        self.payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(self.booking.status, 'confirmed')
+
+    def test_racing_success_and_failure_resolve_once(self):
+        """Mixed success/failure webhooks and verifiers leave one outcome and one email."""
+        def deliver(i):
+            payment = Payment.objects.select_related('booking').get(transaction_id='TXN-RACE')
+            if i % 2:
+                return views.apply_webhook_event({'tx_ref': 'TXN-RACE', 'status': 'success'})
+            return views.apply_verification_result(payment, {'success': True, 'data': {'status': 'failed'}})
+
+        with patch('listings.notifications.schedule_flush'):
+            self.hammer(deliver)
+
+        self.payment.refresh_from_db()
+        emails = EmailNotification.objects.values_list('kind', flat=True)
+        if self.payment.status == 'completed':
+            # A failure may win first; a later success still completes the payment.
+            self.assertEqual(emails.filter(kind='payment_confirmation').count(), 1)
+            self.assertLessEqual(emails.filter(kind='payment_failed').count(), 1)
+        else:
+            self.assertEqual(list(emails), ['payment_failed'])
+
+    def test_failure_does_not_override_completion(self):
+        """A late failure report leaves a completed payment alone."""
+        self.assertTrue(self.payment.mark_as_completed())
+
+        stale = Payment.objects.get(pk=self.payment.pk)
+        stale.status = 'pending'
+        self.assertFalse(stale.mark_as_failed(error_message='late'))
+
+        self.assertEqual(stale.status, 'completed')
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertIsNone(self.payment.error_message)
+
+    def test_completion_logged_by_winner_only(self):
+        """The transition that completes a payment logs it; a losing repeat does not."""
+        with self.assertLogs('listings.models', 'INFO') as logs:
+            self.assertTrue(self.payment.mark_as_completed())
+            stale = Payment.objects.get(pk=self.payment.pk)
+            stale.status = 'pending'
+            self.assertFalse(stale.mark_as_completed())
+
+        self.assertEqual(logs.output, [
+            f'INFO:listings.models:Payment {self.payment.payment_id} completed '
+            f'for booking {self.payment.booking_reference}'
+        ])
+
+    def test_transition_writes_only_changed_fields(self):
+        """A transition is one conditional UPDATE of the status fields."""
+        with CaptureQueriesContext(connection) as queries:
+            self.payment.mark_as_completed()
+
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertIn('"status" IN', sql)
+        self.assertIn('"completed_at"', sql)
+        self.assertNotIn('"amount"', sql)
+
+
+class WriteRecorder:
+    """``execute_wrapper`` recording each INSERT/UPDATE/DELETE and its parameter bytes."""
+
+    def __init__(self):
+        self.writes = []
+
+    def __call__(self, execute, sql, params, many, context):
+        verb = sql.lstrip().split(' ', 1)[0].upper()
+        if verb in ('INSERT', 'UPDATE', 'DELETE'):
+            table = sql.split('"')[1]
+            rows = params if many else [params or ()]
+            size = sum(len(str(value).encode()) for row in rows for value in row)
+            self.writes.append((verb, table, size))
+        return execute(sql, params, many, context)
+
+    @property
+    def statements(self):
+        return [(verb, table) for verb, table, _ in self.writes]
+
+    @property
+    def bytes_written(self):
+        return sum(size for _, _, size in self.writes)
+
+
+class PaymentWriteCountTestCase(PaymentFixtureMixin, APITestCase):
+    """Pin the writes each payment endpoint makes per request."""
+
+    # Large enough that rewriting it would dominate the bytes written.
+    GATEWAY_RESPONSE = {'status': 'success', 'data': {'checkout_url': 'https://checkout.chapa.co/x',
+                                                      'blob': 'x' * 10000}}
+
+    def setUp(self):
+        self.create_booking()
+        self.client.force_authenticate(user=self.user)
+
+    def create_payment(self, **fields):
+        payment = super().create_payment('TXN-WRITE-1', **fields)
+        PaymentGatewayEvent.record(payment, 'initiate', self.GATEWAY_RESPONSE)
+        return payment
+
+    def record(self, method, url, data):
+        recorder = WriteRecorder()
+        with connection.execute_wrapper(recorder):
+            response = method(url, data, format='json')
+        return response, recorder
+
+    def chapa_response(self, payload):
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = payload
+        return response
+
+    @patch('listings.services.requests.Session.post')
+    def test_initiate_writes(self, mock_post):
+        """A first initiation inserts the payment; a retry after failure updates it once."""
+        mock_post.return_value = self.chapa_response(
+            {'status': 'success', 'data': {'checkout_url': 'https://checkout.chapa.co/1'}}
+        )
+        data = {'booking_id': self.booking.id, 'return_url': 'http://localhost:3000/payment/success'}
+
+        response, recorder = self.record(self.client.post, reverse('initiate-payment'), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(recorder.statements, [
+            ('INSERT', 'listings_payment'),
+            ('INSERT', 'listings_paymentgatewayevent'),
+        ])
+
+        Payment.objects.filter(booking=self.booking).update(status='failed')
+        response, recorder = self.record(self.client.post, reverse('initiate-payment'), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(recorder.statements, [
+            ('UPDATE', 'listings_payment'),
+            ('INSERT', 'listings_paymentgatewayevent'),
+        ])
+        self.assertLess(recorder.bytes_written, 2000)
+
+    @patch('listings.services.requests.Session.get')
+    def test_verify_writes(self, mock_get):
+        """Verification logs the response and writes the payment, booking and email once each."""
+        payment = self.create_payment()
+        mock_get.return_value = self.chapa_response({'status': 'success', 'data': {'status': 'success'}})
+
+        response, recorder = self.record(
+            self.client.post, reverse('verify-payment'), {'transaction_id': payment.transaction_id}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(recorder.statements, [
+            ('INSERT', 'listings_paymentgatewayevent'),
+            ('UPDATE', 'listings_payment'),
+            ('UPDATE', 'listings_booking'),
+            ('INSERT', 'listings_emailnotification'),
+        ])
+        self.assertLess(recorder.bytes_written, 2000)
+
+    @patch('listings.services.requests.Session.get')
+    def test_failed_verify_writes(self, mock_get):
+        """A failed verification logs the response and writes the payment and failure email."""
+        payment = self.create_payment()
+        mock_get.return_value = self.chapa_response({'status': 'success', 'data': {'status': 'failed'}})
+
+        response, recorder = self.record(
+            self.client.post, reverse('verify-payment'), {'transaction_id': payment.transaction_id}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(recorder.statements, [
+            ('INSERT', 'listings_paymentgatewayevent'),
+            ('UPDATE', 'listings_payment'),
+            ('INSERT', 'listings_emailnotification'),
+        ])
+        self.assertLess(recorder.bytes_written, 2000)
+
+    def test_webhook_writes(self):
+        """A webhook records its event and writes each row once; a redelivery writes nothing."""
+        self.create_payment()
+        data = {'tx_ref': 'TXN-WRITE-1', 'status': 'success'}
+
+        response, recorder = self.record(self.client.post, reverse('chapa-webhook'), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(recorder.statements, [
+            ('INSERT', 'listings_webhookevent'),
+            ('INSERT', 'listings_paymentgatewayevent'),
+            ('UPDATE', 'listings_payment'),
+            ('UPDATE', 'listings_booking'),
+            ('INSERT', 'listings_emailnotification'),
+        ])
+        self.assertLess(recorder.bytes_written, 2000)
+
+        response, recorder = self.record(self.client.post, reverse('chapa-webhook'), data)
+        self.assertTrue(response.data['duplicate'])
+        self.assertEqual(recorder.statements, [])
+
+
+class PaymentGatewayEventTestCase(PaymentFixtureMixin, APITestCase):
+    """Test cases for raw gateway payloads stored off the payment row."""
+
+    PAYLOAD = {'status': 'success', 'data': {'tx_ref': 'TXN-RAW-1', 'meta': ['x' * 40] * 20}}
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='auditor', password='testpass123')
+        self.create_booking(user=self.admin)
+        self.create_payment('TXN-RAW-1')
+
+    def test_payload_round_trip(self):
+        """Payloads are compressed when that helps and decode to the original."""
+        event = PaymentGatewayEvent.record(self.payment, 'verify', self.PAYLOAD)
+        self.assertEqual(event.encoding, 'zlib')
+        self.assertEqual(PaymentGatewayEvent.objects.get(pk=event.pk).payload, self.PAYLOAD)
+
+        small = PaymentGatewayEvent.record(self.payment, 'webhook', {'status': 'ok'})
+        self.assertEqual(small.encoding, 'json')
+        self.assertEqual(PaymentGatewayEvent.objects.get(pk=small.pk).payload, {'status': 'ok'})
+
+        with override_settings(PAYMENT_GATEWAY_EVENT_COMPRESS=False):
+            plain = PaymentGatewayEvent.record(self.payment, 'verify', self.PAYLOAD)
+        self.assertEqual(plain.encoding, 'json')
+        self.assertEqual(PaymentGatewayEvent.objects.get(pk=plain.pk).payload, self.PAYLOAD)
+
+    def test_webhook_logs_payload(self):
+        """A webhook body is appended to the payment's gateway events."""
+        self.client.post(reverse('chapa-webhook'), {'tx_ref': 'TXN-RAW-1', 'status': 'success'}, format='json')
+
+        event = self.payment.gateway_events.get()
+        self.assertEqual(event.kind, 'webhook')
+        self.assertEqual(event.payload, {'tx_ref': 'TXN-RAW-1', 'status': 'success'})
+
+    def test_admin_loads_payloads_on_detail_only(self):
+        """The payment changelist never reads gateway events; the change page shows them."""
+        PaymentGatewayEvent.record(self.payment, 'verify', self.PAYLOAD)
+        self.client.force_login(self.admin)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:listings_payment_changelist'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('listings_paymentgatewayevent' in query['sql'] for query in queries))
+
+        response = self.client.get(reverse('admin:listings_payment_change', args=[self.payment.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, 'TXN-RAW-1')
+        self.assertContains(response, 'Verification response')
+
+
+class SQLitePerformanceProfileTestCase(TestCase):
+    """Test cases for the opt-in SQLite connection profile."""
+
+    def pragmas(self):
+        # A fresh connection, so connection_created fires under the overrides.
+        conn = connections.create_connection('default')
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('PRAGMA busy_timeout')
+                busy_timeout = cursor.fetchone()[0]
+                cursor.execute('PRAGMA synchronous')
+                synchronous = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        return busy_timeout, synchronous
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite profile')
+    def test_profile_tunes_new_connections(self):
+        """New connections get the profile's pragmas only when it is enabled."""
+        with override_settings(SQLITE_PERFORMANCE_PROFILE=False, SQLITE_BUSY_TIMEOUT_MS=1234):
+            self.assertNotEqual(self.pragmas()[0], 1234)
+        with override_settings(SQLITE_PERFORMANCE_PROFILE=True, SQLITE_BUSY_TIMEOUT_MS=1234):
+            # synchronous=NORMAL is 1
+            self.assertEqual(self.pragmas(), (1234, 1))
+
+
+class MetricsTestCase(PaymentFixtureMixin, APITestCase):
+    """Test cases for the metrics registry and /metrics."""
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        self.create_booking(price=Decimal('70.00'), nights=2)
+        self.client.force_authenticate(user=self.user)
+
+    def scrape(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('metrics'))
+        self.assertEqual(len(queries), 0)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    @patch('listings.views.queue_payment_confirmation')
+    @patch('listings.services.requests.Session.get')
+    @patch('listings.services.requests.Session.post')
+    def test_payment_flow_counted(self, mock_post, mock_get, mock_email):
+        """Initiation, status transitions and Chapa latency show up in the exposition."""
+        mock_post.return_value = MagicMock(status_code=200, json=lambda: {
+            'status': 'success', 'data': {'checkout_url': 'https://checkout.chapa.co/m', 'tx_ref': 'CHAPA-M-1'},
+        })
+        mock_get.return_value = MagicMock(status_code=200, json=lambda: {
+            'status': 'success', 'data': {'status': 'success', 'amount': '140.00'},
+        })
+        self.client.post(reverse('initiate-payment'), {
+            'booking_id': self.booking.id, 'return_url': 'http://localhost:3000/done',
+        }, format='json')
+        payment = Payment.objects.get(booking=self.booking)
+        self.client.post(reverse('verify-payment'), {'transaction_id': payment.transaction_id}, format='json')
+
+        text = self.scrape()
+
+        self.assertIn('# TYPE payments_initiated_total counter\npayments_initiated_total 1\n', text)
+        self.assertIn('payment_transitions_total{to_status="completed"} 1\n', text)
+        self.assertIn('bookings_created_total{source="single"} 1\n', text)
+        self.assertIn('# TYPE chapa_request_duration_seconds histogram', text)
+        self.assertIn('chapa_request_duration_seconds_bucket{operation="initiate",le="+Inf"} 1\n', text)
+        self.assertIn('chapa_request_duration_seconds_count{operation="verify"} 1\n', text)
+
+    def test_webhooks_and_tasks_counted(self):
+        """Webhooks are counted by response status; Celery tasks get a duration histogram."""
+        self.client.post(reverse('chapa-webhook'), {'tx_ref': 'TXN-UNKNOWN', 'status': 'success'}, format='json')
+        tasks.send_queued_emails.apply()
+
+        text = self.scrape()
+
+        self.assertRegex(text, r'webhooks_received_total\{status="\d+"\} 1\n')
+        self.assertIn(
+            'celery_task_duration_seconds_count{task="listings.tasks.send_queued_emails",state="SUCCESS"} 1\n', text
+        )
+
+    def write_process_file(self, directory, filename, count):
+        """Publish ``count`` bulk bookings as another process would."""
+        with open(os.path.join(directory, filename), 'w') as file:
+            json.dump({'bookings_created_total': [[[['source', 'bulk']], count]]}, file)
+
+    def test_processes_summed_through_metrics_dir(self):
+        """Each process writes its own file; a scrape adds the others' to its live totals."""
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        # A running process (the test runner's parent) with its own counts.
+        self.write_process_file(directory, f'{os.getppid()}-1.json', 2)
+        with override_settings(METRICS_DIR=directory):
+            metrics.bookings_created.inc(source='bulk')
+            metrics.registry.flush()
+
+            text = self.scrape()
+
+        self.assertTrue(metrics.registry.filename.startswith(f'{os.getpid()}-'))
+        self.assertEqual(
+            sorted(name for name in os.listdir(directory) if name.endswith('.json')),
+            sorted([f'{os.getppid()}-1.json', metrics.registry.filename]),
+        )
+        self.assertIn('bookings_created_total{source="bulk"} 3\n', text)
+
+    def test_flushed_in_background(self):
+        """Changed values reach the process file without an explicit flush."""
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        with override_settings(METRICS_DIR=directory, METRICS_FLUSH_INTERVAL=0.01):
+            metrics.bookings_created.inc(source='bulk')
+            path = os.path.join(directory, metrics.registry.filename)
+            deadline = time.monotonic() + 5
+            while not os.path.exists(path) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            metrics.registry.reset()
+
+        with open(path) as file:
+            self.assertIn([[['source', 'bulk']], 1], json.load(file)['bookings_created_total'])
+
+    def test_flushed_at_exit(self):
+        """A process writes what it counted when it exits, however long the flush interval."""
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        subprocess.run(
+            [sys.executable, '-c', (
+                'import django; django.setup(); '
+                'from listings import metrics; metrics.bookings_created.inc(source="bulk")'
+            )],
+            cwd=settings.BASE_DIR, check=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'alx_travel_app.settings',
+                 'METRICS_DIR': directory, 'METRICS_FLUSH_INTERVAL': '3600'},
+        )
+        with override_settings(METRICS_DIR=directory):
+            text = self.scrape()
+
+        self.assertIn('bookings_created_total{source="bulk"} 1\n', text)
+
+    def test_exited_processes_folded(self):
+        """Files of exited processes, even ones sharing a reused pid, fold into exited.json."""
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.write_process_file(directory, '4242-1.json', 2)
+        self.write_process_file(directory, '4242-2.json', 4)
+        with override_settings(METRICS_DIR=directory), \
+                patch('listings.metrics.os.kill', side_effect=ProcessLookupError):
+            first = self.scrape()
+            self.write_process_file(directory, '4242-3.json', 1)
+            second = self.scrape()
+
+        self.assertIn('bookings_created_total{source="bulk"} 6\n', first)
+        self.assertIn('bookings_created_total{source="bulk"} 7\n', second)
+        self.assertEqual([name for name in os.listdir(directory) if name.endswith('.json')], ['exited.json'])
+
+    def test_collect_waits_for_fold(self):
+        """Reading the files waits while another process holds the fold lock."""
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.write_process_file(directory, f'{os.getppid()}-1.json', 2)
+        with override_settings(METRICS_DIR=directory), \
+                patch.object(metrics.registry, '_fold_exited'), \
+                open(os.path.join(directory, '.lock'), 'a') as lock, \
+                ThreadPoolExecutor(max_workers=1) as executor:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            collected = executor.submit(metrics.registry.collect)
+            time.sleep(0.1)
+            self.assertFalse(collected.done())
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+            self.assertEqual(collected.result(timeout=5)['bookings_created_total'][(('source', 'bulk'),)], 2)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        """METRICS_ENABLED=False hides the endpoint."""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS_TOKEN='scrape-secret', METRICS_ALLOWED_IPS=['10.0.0.0/8'])
+    def test_scrape_access(self):
+        """Only the bearer token or an allowed address may scrape; everyone else gets 403."""
+        outside = {'REMOTE_ADDR': '203.0.113.9'}
+        url = reverse('metrics')
+        self.client.force_authenticate(user=None)
+
+        self.assertEqual(self.client.get(url, **outside).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong', **outside).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(
+            self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-secret', **outside).status_code,
+            status.HTTP_200_OK,
+        )
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.1.2.3').status_code, status.HTTP_200_OK)
@@ -1,16 +1,20 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'listings', views.ListingViewSet, basename='listing')
 router.register(r'bookings', views.BookingViewSet, basename='booking')
 
+# Under ASGI the gateway-bound endpoints can run as native coroutines.
+payment_views = async_views if settings.ASYNC_PAYMENT_VIEWS else views
+
 urlpatterns = [
     path('', include(router.urls)),
-    path('payments/initiate/', views.initiate_payment, name='initiate-payment'),
-    path('payments/verify/', views.verify_payment, name='verify-payment'),
-    path('payments/webhook/', views.chapa_webhook, name='chapa-webhook'),
+    path('payments/initiate/', payment_views.initiate_payment, name='initiate-payment'),
+    path('payments/verify/', payment_views.verify_payment, name='verify-payment'),
+    path('payments/webhook/', payment_views.chapa_webhook, name='chapa-webhook'),
     path('payments/<uuid:payment_id>/', views.payment_detail, name='payment-detail'),
     path('payments/', views.user_payments, name='user-payments'),
 ]
@@ -1,21 +1,37 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from rest_framework.serializers import as_serializer_error
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from django.conf import settings
 import logging
 import uuid
 
-from .models import Listing, Booking, Payment
+from . import metrics
+from .models import Listing, Booking, Payment, PaymentGatewayEvent, WebhookEvent
+from .notifications import queue_payment_confirmation, queue_payment_failed
+from .availability import available_listings
+from .bulk_bookings import create_bookings
+from .cache import cached_response, stats as listing_cache_stats
+from .filters import ListingFilterBackend
+from .fulltext import search_listings
+from .geo import nearby_listings
+from .pagination import (
+    BookingPagination, CreatedAtCursorPagination, ListingPagination, PaymentPagination
+)
+from .quotes import memo as quote_memo, quote_listings, stats as quote_stats
 from .serializers import (
-    ListingSerializer, BookingSerializer, BookingCreateSerializer,
+    ListingSerializer, ListingSearchSerializer, ListingNearbySerializer, ListingQuoteSerializer,
+    BookingSerializer, BookingCreateSerializer,
+    BookingBulkCreateSerializer, BookingBulkItemSerializer,
     PaymentSerializer, PaymentInitiateSerializer, PaymentVerifySerializer
 )
 from .services import ChapaPaymentService
-from .tasks import send_payment_confirmation_email, send_payment_failed_email
 
 logger = logging.getLogger(__name__)
 
@@ -25,13 +41,107 @@ class ListingViewSet(viewsets.ModelViewSet):
     queryset = Listing.objects.all()
     serializer_class = ListingSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ListingPagination
+    filter_backends = [ListingFilterBackend]
 
     def get_permissions(self):
-        """Allow anyone to view listings."""
-        if self.action in ['list', 'retrieve']:
+        """Allow anyone to view and search listings."""
+        if self.action in ['list', 'retrieve', 'search', 'nearby', 'quote']:
             return [AllowAny()]
         return super().get_permissions()
 
+    def get_queryset(self):
+        """Narrow the list to full-text matches for ``?q=``, best match first."""
+        queryset = super().get_queryset()
+        query = self.request.query_params.get('q', '').strip()
+        if self.action == 'list' and query:
+            return search_listings(query, queryset)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """List listings, served from the listing cache when possible."""
+        return cached_response(
+            request, f"list:{settings.API_PAGINATION.get('listings')}",
+            lambda: super(ListingViewSet, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a listing, served from the listing cache when possible."""
+        return cached_response(
+            request, 'detail',
+            lambda: super(ListingViewSet, self).retrieve(request, *args, **kwargs)
+        )
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """Hit/miss counters of the listing cache for this process."""
+        return Response(listing_cache_stats.snapshot())
+
+    @action(detail=False, methods=['get'])
+    def quote(self, request):
+        """
+        Price one date range at many listings.
+
+        Query params: check_in, check_out, listings (comma-separated ids,
+        at most 100). Listings that don't exist or aren't available are
+        returned under ``unavailable``.
+        """
+        params = ListingQuoteSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        check_in = params.validated_data['check_in']
+        check_out = params.validated_data['check_out']
+        ids = params.validated_data['listings']
+
+        totals = quote_listings(ids, check_in, check_out)
+        return Response({
+            'check_in': check_in,
+            'check_out': check_out,
+            'nights': (check_out - check_in).days,
+            'quotes': [{'listing': pk, 'total_amount': str(totals[pk])} for pk in ids if pk in totals],
+            'unavailable': [pk for pk in ids if pk not in totals],
+        })
+
+    @action(detail=False, methods=['get'], url_path='quote-stats', permission_classes=[IsAdminUser])
+    def quote_stats(self, request):
+        """Hit/miss counters and size of the quote memo for this process."""
+        return Response({**quote_stats.snapshot(), 'size': len(quote_memo)})
+
+    @action(detail=False, methods=['get'], pagination_class=CreatedAtCursorPagination)
+    def search(self, request):
+        """
+        Find listings free for a date range.
+
+        Query params: check_in, check_out, guests (default 1), location.
+        Results are cursor-paginated, so no COUNT(*) runs per request.
+        """
+        params = ListingSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        queryset = available_listings(**params.validated_data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """
+        Find available listings near a point, nearest first.
+
+        Query params: lat, lng, radius (km, default 10), limit (default 50).
+        Each result carries its ``distance_km``.
+        """
+        params = ListingNearbySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        found = nearby_listings(
+            Listing.objects.filter(available=True), params.validated_data['lat'],
+            params.validated_data['lng'], params.validated_data['radius'], params.validated_data['limit'],
+        )
+        results = self.get_serializer([listing for listing, _ in found], many=True).data
+        for item, (_, distance) in zip(results, found):
+            item['distance_km'] = round(distance, 3)
+        return Response({'results': results})
+
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
         """Check availability of a listing."""
@@ -48,17 +158,71 @@ class BookingViewSet(viewsets.ModelViewSet):
     """ViewSet for managing bookings."""
     queryset = Booking.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = BookingPagination
 
     def get_serializer_class(self):
         if self.action == 'create':
             return BookingCreateSerializer
+        if self.action == 'bulk':
+            return BookingBulkCreateSerializer
         return BookingSerializer
 
     def get_queryset(self):
-        """Filter bookings by authenticated user."""
+        """Filter bookings by authenticated user, loading what each action reads."""
         if self.request.user.is_staff:
-            return Booking.objects.all()
-        return Booking.objects.filter(user=self.request.user)
+            queryset = Booking.objects.all()
+        else:
+            queryset = Booking.objects.filter(user=self.request.user)
+
+        if self.action in ['list', 'retrieve']:
+            return BookingSerializer.setup_eager_loading(queryset)
+        if self.action in ['update', 'partial_update']:
+            # Writes save every column, so keep full rows here.
+            return queryset.select_related('listing', 'user')
+        if self.action == 'payment_status':
+            return queryset.select_related('payment')
+        return queryset
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create many bookings in one request.
+
+        Body: ``{"bookings": [<booking>, ...]}`` with the same fields as a
+        single booking. Valid items are created even if others are
+        rejected; ``results`` has one entry per item, in order.
+        """
+        batch = self.get_serializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+
+        results = [None] * len(batch.validated_data['bookings'])
+        valid = []
+        # One serializer for every item, as ListSerializer does: building
+        # a ModelSerializer's fields costs more than validating an item.
+        item = BookingBulkItemSerializer()
+        for index, data in enumerate(batch.validated_data['bookings']):
+            try:
+                valid.append((index, item.run_validation(data)))
+            except ValidationError as exc:
+                results[index] = {'index': index, 'status': 'rejected', 'errors': as_serializer_error(exc)}
+
+        if valid:
+            created = []
+            for (index, _), (booking, errors) in zip(valid, create_bookings(request.user, [data for _, data in valid])):
+                if booking is None:
+                    results[index] = {'index': index, 'status': 'rejected', 'errors': errors}
+                else:
+                    created.append((index, booking))
+            bookings = BookingSerializer([booking for _, booking in created], many=True).data
+            for (index, _), data in zip(created, bookings):
+                results[index] = {'index': index, 'status': 'created', 'booking': data}
+
+        created_count = sum(result['status'] == 'created' for result in results)
+        return Response({
+            'created': created_count,
+            'rejected': len(results) - created_count,
+            'results': results,
+        }, status=status.HTTP_201_CREATED if created_count else status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['get'])
     def payment_status(self, request, pk=None):
@@ -83,6 +247,374 @@ class BookingViewSet(viewsets.ModelViewSet):
         })
 
 
+def check_booking_payable(booking, user):
+    """
+    Check whether ``user`` may start a payment for ``booking``.
+
+    Returns:
+        ``(payload, status)`` to respond with immediately, or None if a new
+        payment can be initiated.
+    """
+    # Check if user owns this booking
+    if booking.user_id != user.id and not user.is_staff:
+        return (
+            {'error': 'You do not have permission to pay for this booking.'},
+            status.HTTP_403_FORBIDDEN
+        )
+
+    # Check if payment already exists
+    if hasattr(booking, 'payment'):
+        payment = booking.payment
+        if payment.status == 'completed':
+            return (
+                {'error': 'Payment for this booking has already been completed.'},
+                status.HTTP_400_BAD_REQUEST
+            )
+        elif payment.status == 'pending':
+            return ({
+                'message': 'Payment already initiated',
+                'payment_url': payment.payment_url,
+                'payment_id': str(payment.payment_id),
+                'status': payment.status
+            }, status.HTTP_200_OK)
+
+    return None
+
+
+def build_initiate_request(booking, user, callback_url, return_url):
+    """Build the keyword arguments for ChapaPaymentService.initiate_payment."""
+    # Generate unique transaction reference
+    tx_ref = f"TXN-{booking.booking_reference}-{uuid.uuid4().hex[:8]}"
+
+    return {
+        'amount': float(booking.total_amount),
+        'currency': 'ETB',
+        'email': booking.user_email,
+        'first_name': user.first_name or 'Customer',
+        'last_name': user.last_name or 'User',
+        'phone_number': booking.user_phone,
+        'tx_ref': tx_ref,
+        'callback_url': callback_url,
+        'return_url': return_url,
+        'customization': {
+            'title': 'ALX Travel App Booking Payment',
+            'description': f'Payment for booking {booking.booking_reference}'
+        },
+    }
+
+
+def record_initiated_payment(booking, tx_ref, payment_result):
+    """
+    Create or update the payment record after a successful initiation.
+
+    Returns:
+        ``(payload, status)`` for the initiate endpoint response.
+    """
+    # Extract payment data
+    payment_data = payment_result['data']
+    checkout_url = payment_data.get('checkout_url')
+
+    # Create or update payment record
+    if hasattr(booking, 'payment'):
+        # Retrying a failed payment rewrites only the initiation fields, and
+        # only if nothing completed it meanwhile.
+        payment = booking.payment
+        if not payment.transition(
+            'pending',
+            transaction_id=tx_ref,
+            chapa_reference=payment_data.get('tx_ref'),
+            payment_url=checkout_url,
+        ):
+            return check_booking_payable(booking, booking.user)
+    else:
+        payment = Payment.objects.create(
+            booking=booking,
+            booking_reference=str(booking.booking_reference),
+            transaction_id=tx_ref,
+            chapa_reference=payment_data.get('tx_ref'),
+            amount=booking.total_amount,
+            currency='ETB',
+            payment_method='chapa',
+            status='pending',
+            payment_url=checkout_url,
+            user_email=booking.user_email,
+            user_phone=booking.user_phone
+        )
+
+    PaymentGatewayEvent.record(payment, 'initiate', payment_result)
+    metrics.payments_initiated.inc()
+
+    logger.info(f"Payment initiated successfully for booking {booking.booking_reference}")
+
+    return ({
+        'success': True,
+        'message': 'Payment initiated successfully',
+        'payment_id': str(payment.payment_id),
+        'payment_url': checkout_url,
+        'transaction_id': tx_ref,
+        'amount': str(booking.total_amount),
+        'currency': 'ETB',
+        'status': 'pending'
+    }, status.HTTP_201_CREATED)
+
+
+def already_completed_response(payment):
+    """Return the ``(payload, status)`` reported for a payment that is already completed."""
+    return ({
+        'message': 'Payment already verified and completed',
+        'status': payment.status,
+        'payment_id': str(payment.payment_id),
+        'amount': str(payment.amount),
+        'completed_at': payment.completed_at
+    }, status.HTTP_200_OK)
+
+
+def confirm_booking(payment):
+    """Confirm the booking of a payment that was just completed."""
+    booking = payment.booking
+    booking.status = 'confirmed'
+    booking.save(update_fields=['status', 'updated_at'])
+    return booking
+
+
+def apply_verification_result(payment, verification_result):
+    """
+    Update a payment (and its booking) from a Chapa verification result.
+
+    Status changes go through ``Payment.transition``, so when verifiers,
+    webhooks and the reconciler race on one payment only the winner
+    confirms the booking and queues an email.
+
+    Returns:
+        ``(payload, status)`` for the verify endpoint response.
+    """
+    PaymentGatewayEvent.record(payment, 'verify', verification_result)
+
+    if not verification_result['success']:
+        with transaction.atomic():
+            if payment.mark_as_failed(error_message=verification_result.get('error')):
+                # Queue failure email
+                queue_payment_failed(
+                    payment.id,
+                    verification_result.get('error', 'Verification failed')
+                )
+
+        if payment.status == 'completed':
+            return already_completed_response(payment)
+
+        return ({
+            'success': False,
+            'message': 'Payment verification failed',
+            'error': verification_result.get('error'),
+            'status': payment.status
+        }, status.HTTP_400_BAD_REQUEST)
+
+    # Check payment status from Chapa
+    verification_data = verification_result['data']
+    chapa_status = verification_data.get('status', '').lower()
+
+    if chapa_status == 'success':
+        with transaction.atomic():
+            if not payment.mark_as_completed():
+                if payment.status == 'completed':
+                    return already_completed_response(payment)
+                return ({
+                    'success': False,
+                    'message': f'Payment cannot be completed. Status: {payment.status}',
+                    'status': payment.status
+                }, status.HTTP_409_CONFLICT)
+
+            booking = confirm_booking(payment)
+
+            # Queue confirmation email
+            queue_payment_confirmation(payment.id)
+
+        logger.info(f"Payment verified and completed for transaction {payment.transaction_id}")
+
+        return ({
+            'success': True,
+            'message': 'Payment verified successfully',
+            'payment_id': str(payment.payment_id),
+            'status': payment.status,
+            'amount': str(payment.amount),
+            'booking_reference': str(booking.booking_reference),
+            'booking_status': booking.status,
+            'completed_at': payment.completed_at
+        }, status.HTTP_200_OK)
+
+    # Payment not successful
+    with transaction.atomic():
+        if payment.mark_as_failed(error_message=f"Chapa status: {chapa_status}"):
+            # Queue failure email
+            queue_payment_failed(
+                payment.id,
+                f"Payment status: {chapa_status}"
+            )
+
+    if payment.status == 'completed':
+        return already_completed_response(payment)
+
+    return ({
+        'success': False,
+        'message': f'Payment not successful. Status: {chapa_status}',
+        'status': payment.status,
+        'chapa_status': chapa_status
+    }, status.HTTP_400_BAD_REQUEST)
+
+
+def apply_webhook_event(data):
+    """
+    Apply a Chapa webhook payload to the matching payment.
+
+    Returns:
+        ``(payload, status)`` for the webhook endpoint response.
+    """
+    # Extract transaction reference
+    tx_ref = data.get('tx_ref') or data.get('trx_ref')
+
+    if not tx_ref:
+        logger.error("Webhook missing transaction reference")
+        return ({'error': 'Missing transaction reference'}, status.HTTP_400_BAD_REQUEST)
+
+    # Find payment by transaction ID
+    try:
+        payment = Payment.objects.select_related('booking').get(transaction_id=tx_ref)
+    except Payment.DoesNotExist:
+        logger.error(f"Payment not found for tx_ref: {tx_ref}")
+        return ({'error': 'Payment not found'}, status.HTTP_404_NOT_FOUND)
+
+    # Get status from webhook
+    webhook_status = data.get('status', '').lower()
+
+    # Store webhook data
+    PaymentGatewayEvent.record(payment, 'webhook', _raw_payload(data))
+
+    # Update payment based on webhook status
+    with transaction.atomic():
+        if webhook_status == 'success':
+            if payment.mark_as_completed():
+                confirm_booking(payment)
+
+                # Queue confirmation email
+                queue_payment_confirmation(payment.id)
+
+                logger.info(f"Payment completed via webhook for {tx_ref}")
+        elif webhook_status in ['failed', 'cancelled']:
+            if payment.mark_as_failed(error_message=f"Webhook status: {webhook_status}"):
+                # Queue failure email
+                queue_payment_failed(
+                    payment.id,
+                    f"Payment {webhook_status}"
+                )
+
+                logger.info(f"Payment failed via webhook for {tx_ref}")
+
+    return ({'success': True}, status.HTTP_200_OK)
+
+
+def webhook_event_key(data):
+    """
+    Return the ``(tx_ref, status)`` pair identifying a webhook delivery.
+
+    Either value is None when missing; the status is lower-cased.
+    """
+    tx_ref = data.get('tx_ref') or data.get('trx_ref') or None
+    webhook_status = str(data.get('status', '')).lower() or None
+    return tx_ref, webhook_status
+
+
+def _invalid_webhook(tx_ref, webhook_status):
+    """Return an error ``(payload, status)`` if the event key is unusable."""
+    if not tx_ref:
+        logger.error("Webhook missing transaction reference")
+        return ({'error': 'Missing transaction reference'}, status.HTTP_400_BAD_REQUEST)
+    if not webhook_status:
+        return ({'error': 'Missing status'}, status.HTTP_400_BAD_REQUEST)
+    if len(tx_ref) > 255 or len(webhook_status) > 20:
+        return ({'error': 'Invalid webhook payload'}, status.HTTP_400_BAD_REQUEST)
+    return None
+
+
+def _duplicate_webhook(tx_ref, webhook_status):
+    logger.info(f"Ignoring duplicate webhook for {tx_ref} ({webhook_status})")
+    return ({'success': True, 'duplicate': True}, status.HTTP_200_OK)
+
+
+def _raw_payload(data):
+    return data.dict() if hasattr(data, 'dict') else dict(data)
+
+
+def enqueue_webhook_event(data):
+    """
+    Validate a Chapa webhook payload and store it in the inbox.
+
+    Nothing else is read or written, so the endpoint can acknowledge
+    retry storms quickly; ``tasks.process_webhook_inbox`` applies the
+    events later. A redelivered tx_ref/status pair is ignored.
+
+    Returns:
+        ``(payload, status)`` for the webhook endpoint response.
+    """
+    tx_ref, webhook_status = webhook_event_key(data)
+    invalid = _invalid_webhook(tx_ref, webhook_status)
+    if invalid is not None:
+        return invalid
+
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(tx_ref=tx_ref, status=webhook_status, payload=_raw_payload(data))],
+        ignore_conflicts=True
+    )
+
+    return ({'success': True}, status.HTTP_200_OK)
+
+
+def record_webhook_event(data):
+    """
+    Apply a Chapa webhook payload at most once per tx_ref/status.
+
+    The ``WebhookEvent`` ledger is checked first, so a redelivery costs one
+    indexed lookup: no writes, no emails. New events are recorded and
+    applied in one transaction; if applying fails (e.g. the payment does
+    not exist yet) the ledger row is rolled back so Chapa's retry is
+    applied normally.
+
+    Returns:
+        ``(payload, status)`` for the webhook endpoint response.
+    """
+    tx_ref, webhook_status = webhook_event_key(data)
+    invalid = _invalid_webhook(tx_ref, webhook_status)
+    if invalid is not None:
+        return invalid
+
+    if WebhookEvent.objects.filter(tx_ref=tx_ref, status=webhook_status).exists():
+        return _duplicate_webhook(tx_ref, webhook_status)
+
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(
+                tx_ref=tx_ref, status=webhook_status, payload=_raw_payload(data),
+                processed_at=timezone.now()
+            )
+            payload, http_status = apply_webhook_event(data)
+            if http_status >= status.HTTP_400_BAD_REQUEST:
+                transaction.set_rollback(True)
+    except IntegrityError:
+        # A concurrent delivery of the same event recorded it first.
+        return _duplicate_webhook(tx_ref, webhook_status)
+
+    return payload, http_status
+
+
+def handle_webhook_event(data):
+    """Record or enqueue a webhook payload according to ``CHAPA_WEBHOOK_MODE``."""
+    if settings.CHAPA_WEBHOOK_MODE == 'queue':
+        payload, http_status = enqueue_webhook_event(data)
+    else:
+        payload, http_status = record_webhook_event(data)
+    metrics.webhooks_received.inc(status=http_status)
+    return payload, http_status
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def initiate_payment(request):
@@ -114,60 +646,22 @@ def initiate_payment(request):
             # Get booking
             booking = get_object_or_404(Booking, id=booking_id)
             
-            # Check if user owns this booking
-            if booking.user != request.user and not request.user.is_staff:
-                return Response(
-                    {'error': 'You do not have permission to pay for this booking.'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
+            precheck = check_booking_payable(booking, request.user)
+            if precheck is not None:
+                payload, http_status = precheck
+                return Response(payload, status=http_status)
             
-            # Check if payment already exists
-            if hasattr(booking, 'payment'):
-                payment = booking.payment
-                if payment.status == 'completed':
-                    return Response(
-                        {'error': 'Payment for this booking has already been completed.'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                elif payment.status == 'pending':
-                    return Response({
-                        'message': 'Payment already initiated',
-                        'payment_url': payment.payment_url,
-                        'payment_id': str(payment.payment_id),
-                        'status': payment.status
-                    })
-            
-            # Generate unique transaction reference
-            tx_ref = f"TXN-{booking.booking_reference}-{uuid.uuid4().hex[:8]}"
-            
-            # Get user details
-            user = request.user
-            first_name = user.first_name or 'Customer'
-            last_name = user.last_name or 'User'
-            
-            # Initialize Chapa payment service
-            chapa_service = ChapaPaymentService()
-            
-            # Prepare customization
-            customization = {
-                'title': 'ALX Travel App Booking Payment',
-                'description': f'Payment for booking {booking.booking_reference}'
-            }
-            
-            # Initiate payment with Chapa
-            payment_result = chapa_service.initiate_payment(
-                amount=float(booking.total_amount),
-                currency='ETB',
-                email=booking.user_email,
-                first_name=first_name,
-                last_name=last_name,
-                phone_number=booking.user_phone,
-                tx_ref=tx_ref,
+            initiate_kwargs = build_initiate_request(
+                booking,
+                request.user,
                 callback_url=callback_url or f"{request.build_absolute_uri('/api/payments/webhook/')}",
-                return_url=return_url,
-                customization=customization
+                return_url=return_url
             )
             
+            # Initiate payment with Chapa
+            chapa_service = ChapaPaymentService()
+            payment_result = chapa_service.initiate_payment(**initiate_kwargs)
+            
             if not payment_result['success']:
                 logger.error(f"Payment initiation failed: {payment_result.get('error')}")
                 return Response(
@@ -175,47 +669,10 @@ def initiate_payment(request):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
             
-            # Extract payment data
-            payment_data = payment_result['data']
-            checkout_url = payment_data.get('checkout_url')
-            
-            # Create or update payment record
-            if hasattr(booking, 'payment'):
-                payment = booking.payment
-                payment.transaction_id = tx_ref
-                payment.chapa_reference = payment_data.get('tx_ref')
-                payment.payment_url = checkout_url
-                payment.payment_response = payment_result
-                payment.status = 'pending'
-                payment.save()
-            else:
-                payment = Payment.objects.create(
-                    booking=booking,
-                    booking_reference=str(booking.booking_reference),
-                    transaction_id=tx_ref,
-                    chapa_reference=payment_data.get('tx_ref'),
-                    amount=booking.total_amount,
-                    currency='ETB',
-                    payment_method='chapa',
-                    status='pending',
-                    payment_url=checkout_url,
-                    payment_response=payment_result,
-                    user_email=booking.user_email,
-                    user_phone=booking.user_phone
-                )
-            
-            logger.info(f"Payment initiated successfully for booking {booking.booking_reference}")
-            
-            return Response({
-                'success': True,
-                'message': 'Payment initiated successfully',
-                'payment_id': str(payment.payment_id),
-                'payment_url': checkout_url,
-                'transaction_id': tx_ref,
-                'amount': str(booking.total_amount),
-                'currency': 'ETB',
-                'status': 'pending'
-            }, status=status.HTTP_201_CREATED)
+            payload, http_status = record_initiated_payment(
+                booking, initiate_kwargs['tx_ref'], payment_result
+            )
+            return Response(payload, status=http_status)
     
     except Exception as e:
         logger.error(f"Error initiating payment: {str(e)}", exc_info=True)
@@ -260,84 +717,14 @@ def verify_payment(request):
         
         # If already completed, return current status
         if payment.status == 'completed':
-            return Response({
-                'message': 'Payment already verified and completed',
-                'status': payment.status,
-                'payment_id': str(payment.payment_id),
-                'amount': str(payment.amount),
-                'completed_at': payment.completed_at
-            })
+            return Response(*already_completed_response(payment))
         
         # Verify with Chapa
         chapa_service = ChapaPaymentService()
         verification_result = chapa_service.verify_payment(transaction_id)
         
-        # Store verification response
-        payment.verification_response = verification_result
-        
-        if not verification_result['success']:
-            payment.mark_as_failed(error_message=verification_result.get('error'))
-            
-            # Send failure email asynchronously
-            send_payment_failed_email.delay(
-                payment_id=payment.id,
-                reason=verification_result.get('error', 'Verification failed')
-            )
-            
-            return Response({
-                'success': False,
-                'message': 'Payment verification failed',
-                'error': verification_result.get('error'),
-                'status': payment.status
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Check payment status from Chapa
-        verification_data = verification_result['data']
-        chapa_status = verification_data.get('status', '').lower()
-        
-        if chapa_status == 'success':
-            # Mark payment as completed
-            payment.mark_as_completed()
-            
-            # Update booking status
-            booking = payment.booking
-            booking.status = 'confirmed'
-            booking.save()
-            
-            # Send confirmation email asynchronously
-            send_payment_confirmation_email.delay(
-                payment_id=payment.id,
-                booking_id=booking.id
-            )
-            
-            logger.info(f"Payment verified and completed for transaction {transaction_id}")
-            
-            return Response({
-                'success': True,
-                'message': 'Payment verified successfully',
-                'payment_id': str(payment.payment_id),
-                'status': payment.status,
-                'amount': str(payment.amount),
-                'booking_reference': str(booking.booking_reference),
-                'booking_status': booking.status,
-                'completed_at': payment.completed_at
-            })
-        else:
-            # Payment not successful
-            payment.mark_as_failed(error_message=f"Chapa status: {chapa_status}")
-            
-            # Send failure email
-            send_payment_failed_email.delay(
-                payment_id=payment.id,
-                reason=f"Payment status: {chapa_status}"
-            )
-            
-            return Response({
-                'success': False,
-                'message': f'Payment not successful. Status: {chapa_status}',
-                'status': payment.status,
-                'chapa_status': chapa_status
-            }, status=status.HTTP_400_BAD_REQUEST)
+        payload, http_status = apply_verification_result(payment, verification_result)
+        return Response(payload, status=http_status)
     
     except Payment.DoesNotExist:
         return Response(
@@ -363,62 +750,8 @@ def chapa_webhook(request):
         # Log webhook data
         logger.info(f"Received Chapa webhook: {request.data}")
         
-        # Extract transaction reference
-        tx_ref = request.data.get('tx_ref') or request.data.get('trx_ref')
-        
-        if not tx_ref:
-            logger.error("Webhook missing transaction reference")
-            return Response(
-                {'error': 'Missing transaction reference'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Find payment by transaction ID
-        try:
-            payment = Payment.objects.get(transaction_id=tx_ref)
-        except Payment.DoesNotExist:
-            logger.error(f"Payment not found for tx_ref: {tx_ref}")
-            return Response(
-                {'error': 'Payment not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        # Get status from webhook
-        webhook_status = request.data.get('status', '').lower()
-        
-        # Update payment based on webhook status
-        if webhook_status == 'success':
-            if payment.status != 'completed':
-                payment.mark_as_completed()
-                
-                # Update booking
-                booking = payment.booking
-                booking.status = 'confirmed'
-                booking.save()
-                
-                # Send confirmation email
-                send_payment_confirmation_email.delay(
-                    payment_id=payment.id,
-                    booking_id=booking.id
-                )
-                
-                logger.info(f"Payment completed via webhook for {tx_ref}")
-        elif webhook_status in ['failed', 'cancelled']:
-            payment.mark_as_failed(error_message=f"Webhook status: {webhook_status}")
-            
-            # Send failure email
-            send_payment_failed_email.delay(
-                payment_id=payment.id,
-                reason=f"Payment {webhook_status}"
-            )
-            
-            logger.info(f"Payment failed via webhook for {tx_ref}")
-        
-        # Store webhook data
-        payment.verification_response = request.data
-        payment.save()
-        
-        return Response({'success': True}, status=status.HTTP_200_OK)
+        payload, http_status = handle_webhook_event(request.data)
+        return Response(payload, status=http_status)
     
     except Exception as e:
         logger.error(f"Error processing webhook: {str(e)}", exc_info=True)
@@ -433,10 +766,13 @@ def chapa_webhook(request):
 def payment_detail(request, payment_id):
     """Get details of a specific payment."""
     try:
-        payment = get_object_or_404(Payment, payment_id=payment_id)
+        payment = get_object_or_404(
+            PaymentSerializer.setup_eager_loading(Payment.objects.all()),
+            payment_id=payment_id
+        )
         
         # Check permission
-        if payment.booking.user != request.user and not request.user.is_staff:
+        if payment.booking.user_id != request.user.id and not request.user.is_staff:
             return Response(
                 {'error': 'You do not have permission to view this payment.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -458,15 +794,35 @@ def payment_detail(request, payment_id):
 def user_payments(request):
     """Get all payments for the authenticated user."""
     try:
-        bookings = Booking.objects.filter(user=request.user)
-        payments = Payment.objects.filter(booking__in=bookings).order_by('-created_at')
+        payments = PaymentSerializer.setup_eager_loading(
+            Payment.objects.filter(booking__user=request.user)
+        ).order_by('-created_at', '-id')
         
-        serializer = PaymentSerializer(payments, many=True)
-        return Response(serializer.data)
+        paginator = PaymentPagination()
+        page = paginator.paginate_queryset(payments, request)
+        serializer = PaymentSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
+    except APIException:
+        # e.g. an invalid cursor: let DRF render the 4xx response
+        raise
     except Exception as e:
         logger.error(f"Error retrieving user payments: {str(e)}")
         return Response(
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+def metrics_endpoint(request):
+    """
+    Serve the metrics registry in the Prometheus text format.
+
+    A plain Django view: no session lookup, so a scrape never queries the
+    database. Access is checked by ``metrics.scrape_allowed`` instead.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if not metrics.scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')